@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from generators import SEED, make_score_differences
+from pypastry.experiment.compare import bootstrap_interval, permutation_test, DEFAULT_RESAMPLES
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.fixture(params=[False, True], ids=['discrete', 'continuous'])
+def differences(request, n_instances):
+    return make_score_differences(n_instances, request.param)
+
+
+def test_bootstrap_interval(benchmark, differences):
+    benchmark(lambda: bootstrap_interval(differences, DEFAULT_RESAMPLES, random=np.random.default_rng(SEED)))
+
+
+def test_permutation_test(benchmark, differences):
+    benchmark(lambda: permutation_test(differences, DEFAULT_RESAMPLES, np.random.default_rng(SEED)))
@@ -0,0 +1,57 @@
+"""
+Benchmarks of the work PyPastry does around the estimator in each fold: slicing folds,
+predicting and scoring groups. The estimator is a DummyClassifier, and its fit and
+predict time, taken from the run timings, is reported separately from the overhead.
+"""
+import pytest
+from sklearn.dummy import DummyClassifier
+from sklearn.metrics import accuracy_score, f1_score, make_scorer
+from sklearn.model_selection import GroupKFold, KFold
+
+from generators import make_numeric_dataset
+from pypastry.experiment import Experiment
+from pypastry.experiment.evaluation import evaluate_predictor, _take
+
+pytest.importorskip('pytest_benchmark')
+
+SCORERS = [make_scorer(accuracy_score), make_scorer(f1_score)]
+
+
+def _evaluate(benchmark, experiment):
+    run_infos = []
+
+    def run():
+        run_infos.append(evaluate_predictor(experiment)[0])
+
+    benchmark(run)
+    timings = run_infos[-1]['timings']
+    estimator_seconds = timings['fit_seconds'] + timings['predict_seconds']
+    benchmark.extra_info['estimator_seconds'] = estimator_seconds
+    benchmark.extra_info['overhead_seconds'] = run_infos[-1]['run_seconds'] - estimator_seconds
+    benchmark.extra_info['phases'] = timings['phases']
+
+
+@pytest.mark.parametrize('numpy_features', [False, True], ids=['frame', 'numpy'])
+def test_evaluate_folds(benchmark, n_rows, numpy_features):
+    dataset = make_numeric_dataset(n_rows).drop(columns=['group'])
+    experiment = Experiment(dataset, 'label', DummyClassifier(), KFold(n_splits=5), SCORERS,
+                            numpy_features=numpy_features)
+
+    _evaluate(benchmark, experiment)
+
+
+def test_evaluate_groups(benchmark, n_groups):
+    dataset = make_numeric_dataset(10 ** 5, n_groups=n_groups)
+    experiment = Experiment(dataset, 'label', DummyClassifier(), GroupKFold(n_splits=5), SCORERS,
+                            group_column='group')
+
+    _evaluate(benchmark, experiment)
+
+
+@pytest.mark.parametrize('numpy_features', [False, True], ids=['frame', 'numpy'])
+def test_take_fold(benchmark, n_rows, numpy_features):
+    dataset = make_numeric_dataset(n_rows)
+    X = dataset.to_numpy() if numpy_features else dataset
+    indices = KFold(n_splits=5, shuffle=True, random_state=0).split(X).__next__()[0]
+
+    benchmark(_take, X, indices)
@@ -0,0 +1,20 @@
+import pytest
+
+from generators import make_numeric_dataset, make_mixed_dataset
+from pypastry.experiment.hasher import get_dataset_hash
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.mark.parametrize('algorithm', ['sha1', 'blake2b'])
+def test_hash_numeric_dataset(benchmark, n_rows, algorithm):
+    dataset = make_numeric_dataset(n_rows)
+    benchmark.extra_info['bytes'] = int(dataset.memory_usage(index=True).sum())
+
+    benchmark(get_dataset_hash, dataset, algorithm=algorithm)
+
+
+def test_hash_mixed_dataset(benchmark, n_rows):
+    dataset = make_mixed_dataset(n_rows)
+
+    benchmark(get_dataset_hash, dataset)
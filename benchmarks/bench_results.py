@@ -0,0 +1,52 @@
+import pytest
+
+from generators import write_results
+from pypastry.display import cache_display, print_cache_file, _get_results_dataframe
+from pypastry.experiment.results import ResultsRepo
+from pypastry.paths import DISPLAY_PATH
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.fixture
+def results_path(tmp_path, n_results):
+    results_path = str(tmp_path / 'results')
+    write_results(results_path, n_results)
+    return results_path
+
+
+@pytest.fixture
+def display_path(tmp_path, monkeypatch, results_path):
+    monkeypatch.chdir(tmp_path)
+    cache_display(ResultsRepo(results_path).get_results())
+    return str(tmp_path / DISPLAY_PATH)
+
+
+def test_get_results_from_files(benchmark, results_path):
+    results_repo = ResultsRepo(results_path)
+
+    benchmark(lambda: list(results_repo.get_results()))
+
+
+def test_get_latest_results_from_index(benchmark, results_path, tmp_path):
+    results_repo = ResultsRepo(results_path, str(tmp_path / 'results.sqlite'))
+    # Build the index first, so that this measures an up to date index
+    list(results_repo.get_results(limit=1))
+
+    benchmark(lambda: list(results_repo.get_results(limit=10)))
+
+
+def test_get_results_dataframe(benchmark, results_path):
+    results = list(ResultsRepo(results_path).get_results())
+
+    benchmark(_get_results_dataframe, results)
+
+
+def test_cache_display(benchmark, results_path, display_path):
+    results = list(ResultsRepo(results_path).get_results())
+
+    benchmark(cache_display, results)
+
+
+def test_print_latest_results(benchmark, display_path, capsys):
+    benchmark(print_cache_file, 10)
@@ -0,0 +1,20 @@
+SCALES = {
+    # Sizes small enough to run in a minute or so, for checking before a commit
+    'small': {'rows': [10 ** 3, 10 ** 5], 'results': [10, 10 ** 3], 'groups': [10, 10 ** 3],
+              'instances': [10 ** 4, 10 ** 6]},
+    'full': {'rows': [10 ** 3, 10 ** 5, 10 ** 6, 10 ** 7], 'results': [10, 10 ** 3, 10 ** 5],
+             'groups': [10, 10 ** 3, 10 ** 5], 'instances': [10 ** 4, 10 ** 6, 10 ** 7]},
+}
+
+
+def pytest_addoption(parser):
+    parser.addoption('--bench-scale', choices=sorted(SCALES), default='small',
+                     help='Range of dataset and results sizes to benchmark')
+
+
+def pytest_generate_tests(metafunc):
+    sizes = SCALES[metafunc.config.getoption('bench_scale')]
+    for name in ('rows', 'results', 'groups', 'instances'):
+        argument = 'n_' + name
+        if argument in metafunc.fixturenames:
+            metafunc.parametrize(argument, sizes[name], ids=lambda size: '{:.0e}'.format(size))
@@ -0,0 +1,72 @@
+"""
+Synthetic datasets and results for the benchmarks. Everything is generated from a
+fixed seed, so that runs on different commits measure the same work.
+"""
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+import numpy as np
+from pandas import DataFrame, Categorical
+
+SEED = 0
+MODELS = ['DecisionTreeClassifier', 'LogisticRegression', 'DummyClassifier', 'RandomForestClassifier']
+
+
+def make_numeric_dataset(n_rows: int, n_columns: int = 10, n_groups: int = 10) -> DataFrame:
+    random = np.random.RandomState(SEED)
+    dataset = DataFrame(random.normal(size=(n_rows, n_columns)),
+                        columns=['x{}'.format(i) for i in range(n_columns)])
+    dataset['group'] = random.randint(0, n_groups, size=n_rows)
+    dataset['label'] = (dataset['x0'] + random.normal(size=n_rows) > 0).astype(int)
+    return dataset
+
+
+def make_mixed_dataset(n_rows: int) -> DataFrame:
+    random = np.random.RandomState(SEED)
+    words = np.array(['pastry', 'pie', 'tart', 'croissant', 'strudel'])
+    return DataFrame({
+        'number': random.normal(size=n_rows),
+        'count': random.randint(0, 100, size=n_rows),
+        'text': words[random.randint(0, len(words), size=n_rows)],
+        'category': Categorical(words[random.randint(0, len(words), size=n_rows)]),
+        'time': datetime(2020, 1, 1) + timedelta(seconds=1) * random.randint(0, 10 ** 6, size=n_rows),
+    })
+
+
+def make_score_differences(n_instances: int, continuous: bool) -> np.ndarray:
+    """
+    Per-instance differences in score between two models, as in the results detail that
+    pastry compare resamples: squared errors if continuous, and otherwise accuracies.
+    """
+    random = np.random.RandomState(SEED)
+    if continuous:
+        return random.normal(size=n_instances) ** 2 - random.normal(0.1, 1, size=n_instances) ** 2
+    return (random.uniform(size=n_instances) < 0.8).astype(float) - (random.uniform(size=n_instances) < 0.7)
+
+
+def make_result(i: int) -> Dict[str, Any]:
+    random = np.random.RandomState(i)
+    score = float(random.uniform())
+    return {
+        'run_start': str(datetime(2020, 1, 1) + timedelta(minutes=i)),
+        'run_end': str(datetime(2020, 1, 1) + timedelta(minutes=i, seconds=5)),
+        'run_seconds': 5.0,
+        'results': {'test_score': {'f1_score': score}, 'test_score_sem': {'f1_score': score / 10}},
+        'results_detail': {'f1_score': [score] * 5},
+        'model_info': {'type': MODELS[i % len(MODELS)], 'max_depth': i % 10},
+        'additional_info': [None] * 5,
+        'dataset': {'hash': '{:040x}'.format(i % 7), 'columns': ['feature', 'class'], 'size': 1000},
+        'git_hash': '{:08x}'.format(i),
+        'git_summary': 'Experiment {}'.format(i),
+        'result_json_name': 'result-{:08d}.json'.format(i),
+    }
+
+
+def write_results(results_path: str, n_results: int) -> None:
+    os.makedirs(results_path, exist_ok=True)
+    for i in range(n_results):
+        result = make_result(i)
+        with open(os.path.join(results_path, result['result_json_name']), 'w') as result_file:
+            json.dump(result, result_file, indent=4)
@@ -17,3 +17,8 @@ def get_experiment():
     scorer = make_scorer(f1_score)
     label_column = 'class'
     return Experiment(dataset, label_column, predictor, cross_validator, scorer)
+
+
+def get_parameter_grid():
+    # Parameters of the predictor to try with pastry sweep
+    return {'max_depth': [1, 2, None], 'criterion': ['gini', 'entropy']}
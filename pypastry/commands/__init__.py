@@ -0,0 +1,16 @@
+from typing import NamedTuple
+
+Command = NamedTuple('Command', [('module', str), ('description', str), ('startup_budget_seconds', float)])
+
+# The startup budget is the most time importing a command should take on a warm start.
+# It is checked by tests/startup_test.py, and reported by the pastry script when the
+# PASTRY_STARTUP_BUDGET environment variable is set.
+COMMANDS = {
+    'init': Command('pypastry.commands.init', 'Create a new PyPastry project', 0.1),
+    'run': Command('pypastry.commands.run', 'Run an experiment', 5.0),
+    'sweep': Command('pypastry.commands.sweep', 'Race predictor parameters with successive halving', 5.0),
+    'print': Command('pypastry.commands.print_', 'Print out results from previous experiments', 0.1),
+    'profile': Command('pypastry.commands.profile', 'Show the hot functions of a profiled run', 0.5),
+    'compare': Command('pypastry.commands.compare', 'Test whether two runs differ significantly', 0.5),
+    'cache': Command('pypastry.commands.cache', 'Inspect and prune the fold cache', 0.5),
+}
@@ -0,0 +1,37 @@
+import argparse
+import sys
+
+from pypastry.experiment.cache import FoldCache, TransformerCache, parse_size, format_size
+from pypastry.paths import FOLD_CACHE_PATH, TRANSFORMER_CACHE_PATH
+
+
+def run():
+    parser = argparse.ArgumentParser(prog='pastry cache')
+    parser.add_argument('-l', '--list', action='store_true',
+                        help='List cached folds and transformers, least recently used first')
+    parser.add_argument('--prune', type=parse_size, default=None, metavar='SIZE',
+                        help='Evict least recently used folds, and transformers cached by nested cross validation, '
+                             'until each cache is at most SIZE, e.g. 500M')
+    parser.add_argument('--clear', action='store_true',
+                        help='Remove all cached folds, and the transformers cached by nested cross validation')
+
+    args = parser.parse_args(sys.argv[2:])
+
+    caches = [('folds', FoldCache(FOLD_CACHE_PATH), FOLD_CACHE_PATH),
+              ('transformers', TransformerCache(TRANSFORMER_CACHE_PATH), TRANSFORMER_CACHE_PATH)]
+    for name, cache, path in caches:
+        if args.clear:
+            removed = cache.clear()
+            print("Removed {} cached {}".format(len(removed), name))
+        elif args.prune is not None:
+            removed = cache.prune(args.prune)
+            print("Removed {} cached {} ({})".format(len(removed), name,
+                                                     format_size(sum(entry.size for entry in removed))))
+
+    for name, cache, path in caches:
+        entries = cache.entries()
+        if args.list:
+            for entry in entries:
+                print("{}  {:>10}  {}".format(entry.key, format_size(entry.size), str(entry.last_used)[:19]))
+        print("{} cached {} using {} in {}".format(
+            len(entries), name, format_size(sum(entry.size for entry in entries)), path))
@@ -0,0 +1,51 @@
+import argparse
+import sys
+
+from pypastry.display import _format_table
+from pypastry.experiment.results import ResultsRepo
+from pypastry.paths import RESULTS_PATH, RESULTS_INDEX_PATH
+
+
+def run():
+    parser = argparse.ArgumentParser(prog='pastry compare')
+    parser.add_argument('result_a', help='Result JSON name, or the start of it, of the baseline run.')
+    parser.add_argument('result_b', help='Result JSON name, or the start of it, of the run to compare with it.')
+    parser.add_argument('-s', '--score', action='append', default=None,
+                        help='Score to compare, can be given more than once. Defaults to every score.')
+    parser.add_argument('-n', '--n-resamples', type=int, default=10000,
+                        help='Number of bootstrap resamples and permutations.')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the interval.')
+    parser.add_argument('--random-state', type=int, default=None, help='Random state for resampling.')
+
+    args = parser.parse_args(sys.argv[2:])
+
+    results_repo = ResultsRepo(RESULTS_PATH, RESULTS_INDEX_PATH)
+    try:
+        result_a = results_repo.get_result(args.result_a)
+        result_b = results_repo.get_result(args.result_b)
+    except KeyError as error:
+        print(error.args[0])
+        sys.exit(1)
+
+    # NumPy is only needed once the results are found
+    from pypastry.experiment.compare import compare_results
+    try:
+        comparisons = compare_results(results_repo, result_a, result_b, args.score, args.n_resamples,
+                                      args.confidence, args.random_state)
+    except ValueError as error:
+        print(error.args[0])
+        sys.exit(1)
+
+    for label, result in (('A', result_a), ('B', result_b)):
+        print("{}: {} at {} ({})".format(label, result.data['result_json_name'], result.data.get('git_hash'),
+                                         result.data.get('git_summary')))
+    interval = "{:.0%} CI".format(args.confidence)
+    print(_format_table([{
+        'Score': comparison.score,
+        'A': "{:.4f}".format(comparison.mean_a),
+        'B': "{:.4f}".format(comparison.mean_b),
+        'B - A': "{:+.4f}".format(comparison.difference),
+        interval: "[{:+.4f}, {:+.4f}]".format(comparison.ci_low, comparison.ci_high),
+        'p-value': "{:.4f}".format(comparison.p_value),
+        'Pairs': comparison.pairs,
+    } for comparison in comparisons]))
@@ -1,30 +1,39 @@
 import argparse
+import sys
 
-from pypastry.display import print_cache_file, cache_display, _get_results_dataframe
-from pypastry.paths import RESULTS_PATH
-from pypastry.experiment.results import ResultsRepo
+from pypastry.display import print_cache_file, cache_display, _get_results_dataframe, UnknownColumnError
+from pypastry.paths import RESULTS_PATH, RESULTS_INDEX_PATH
 
 
 def run():
     parser = argparse.ArgumentParser(prog='pastry print')
     parser.add_argument('-l', '--limit', type=int, default=None, help='Limit lines to print')
+    parser.add_argument('-s', '--since', type=str, default=None,
+                        help='Only print runs started since this time, e.g. 2020-01-31 or "2020-01-31 09:00"')
+    parser.add_argument('--model', type=str, default=None, help='Only print runs using this model type')
+    parser.add_argument('--sort', type=str, default='Run start', help='Column to sort the printed runs by')
+    parser.add_argument('-r', '--reverse', action='store_true', help='Sort in descending order')
     parser.add_argument('-e', '--export', type=str, required=False, help='File to output the results in CSV format')
 
     args = parser.parse_args(sys.argv[2:])
     if args.export is not None:
-        results = get_results()
+        results = get_results(limit=args.limit, model=args.model)
         results_dataframe = _get_results_dataframe(results)
         results_dataframe.to_csv(args.export)
         return
     try:
-        print_cache_file(args.limit)
-    except FileNotFoundError:
-        results = get_results()
-        cache_display(results)
-        print_cache_file(args.limit)
+        try:
+            print_cache_file(args.limit, args.since, args.model, args.sort, args.reverse)
+        except FileNotFoundError:
+            results = get_results()
+            cache_display(results)
+            print_cache_file(args.limit, args.since, args.model, args.sort, args.reverse)
+    except UnknownColumnError as error:
+        parser.error(str(error))
 
 
-def get_results():
-    results_repo = ResultsRepo(RESULTS_PATH)
-    results = results_repo.get_results()
+def get_results(limit=None, model=None):
+    from pypastry.experiment.results import ResultsRepo
+    results_repo = ResultsRepo(RESULTS_PATH, RESULTS_INDEX_PATH)
+    results = results_repo.get_results(limit=limit, model=model)
     return results
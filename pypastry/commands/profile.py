@@ -0,0 +1,47 @@
+import argparse
+import sys
+
+from pypastry.experiment.results import ResultsRepo
+from pypastry.paths import RESULTS_PATH, RESULTS_INDEX_PATH
+
+SORT_KEYS = ['cumulative', 'tottime', 'ncalls', 'name']
+
+
+def run():
+    parser = argparse.ArgumentParser(prog='pastry profile')
+    parser.add_argument('result', nargs='?', default=None,
+                        help='Result JSON name, or the start of it. Defaults to the latest profiled run.')
+    parser.add_argument('-l', '--limit', type=int, default=20, help='Number of functions to show')
+    parser.add_argument('--sort', choices=SORT_KEYS, default='cumulative', help='Order to show functions in')
+    parser.add_argument('--callers', action='store_true', help='Show what calls each function')
+
+    args = parser.parse_args(sys.argv[2:])
+
+    results_repo = ResultsRepo(RESULTS_PATH, RESULTS_INDEX_PATH)
+    if args.result is None:
+        profiled = [result for result in results_repo.get_results() if 'profile' in result.data]
+        if len(profiled) == 0:
+            print("No profiled runs yet, use pastry run --profile")
+            sys.exit(1)
+        result = profiled[-1]
+    else:
+        try:
+            result = results_repo.get_result(args.result)
+        except KeyError as error:
+            print(error.args[0])
+            sys.exit(1)
+
+    profile_path = results_repo.get_profile_path(result)
+    if profile_path is None:
+        print("Run {} was not profiled".format(result.data['result_json_name']))
+        sys.exit(1)
+
+    from pstats import Stats
+    print("Profile of {} at {} ({}) started {}".format(
+        result.data['result_json_name'], result.data.get('git_hash'), result.data.get('git_summary'),
+        result.data['run_start'][:19]))
+    stats = Stats(profile_path).sort_stats(args.sort)
+    if args.callers:
+        stats.print_callers(args.limit)
+    else:
+        stats.print_stats(args.limit)
@@ -1,6 +1,8 @@
 import argparse
 import sys
 
+from pypastry.experiment import BACKENDS
+from pypastry.experiment.cache import parse_size
 from pypastry.experiment.evaluation import run_experiment
 
 
@@ -9,13 +11,64 @@ def run():
     parser.add_argument('-m', '--message', default="", type=str, help='Summary message about the experiment.')
     parser.add_argument('-f', '--force', action='store_true', help='Force a re-run of the experiment')
     parser.add_argument('-p', '--no-print', action='store_true', help='Do not print results.')
+    parser.add_argument('-c', '--cache', action='store_true',
+                        help='Reuse folds cached by previous runs instead of refitting them.')
+    parser.add_argument('--cache-size', type=parse_size, default=None,
+                        help='Maximum size of the fold cache, e.g. 500M or 2G.')
+    parser.add_argument('--save-models', action='store_true',
+                        help='Save the fitted estimator of every fold in .pypastry/models.')
+    parser.add_argument('-j', '--n-jobs', type=int, default=None,
+                        help='Number of folds to run in parallel, -1 to use all cores.')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Run folds in this many worker processes, which keep the dataset between folds.')
+    parser.add_argument('--memory-limit', type=parse_size, default=None, metavar='SIZE',
+                        help='Run each fold in its own process, as many at once as fit in SIZE, e.g. 8G, '
+                             'retrying folds that run out of memory.')
+    parser.add_argument('--backend', choices=BACKENDS, default=None, help='Joblib backend used to run folds.')
+    parser.add_argument('--max-nbytes', type=str, default=None,
+                        help='Share data larger than this with workers using memory mapping, e.g. 1M. '
+                             'Use "none" to disable memory mapping.')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the run, including fold workers, and save the profile next to the result.')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Record the peak memory of each fold and phase with tracemalloc (slower).')
+    parser.add_argument('--untracked', nargs='*', metavar='PATH', default=None,
+                        help='Count untracked files as changes when checking the repo is clean, '
+                             'only those under the given paths if any are given.')
 
     args = parser.parse_args(sys.argv[2:])
 
     sys.path.append('.')
     import pie
     experiment = pie.get_experiment()
+    if args.n_jobs is not None:
+        experiment.n_jobs = args.n_jobs
+    if args.backend is not None:
+        experiment.backend = args.backend
+    if args.workers is not None and args.memory_limit is not None:
+        parser.error("Use either --workers or --memory-limit")
+    if args.workers is not None:
+        from pypastry.experiment.executors import WorkerPoolExecutor
+        experiment.executor = WorkerPoolExecutor(args.workers)
+    if args.memory_limit is not None:
+        from pypastry.experiment.executors import MemoryBoundedExecutor
+        experiment.executor = MemoryBoundedExecutor(args.memory_limit, max_workers=args.n_jobs)
+    if args.max_nbytes is not None:
+        experiment.max_nbytes = None if args.max_nbytes.lower() == 'none' else args.max_nbytes
+    if args.profile:
+        experiment.profile = True
+    if args.trace_memory:
+        experiment.trace_memory = True
     force = args.force
     message = args.message
+    untracked_files = False
+    if args.untracked is not None:
+        untracked_files = args.untracked if len(args.untracked) > 0 else True
 
-    run_experiment(experiment, message, force, show_results=not args.no_print)
+    try:
+        run_experiment(experiment, message, force, show_results=not args.no_print,
+                       use_fold_cache=args.cache, fold_cache_size=args.cache_size, save_models=args.save_models,
+                       untracked_files=untracked_files)
+    finally:
+        if getattr(experiment, 'executor', None) is not None:
+            experiment.executor.close()
@@ -0,0 +1,65 @@
+import argparse
+import sys
+
+from pypastry.experiment import BACKENDS
+from pypastry.experiment.cache import parse_size
+from pypastry.experiment.sweep import run_sweep, DEFAULT_FACTOR
+
+
+def run():
+    parser = argparse.ArgumentParser(prog='pastry sweep')
+    parser.add_argument('-m', '--message', default="", type=str, help='Summary message about the sweep.')
+    parser.add_argument('-f', '--force', action='store_true', help='Force a run of the sweep')
+    parser.add_argument('-p', '--no-print', action='store_true', help='Do not print results.')
+    parser.add_argument('-n', '--n-iter', type=int, default=None,
+                        help='Sample this many candidates from the parameter grid instead of trying them all.')
+    parser.add_argument('--random-state', type=int, default=None, help='Random state for sampling candidates.')
+    parser.add_argument('--factor', type=int, default=DEFAULT_FACTOR,
+                        help='Keep the best 1/FACTOR of the candidates after each round.')
+    parser.add_argument('--min-folds', type=int, default=1,
+                        help='Number of folds every candidate is evaluated on in the first round.')
+    parser.add_argument('--save-models', action='store_true',
+                        help='Save the fitted estimator of every fold of the surviving candidates.')
+    parser.add_argument('-j', '--n-jobs', type=int, default=None,
+                        help='Number of folds to run in parallel, -1 to use all cores.')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Run folds in this many worker processes, which keep the dataset between folds.')
+    parser.add_argument('--memory-limit', type=parse_size, default=None, metavar='SIZE',
+                        help='Run each fold in its own process, as many at once as fit in SIZE, e.g. 8G, '
+                             'retrying folds that run out of memory.')
+    parser.add_argument('--backend', choices=BACKENDS, default=None, help='Joblib backend used to run folds.')
+    parser.add_argument('--untracked', nargs='*', metavar='PATH', default=None,
+                        help='Count untracked files as changes when checking the repo is clean, '
+                             'only those under the given paths if any are given.')
+
+    args = parser.parse_args(sys.argv[2:])
+
+    sys.path.append('.')
+    import pie
+    if not hasattr(pie, 'get_parameter_grid'):
+        print("Define get_parameter_grid() in pie.py to return the parameters to sweep over")
+        sys.exit(1)
+    experiment = pie.get_experiment()
+    if args.n_jobs is not None:
+        experiment.n_jobs = args.n_jobs
+    if args.backend is not None:
+        experiment.backend = args.backend
+    if args.workers is not None and args.memory_limit is not None:
+        parser.error("Use either --workers or --memory-limit")
+    if args.workers is not None:
+        from pypastry.experiment.executors import WorkerPoolExecutor
+        experiment.executor = WorkerPoolExecutor(args.workers)
+    if args.memory_limit is not None:
+        from pypastry.experiment.executors import MemoryBoundedExecutor
+        experiment.executor = MemoryBoundedExecutor(args.memory_limit, max_workers=args.n_jobs)
+    untracked_files = False
+    if args.untracked is not None:
+        untracked_files = args.untracked if len(args.untracked) > 0 else True
+
+    try:
+        run_sweep(experiment, pie.get_parameter_grid(), args.message, args.force, show_results=not args.no_print,
+                  n_iter=args.n_iter, random_state=args.random_state, factor=args.factor, min_folds=args.min_folds,
+                  save_models=args.save_models, untracked_files=untracked_files)
+    finally:
+        if getattr(experiment, 'executor', None) is not None:
+            experiment.executor.close()
@@ -8,73 +8,222 @@ This code needs to display results really fast. That's why it has some odd thing
 This is because I don't like having to wait a second for things to be imported.
 I want my pastry now!
 """
+import json
 import os
-from typing import Any, Dict, List, Iterator, TYPE_CHECKING
+from typing import Any, Dict, List, Iterator, Tuple, TYPE_CHECKING
 
-from pandas import Series
-
-from pypastry.paths import DISPLAY_PATH, DISPLAY_DIR
+from pypastry.locking import file_lock
+from pypastry.paths import DISPLAY_PATH, DISPLAY_DIR, DISPLAY_LOCK_PATH, DISPLAY_REBUILT_PATH
 if TYPE_CHECKING:
     import pypastry
 
+READ_BLOCK_SIZE = 65536
+# Rows are appended as runs finish, so a long run can come after newer ones. Reading backwards
+# with since stops after this many runs in a row that started before it.
+SINCE_WINDOW = 1000
+
+
+class UnknownColumnError(ValueError):
+    def __init__(self, message):
+        super().__init__(message)
+
 
 def cache_display(results_from_repo: Iterator['pypastry.experiment.results.Result']) -> None:
-    results_dataframe = _get_results_dataframe(results_from_repo)
-    display = repr(results_dataframe)
+    """
+    Rebuild the display cache from all the results. The new cache is written to a temporary
+    file and renamed into place, so readers never see a partly written cache.
+    """
+    with file_lock(DISPLAY_LOCK_PATH):
+        _rebuild_display(results_from_repo)
 
+
+def update_display(result: 'pypastry.experiment.results.Result', results_repo) -> None:
+    """
+    Add a single new result to the display cache, or build the cache from all
+    the results in the repo if there isn't one yet.
+
+    Many runs can do this at once: only the first to find the cache missing rebuilds it,
+    and the others append their row unless the rebuild already included it.
+    """
+    with file_lock(DISPLAY_LOCK_PATH):
+        if not os.path.exists(DISPLAY_PATH):
+            _rebuild_display(results_repo.get_results())
+            return
+
+        row = _get_display_row(result)
+        if _may_be_in_rebuild(result) and _is_displayed(row):
+            return
+        # A single write to a file opened for appending, so that a reader sees the whole row or none of it
+        display_file = os.open(DISPLAY_PATH, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(display_file, (json.dumps(row) + '\n').encode('utf8'))
+        finally:
+            os.close(display_file)
+
+
+def _rebuild_display(results_from_repo: Iterator['pypastry.experiment.results.Result']) -> None:
+    from datetime import datetime
+    from tempfile import NamedTemporaryFile
+
+    # Results are read from the repo after this time, so the rebuild includes every result saved before it
+    rebuild_start = str(datetime.utcnow())
+    rows = sorted((_get_display_row(result) for result in results_from_repo), key=lambda row: row['Run start'])
+
+    os.makedirs(DISPLAY_DIR, exist_ok=True)
+    with NamedTemporaryFile(mode='w', prefix='display-', suffix='.tmp', dir=DISPLAY_DIR,
+                            delete=False) as output_file:
+        for row in rows:
+            output_file.write(json.dumps(row) + '\n')
+    os.replace(output_file.name, DISPLAY_PATH)
+    with open(DISPLAY_REBUILT_PATH, 'w') as rebuilt_file:
+        rebuilt_file.write(rebuild_start)
+
+
+def _may_be_in_rebuild(result: 'pypastry.experiment.results.Result') -> bool:
+    # A result is saved after its run ends, so only a rebuild started after that can include it
     try:
-        os.mkdir(DISPLAY_DIR)
-    except FileExistsError:
-        pass
+        with open(DISPLAY_REBUILT_PATH) as rebuilt_file:
+            rebuild_start = rebuilt_file.read()
+    except FileNotFoundError:
+        return False
+    run_end = result.data.get('run_end')
+    return run_end is None or rebuild_start >= run_end
+
 
-    with open(DISPLAY_PATH, 'w') as output_file:
-        output_file.write(display)
+def _is_displayed(row: Dict[str, Any]) -> bool:
+    name = row['Result JSON name']
+    return any(displayed_row.get('Result JSON name') == name for displayed_row in _read_rows_backwards(DISPLAY_PATH))
 
 
 def _get_results_dataframe(results_from_repo: Iterator['pypastry.experiment.results.Result']) -> 'DataFrame':
+    return _get_rows_dataframe([_get_display_row(result) for result in results_from_repo])
+
+
+def _get_rows_dataframe(rows: List[Dict[str, Any]]) -> 'DataFrame':
     from pandas import DataFrame, set_option
     set_option('display.max_rows', None)
     set_option('display.max_columns', None)
     set_option('display.width', None)
-    set_option('display.max_colwidth', -1)
-    results = []
-    for repo_result in results_from_repo:
-        data = repo_result.data
-        result = {
-            'Git hash': data["git_hash"] if "git_hash" in data else "Unavailable",
-            'Summary': data["git_summary"] if "git_summary" in data else "Unavailable",
-            'Dataset hash': data['dataset']['hash'][:8],
-            'Dataset size': data['dataset']['size'] if "size" in data["dataset"] else "Unavailable",
-            'Result JSON name': data['result_json_name'] if "result_json_name" in data else "Unavailable",
-            'Run start': data['run_start'][:19],
-            'Model': data['model_info']['type'],
-            'Duration (s)': "{:.2f}".format(data['run_seconds']),
-        }
+    set_option('display.max_colwidth', None)
+    results_dataframe = DataFrame(rows)
+    return results_dataframe.sort_values(by='Run start').reset_index(drop=True)
+
 
+def _get_sort_key(value: Any) -> Tuple[int, Any]:
+    # Scores are displayed as "mean ± sem" so sort on the mean
+    if isinstance(value, str):
         try:
-            scores = DataFrame(data['results'])
-            for row in scores.itertuples():
-                result[row.Index] = "{:.3f} ± {:.3f}".format(row.test_score, row.test_score_sem)
+            return 0, float(value.split(' ')[0])
         except ValueError:
-            result['Score'] = "{:.3f} ± {:.3f}".format(data['results']['test_score'],
-                                                       data['results']['test_score_sem'])
+            return 1, value
+    if value is None:
+        return 2, ''
+    return 0, value
 
-        results.append(result)
-    results_dataframe = DataFrame(results)
-    return results_dataframe.sort_values(by='Run start').reset_index(drop=True)
 
+def _get_display_row(repo_result: 'pypastry.experiment.results.Result') -> Dict[str, Any]:
+    data = repo_result.data
+    result = {
+        'Git hash': data["git_hash"] if "git_hash" in data else "Unavailable",
+        'Summary': data["git_summary"] if "git_summary" in data else "Unavailable",
+        'Dataset hash': data['dataset']['hash'][:8],
+        'Dataset size': data['dataset']['size'] if "size" in data["dataset"] else "Unavailable",
+        'Result JSON name': data['result_json_name'] if "result_json_name" in data else "Unavailable",
+        'Run start': data['run_start'][:19],
+        'Model': data['model_info']['type'],
+        'Duration (s)': "{:.2f}".format(data['run_seconds']),
+    }
+    timings = data.get('timings')
+    if timings is not None:
+        # Summed over folds, so these can add up to more than the duration when folds run in parallel
+        result['Fit (s)'] = "{:.2f}".format(timings['fit_seconds'])
+        result['Predict (s)'] = "{:.2f}".format(timings['predict_seconds'])
+
+    scores = data['results']['test_score']
+    score_sems = data['results']['test_score_sem']
+    if isinstance(scores, dict):
+        for score_name, score in scores.items():
+            result[score_name] = "{:.3f} ± {:.3f}".format(score, score_sems[score_name])
+    else:
+        result['Score'] = "{:.3f} ± {:.3f}".format(scores, score_sems)
+    return result
+
+
+def print_scores(result: 'pypastry.experiment.results.Result') -> None:
+    """
+    Print the scores of a single result, so they are seen before the display cache is updated.
+    """
+    row = _get_display_row(result)
+    data = result.data['results']['test_score']
+    score_names = list(data) if isinstance(data, dict) else ['Score']
+    print("Scores: " + ", ".join("{} {}".format(name, row[name]) for name in score_names))
+
+
+def print_cache_file(limit: int = None, since: str = None, model: str = None, sort: str = 'Run start',
+                     reverse: bool = False) -> None:
+    """
+    Print the latest results in the display cache. The cache is read backwards from the end,
+    and reading stops as soon as limit matching rows are found or SINCE_WINDOW runs in a row
+    are older than since, so the time taken doesn't depend on the number of older results.
+    """
+    rows = []
+    older_rows = 0
+    for row in _read_rows_backwards(DISPLAY_PATH):
+        if since is not None and row['Run start'] < since:
+            older_rows += 1
+            if older_rows >= SINCE_WINDOW:
+                break
+            continue
+        older_rows = 0
+        if model is not None and row['Model'] != model:
+            continue
+        rows.append(row)
+        if limit is not None and len(rows) >= limit:
+            break
+
+    if len(rows) == 0:
+        print("No results yet")
+        return
+    if sort not in rows[0]:
+        raise UnknownColumnError("Unknown column to sort by: {}".format(sort))
+    rows = sorted(rows, key=lambda row: _get_sort_key(row.get(sort)), reverse=reverse)
+    print(_format_table(rows))
+
+
+def _format_table(rows: List[Dict[str, Any]]) -> str:
+    """
+    Lay out rows like the repr of a Pandas DataFrame, without having to import Pandas.
+    """
+    columns = []  # type: List[str]
+    for row in rows:
+        columns += [column for column in row if column not in columns]
+    index = [str(i) for i in range(len(rows))]
+    cells = [[str(row.get(column, 'NaN')) for column in columns] for row in rows]
+    index_width = max(len(value) for value in index)
+    widths = [max([len(column)] + [len(row_cells[i]) for row_cells in cells]) for i, column in enumerate(columns)]
+
+    lines = ['  '.join([' ' * index_width] + [column.rjust(width) for column, width in zip(columns, widths)])]
+    for row_index, row_cells in zip(index, cells):
+        lines.append('  '.join([row_index.ljust(index_width)] +
+                               [cell.rjust(width) for cell, width in zip(row_cells, widths)]))
+    return '\n'.join(lines)
 
-def print_cache_file(limit=False):
-    with open(DISPLAY_PATH) as display_file:
-        print(display_file.read())
-        # read_lines = display_file.read()
-        # read_list = read_lines.split("\n")
-        # if limit:
-        #     limit = min(limit, len(read_list)-3)
-        #     # to avoid printing more than there is
-        # else:
-        #     limit = len(read_list)-3
-        # print(read_list[0])
-        # print("\n".join(read_list[-(2+limit):-2]))
-        # print(read_list[-1])
 
+def _read_rows_backwards(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, 'rb') as display_file:
+        position = display_file_size = display_file.seek(0, os.SEEK_END)
+        remainder = b''
+        while position > 0:
+            read_size = min(READ_BLOCK_SIZE, position)
+            position -= read_size
+            display_file.seek(position)
+            lines = (display_file.read(read_size) + remainder).split(b'\n')
+            if position + read_size == display_file_size:
+                # Every row ends with a newline, so anything after the last one is a row still being written
+                lines[-1] = b''
+            remainder = lines[0]
+            for line in reversed(lines[1:]):
+                if line.strip():
+                    yield json.loads(line.decode('utf8'))
+        if remainder.strip():
+            yield json.loads(remainder.decode('utf8'))
@@ -1,30 +1,48 @@
-from typing import Any, Callable, Union, Iterable
+from typing import Any, Callable, Dict, Union, Iterable, List, Optional, TYPE_CHECKING
 
-from pandas import DataFrame
-from sklearn.base import BaseEstimator
-from sklearn.metrics import accuracy_score, make_scorer
-from sklearn.metrics._scorer import _BaseScorer as BaseScorer
+from pypastry.paths import TRANSFORMER_CACHE_PATH
+
+# Pandas and Scikit-learn are only imported when an experiment is created, so that
+# commands that just look at results, like pastry print, start quickly
+if TYPE_CHECKING:
+    from pandas import DataFrame
+    from sklearn.base import BaseEstimator
+    from sklearn.metrics._scorer import _BaseScorer as BaseScorer
+    from pypastry.experiment.executors import FoldExecutor
+
+BACKENDS = ['loky', 'threading', 'multiprocessing']
+DEFAULT_BATCH_SIZE = 100000
 
 
 class Experiment:
-    def __init__(self, dataset: DataFrame, label_column: str, predictor: BaseEstimator,
-                 cross_validator: Any = None, scorer: Union[BaseScorer, Iterable[BaseScorer]] = None,
-                 group_column: str=None, test_set: DataFrame = None, average_scores_on_instances: bool = False,
-                 additional_info: Callable[[BaseEstimator], Any] = None):
+    def __init__(self, dataset: 'DataFrame', label_column: str, predictor: 'BaseEstimator',
+                 cross_validator: Any = None, scorer: Union['BaseScorer', Iterable['BaseScorer']] = None,
+                 group_column: str=None, test_set: 'DataFrame' = None, average_scores_on_instances: bool = False,
+                 additional_info: Callable[['BaseEstimator'], Any] = None, n_jobs: int = None,
+                 backend: str = None, max_nbytes: Union[int, str, None] = '1M', hash_algorithm: str = 'sha1',
+                 legacy_hash: bool = False, dataset_paths: Iterable[str] = None, numpy_features: bool = False,
+                 trace_memory: bool = False, profile: bool = False, executor: 'FoldExecutor' = None,
+                 incremental: bool = False, param_grid: Union[Dict[str, Any], List[Dict[str, Any]]] = None,
+                 inner_cross_validator: Any = None, transformer_cache: Optional[str] = TRANSFORMER_CACHE_PATH,
+                 transformer_cache_size: int = None):
         if (test_set is not None) == (cross_validator is not None):
             raise ValueError("You must specify either a cross validator or a test set (and not both)")
 
         if average_scores_on_instances and group_column is not None:
             raise ValueError("You can only average on instances when not grouping instances")
 
-        if scorer is None:
-            scorer = [make_scorer(accuracy_score)]
+        scorer = _get_scorers(scorer)
+
+        if incremental:
+            from pypastry.experiment.incremental import AppendStableKFold
+            if not isinstance(cross_validator, AppendStableKFold):
+                raise ValueError("Incremental experiments need an AppendStableKFold cross validator")
 
-        if not isinstance(scorer, Iterable):
-            if not isinstance(scorer, BaseScorer):
-                raise ValueError("Scorer must be created using make_scorer()")
+        if inner_cross_validator is not None and param_grid is None:
+            raise ValueError("An inner cross validator needs a parameter grid to search")
 
-            scorer = [scorer]
+        if backend is not None and backend not in BACKENDS:
+            raise ValueError("Backend must be one of {}".format(", ".join(BACKENDS)))
 
         self.dataset = dataset
         self.label_column = label_column
@@ -35,3 +53,64 @@ class Experiment:
         self.test_set = test_set
         self.average_scores_on_instances = average_scores_on_instances
         self.additional_info = additional_info
+        self.n_jobs = n_jobs
+        self.backend = backend
+        self.max_nbytes = max_nbytes
+        self.hash_algorithm = hash_algorithm
+        self.legacy_hash = legacy_hash
+        self.dataset_paths = [dataset_paths] if isinstance(dataset_paths, str) else dataset_paths
+        self.numpy_features = numpy_features
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.executor = executor
+        self.incremental = incremental
+        self.param_grid = param_grid
+        self.inner_cross_validator = inner_cross_validator
+        self.transformer_cache = transformer_cache
+        self.transformer_cache_size = transformer_cache_size
+
+
+class StreamingExperiment:
+    """
+    An experiment on data that doesn't fit in memory. The dataset and test set are each either
+    the path of a Parquet file or directory, or a function returning an iterable of DataFrames.
+    The predictor is trained a batch at a time with partial_fit, and scored on the test set a
+    batch at a time.
+    """
+    def __init__(self, dataset: Union[str, Callable[[], Iterable['DataFrame']]], label_column: str,
+                 predictor: 'BaseEstimator', test_set: Union[str, Callable[[], Iterable['DataFrame']]],
+                 scorer: Union['BaseScorer', Iterable['BaseScorer']] = None, classes: Iterable[Any] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, additional_info: Callable[['BaseEstimator'], Any] = None,
+                 hash_algorithm: str = 'sha1'):
+        for source in (dataset, test_set):
+            if not isinstance(source, str) and not callable(source):
+                raise ValueError("The dataset and test set must be Parquet paths or functions returning DataFrames")
+
+        if not hasattr(predictor, 'partial_fit'):
+            raise ValueError("Streaming experiments need a predictor that supports partial_fit")
+
+        self.dataset = dataset
+        self.label_column = label_column
+        self.predictor = predictor
+        self.test_set = test_set
+        self.scorer = _get_scorers(scorer)
+        self.classes = classes
+        self.batch_size = batch_size
+        self.additional_info = additional_info
+        self.hash_algorithm = hash_algorithm
+        self.group_column = None
+
+
+def _get_scorers(scorer: Union['BaseScorer', Iterable['BaseScorer'], None]) -> List['BaseScorer']:
+    from sklearn.metrics import accuracy_score, make_scorer
+    from sklearn.metrics._scorer import _BaseScorer as BaseScorer
+
+    if scorer is None:
+        return [make_scorer(accuracy_score)]
+
+    if not isinstance(scorer, Iterable):
+        if not isinstance(scorer, BaseScorer):
+            raise ValueError("Scorer must be created using make_scorer()")
+
+        return [scorer]
+    return scorer
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Any, List, NamedTuple, Optional, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import joblib
+
+DEFAULT_MAX_SIZE = 1024 ** 3
+CACHE_SUFFIX = '.joblib'
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+CacheEntry = NamedTuple('CacheEntry', [('key', str), ('size', int), ('last_used', datetime)])
+
+
+class FoldCache:
+    """
+    Persistent store of fitted folds, keyed on everything that determines the outcome of a fold.
+
+    Entries are evicted least recently used first once the total size goes above max_size.
+    """
+    def __init__(self, cache_path: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.cache_path = cache_path
+        self.max_size = max_size
+
+    def get_key(self, experiment_key: str, train: np.ndarray, test: np.ndarray) -> str:
+        hasher = hashlib.sha1(experiment_key.encode('utf8'))
+        for indices in (train, test):
+            indices = np.ascontiguousarray(indices, dtype=np.int64)
+            hasher.update(str(len(indices)).encode('utf8'))
+            hasher.update(indices.tobytes())
+        return hasher.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        import joblib
+        path = self._get_path(key)
+        try:
+            value = joblib.load(str(path))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # A truncated entry, or one pickled by other versions of the code or libraries, can fail to
+            # load in many ways, and is then a miss that will be replaced
+            self._remove(key)
+            return None
+        # Touch the entry so that eviction sees it as recently used
+        os.utime(str(path))
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        import joblib
+        try:
+            os.makedirs(self.cache_path)
+        except FileExistsError:
+            pass
+        with NamedTemporaryFile(prefix='fold-', suffix='.tmp', dir=self.cache_path, delete=False) as output_file:
+            temp_path = output_file.name
+            joblib.dump(value, output_file)
+        os.replace(temp_path, str(self._get_path(key)))
+        self.prune(self.max_size)
+
+    def entries(self) -> List[CacheEntry]:
+        entries = []
+        try:
+            dir_entries = list(os.scandir(self.cache_path))
+        except FileNotFoundError:
+            return entries
+        for dir_entry in dir_entries:
+            if not dir_entry.name.endswith(CACHE_SUFFIX):
+                continue
+            stat = dir_entry.stat()
+            key = dir_entry.name[:-len(CACHE_SUFFIX)]
+            entries.append(CacheEntry(key, stat.st_size, datetime.fromtimestamp(stat.st_mtime)))
+        return sorted(entries, key=lambda entry: entry.last_used)
+
+    def prune(self, max_size: int) -> List[CacheEntry]:
+        entries = self.entries()
+        total_size = sum(entry.size for entry in entries)
+        removed = []
+        for entry in entries:
+            if total_size <= max_size:
+                break
+            self._remove(entry.key)
+            total_size -= entry.size
+            removed.append(entry)
+        return removed
+
+    def clear(self) -> List[CacheEntry]:
+        return self.prune(0)
+
+    def _remove(self, key: str) -> None:
+        try:
+            os.remove(str(self._get_path(key)))
+        except FileNotFoundError:
+            pass
+
+    def _get_path(self, key: str) -> Path:
+        return Path(self.cache_path) / (key + CACHE_SUFFIX)
+
+
+class TransformerCache:
+    """
+    The joblib Memory in which the pipelines of nested cross validation cache their fitted
+    transformers, with the same listing and pruning as FoldCache. Each entry is a transformer
+    fitted on some data, and is used when joblib reads it, as recorded by its access time.
+    """
+    def __init__(self, cache_path: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.cache_path = cache_path
+        self.max_size = max_size
+
+    def memory(self) -> 'joblib.Memory':
+        from joblib import Memory
+        return Memory(self.cache_path, verbose=0)
+
+    def entries(self) -> List[CacheEntry]:
+        if not os.path.isdir(self.cache_path):
+            return []
+        items = self.memory().store_backend.get_items()
+        entries = [CacheEntry(os.path.relpath(item.path, self.cache_path), item.size, item.last_access)
+                   for item in items]
+        return sorted(entries, key=lambda entry: entry.last_used)
+
+    def prune(self, max_size: int) -> List[CacheEntry]:
+        entries = self.entries()
+        total_size = sum(entry.size for entry in entries)
+        removed = []
+        for entry in entries:
+            if total_size <= max_size:
+                break
+            shutil.rmtree(os.path.join(self.cache_path, entry.key), ignore_errors=True)
+            total_size -= entry.size
+            removed.append(entry)
+        return removed
+
+    def clear(self) -> List[CacheEntry]:
+        removed = self.prune(0)
+        shutil.rmtree(self.cache_path, ignore_errors=True)
+        return removed
+
+
+def parse_size(size: str) -> int:
+    size = size.strip().upper().rstrip('B')
+    unit = size[-1:] if size[-1:] in SIZE_UNITS else ''
+    number = size[:len(size) - len(unit)]
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+def format_size(size: int) -> str:
+    for unit in ['', 'K', 'M', 'G']:
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = 'T'
+    return "{:.1f}{}B".format(size, unit) if unit else "{}B".format(size)
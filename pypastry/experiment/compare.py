@@ -0,0 +1,167 @@
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pypastry.experiment.results import Result, ResultsRepo
+
+DEFAULT_RESAMPLES = 10000
+DEFAULT_CONFIDENCE = 0.95
+# Resamples are drawn in batches of about this many values, to bound memory use
+BATCH_ELEMENTS = 2 ** 22
+# Differences are resampled by their distinct values when there are at most this
+# fraction as many distinct values as pairs, e.g. for per-instance accuracy
+COMPRESS_FRACTION = 8
+# Otherwise, when there are at least COMPRESS_FRACTION times this many pairs, e.g. for
+# per-instance squared error, the sorted differences are split into this many bins, each
+# resampled as the mean of its values
+MAX_BINS = 1024
+# The smallest and largest this many differences get a bin each, so outliers keep their weight
+TAIL_VALUES = 128
+
+
+Comparison = NamedTuple('Comparison', [('score', str), ('mean_a', float), ('mean_b', float), ('difference', float),
+                                       ('ci_low', float), ('ci_high', float), ('p_value', float), ('pairs', int)])
+
+
+def compare_results(results_repo: ResultsRepo, result_a: Result, result_b: Result, scores: Sequence[str] = None,
+                    n_resamples: int = DEFAULT_RESAMPLES, confidence: float = DEFAULT_CONFIDENCE,
+                    random_state: int = None) -> List[Comparison]:
+    """
+    Compare two results on each score in their results detail, pairing the score of each
+    fold, group or instance in result_a with the one in the same position in result_b, so
+    both results must have been run on the same dataset with the same cross validator.
+
+    The difference is the mean of b - a, with a paired bootstrap confidence interval and the
+    two-sided p-value of a sign-flip permutation test of whether it is zero. Scores default
+    to every numeric detail column in both results, other than the group column.
+    """
+    dataset_a, dataset_b = result_a.data['dataset']['hash'], result_b.data['dataset']['hash']
+    if dataset_a != dataset_b:
+        raise ValueError("Results were run on different datasets, {} and {}".format(dataset_a[:8], dataset_b[:8]))
+    group_column = result_a.data.get('group_column')
+    if group_column != result_b.data.get('group_column'):
+        raise ValueError("Results were grouped by different columns, {} and {}".format(
+            group_column, result_b.data.get('group_column')))
+    detail_a = results_repo.get_results_detail(result_a)
+    detail_b = results_repo.get_results_detail(result_b)
+    _check_paired(detail_a, detail_b, group_column)
+    if scores is None:
+        scores = [column for column in detail_a
+                  if column in detail_b and column != group_column and detail_a[column].dtype.kind in 'biuf']
+    random = np.random.default_rng(random_state)
+
+    comparisons = []
+    for score in scores:
+        if score not in detail_a or score not in detail_b:
+            raise ValueError("Score {} is not in the detail of both results".format(score))
+        a = np.asarray(detail_a[score], dtype=np.float64)
+        b = np.asarray(detail_b[score], dtype=np.float64)
+        if a.shape != b.shape:
+            raise ValueError("Results have {} and {} values of {}, so can't be paired".format(
+                len(a), len(b), score))
+        paired = ~(np.isnan(a) | np.isnan(b))
+        a, b = a[paired], b[paired]
+        if len(a) == 0:
+            raise ValueError("There are no pairs of {} to compare".format(score))
+        differences = b - a
+        ci_low, ci_high = bootstrap_interval(differences, n_resamples, confidence, random)
+        p_value = permutation_test(differences, n_resamples, random)
+        comparisons.append(Comparison(score, a.mean(), b.mean(), differences.mean(), ci_low, ci_high, p_value,
+                                      len(a)))
+    return comparisons
+
+
+def _check_paired(detail_a: Dict[str, np.ndarray], detail_b: Dict[str, np.ndarray],
+                  group_column: Optional[str]) -> None:
+    rows_a = len(next(iter(detail_a.values()), []))
+    rows_b = len(next(iter(detail_b.values()), []))
+    if rows_a != rows_b:
+        raise ValueError("Results have {} and {} rows of detail, so can't be paired".format(rows_a, rows_b))
+    if group_column is not None and not np.array_equal(detail_a[group_column], detail_b[group_column]):
+        raise ValueError("Results have different {} groups, so can't be paired".format(group_column))
+
+
+def bootstrap_interval(differences: np.ndarray, n_resamples: int = DEFAULT_RESAMPLES,
+                       confidence: float = DEFAULT_CONFIDENCE,
+                       random: np.random.Generator = None) -> Tuple[float, float]:
+    """
+    Percentile bootstrap confidence interval of the mean of the paired differences.
+    """
+    if random is None:
+        random = np.random.default_rng()
+    means = np.concatenate(list(_bootstrap_means(differences, n_resamples, random)))
+    tail = (1 - confidence) / 2
+    low, high = np.quantile(means, [tail, 1 - tail])
+    return float(low), float(high)
+
+
+def permutation_test(differences: np.ndarray, n_resamples: int = DEFAULT_RESAMPLES,
+                     random: np.random.Generator = None) -> float:
+    """
+    Two-sided p-value of the mean of the paired differences under random sign flips,
+    i.e. randomly swapping which result each score came from.
+    """
+    if random is None:
+        random = np.random.default_rng()
+    observed = abs(differences.mean())
+    # Allow for rounding error in sums taken in a different order
+    threshold = observed - 1e-12 * max(observed, 1.0)
+    extreme = sum(int(np.count_nonzero(np.abs(means) >= threshold))
+                  for means in _sign_flip_means(differences, n_resamples, random))
+    return (extreme + 1) / (n_resamples + 1)
+
+
+def _bootstrap_means(differences: np.ndarray, n_resamples: int, random: np.random.Generator) -> Iterator[np.ndarray]:
+    n = len(differences)
+    compressed = _compress(differences)
+    if compressed is not None:
+        # How many times each value is drawn is multinomial, so there is no need to draw every pair
+        values, counts = compressed
+        for batch in _get_batches(n_resamples, len(values)):
+            yield random.multinomial(n, counts / n, size=batch) @ values / n
+    else:
+        for batch in _get_batches(n_resamples, n):
+            yield differences[random.integers(0, n, size=(batch, n))].mean(axis=1)
+
+
+def _sign_flip_means(differences: np.ndarray, n_resamples: int,
+                     random: np.random.Generator) -> Iterator[np.ndarray]:
+    n = len(differences)
+    compressed = _compress(np.abs(differences))
+    if compressed is not None:
+        # The number of positive signs among the pairs sharing an absolute value is binomial
+        values, counts = compressed
+        for batch in _get_batches(n_resamples, len(values)):
+            positive = random.binomial(counts, 0.5, size=(batch, len(values)))
+            yield (2 * positive - counts) @ values / n
+    else:
+        for batch in _get_batches(n_resamples, n):
+            signs = np.unpackbits(random.integers(0, 256, size=(batch, (n + 7) // 8), dtype=np.uint8),
+                                  axis=1, count=n)
+            yield (2 * (signs @ differences) - differences.sum()) / n
+
+
+def _compress(differences: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Values to resample in place of the differences, with how many differences each stands for,
+    or None if every difference should be resampled. The values are the distinct differences if
+    there are few of them, and otherwise the means of MAX_BINS bins of the sorted differences,
+    equal in size apart from the tails. Binning keeps the mean of the differences, and loses
+    only the variance within each bin, so resampling costs O(MAX_BINS) rather than O(n).
+    """
+    n = len(differences)
+    values, counts = np.unique(differences, return_counts=True)
+    if len(values) * COMPRESS_FRACTION <= n:
+        return values, counts
+    if n < MAX_BINS * COMPRESS_FRACTION:
+        return None
+    middle = np.linspace(TAIL_VALUES, n - TAIL_VALUES, MAX_BINS - 2 * TAIL_VALUES + 1).astype(np.int64)
+    starts = np.concatenate([np.arange(TAIL_VALUES), middle[:-1], np.arange(n - TAIL_VALUES, n + 1)])
+    sizes = np.diff(starts)
+    return np.add.reduceat(values.repeat(counts), starts[:-1]) / sizes, sizes
+
+
+def _get_batches(n_resamples: int, row_size: int) -> Iterator[int]:
+    batch_size = max(1, BATCH_ELEMENTS // max(row_size, 1))
+    for start in range(0, n_resamples, batch_size):
+        yield min(batch_size, n_resamples - start)
@@ -1,25 +1,46 @@
+import cProfile
+import hashlib
 import json
+from copy import copy
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from types import ModuleType
-from typing import Any, Dict, Tuple, List
+from typing import Any, Dict, Tuple, List, NamedTuple, Optional, Sequence, TYPE_CHECKING, Union
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
-from git import Repo
-from joblib import Parallel, delayed
 from pandas import Series
 from sklearn.base import BaseEstimator, is_classifier, clone
-from sklearn.metrics._scorer import _BaseScorer
 from sklearn.model_selection import check_cv, PredefinedSplit
 
 from pypastry import display
-from pypastry.experiment import Experiment
-from pypastry.experiment.hasher import get_dataset_hash
-from pypastry.experiment.results import ResultsRepo
-from pypastry.paths import REPO_PATH, RESULTS_PATH
+from pypastry.experiment import Experiment, StreamingExperiment
+from pypastry.experiment.cache import FoldCache, DEFAULT_MAX_SIZE
+from pypastry.experiment.executors import JoblibExecutor
+from pypastry.experiment.hasher import get_dataset_hash, get_frame_metadata, get_memoized_hash, \
+    LEGACY_HASH_ALGORITHM
+from pypastry.experiment.incremental import IncrementalBase, get_incremental_fit, get_prefix_hashes, \
+    get_update_method, is_prefix, reset_warm_start, PREFIX_CHUNK_ROWS
+from pypastry.experiment.models import ModelStore
+from pypastry.experiment.nested import get_best_params, get_fold_predictor, has_fixed_inner_splits, \
+    prune_transformer_cache
+from pypastry.experiment.results import ResultsRepo, Result
+from pypastry.experiment.scoring import ResponseCache, score_groups, score_predictions
+from pypastry.experiment.profiling import merge_profiles, profile_fold
+from pypastry.experiment.timing import Timings, measure
+from pypastry.paths import REPO_PATH, RESULTS_PATH, RESULTS_INDEX_PATH, FOLD_CACHE_PATH, HASH_MEMO_PATH, \
+    MODEL_STORE_PATH
+
+if TYPE_CHECKING:
+    from git import Repo
 
 MAX_PARAMETER_VALUE_LENGTH = 500
+DIRTY_REPO_MESSAGE = ("There are untracked/unstaged/staged changes in git repo, force flag was not given. "
+                      "Please commit your changes or provide force flag - note that in this case "
+                      "saved commit hash in your result file will not correspond to the actual code!")
+
+GitState = NamedTuple('GitState', [('hexsha', str), ('dirty', bool)])
 
 
 class DirtyRepoError(Exception):
@@ -28,10 +49,15 @@ class DirtyRepoError(Exception):
 
 
 class ExperimentRunner:
-    def __init__(self, git_repo: Repo, results_repo: ResultsRepo, results_display: ModuleType):
+    def __init__(self, git_repo: 'Repo', results_repo: ResultsRepo, results_display: ModuleType,
+                 fold_cache: FoldCache = None, model_store: ModelStore = None,
+                 untracked_files: Union[bool, Sequence[str]] = False):
         self.git_repo = git_repo
         self.results_repo = results_repo
         self.results_display = results_display
+        self.fold_cache = fold_cache
+        self.model_store = model_store
+        self.untracked_files = untracked_files
 
     def run_experiment(
         self,
@@ -42,43 +68,209 @@ class ExperimentRunner:
         show_results: bool = True,
     ) -> Tuple[List[BaseEstimator], Path]:
 
-        print("Got dataset with {} rows".format(len(experiment.dataset)))
-        if force or not self.git_repo.is_dirty():
-            print("Running evaluation")
-            estimators, result_file_path = self._run_evaluation(experiment, message)
-            results = self.results_repo.get_results()
-            self.results_display.cache_display(results)
+        if isinstance(experiment, StreamingExperiment):
+            print("Streaming dataset from {}".format(experiment.dataset))
         else:
-            raise DirtyRepoError("There are untracked/unstaged/staged changes in git repo, force flag was not given. "
-                                 "Please commit your changes or provide force flag - note that in this case "
-                                 "saved commit hash in your result file will not correspond to the actual code!")
+            print("Got dataset with {} rows".format(len(experiment.dataset)))
+        # git status can take seconds in a large repo, so it runs while the dataset is hashed, or
+        # while the whole evaluation runs if the repo is allowed to be dirty
+        git_state = self._start_git_state()
+        print("Running evaluation")
+        timings = Timings(getattr(experiment, 'trace_memory', False))
+        estimators, result_file_path, result = self._run_evaluation(experiment, message, timings, git_state, force)
+        if show_results:
+            self.results_display.print_scores(result)
+        # The display is updated after the result is saved, so this phase is only seen by listeners
+        with timings.phase('display'):
+            self.results_display.update_display(result, self.results_repo)
         if show_results:
             self.results_display.print_cache_file(limit)
 
         return estimators, result_file_path
 
-    def _run_evaluation(self, experiment: Experiment, message: str) -> Tuple[List[BaseEstimator], Path]:
-        run_info, estimators = evaluate_predictor(experiment)
-        dataset_hash = get_dataset_hash(experiment.dataset, experiment.test_set)
-        dataset_info = {
-            'hash': dataset_hash,
-            'columns': experiment.dataset.columns.tolist(),
-            'size': len(experiment.dataset),
-        }
-        git_info = {
-            "git_hash_msg": ("dirty_" if self.git_repo.is_dirty() else "") + self.git_repo.head.object.hexsha[:8],
+    def _run_evaluation(self, experiment: Experiment, message: str, timings: Timings = None,
+                        git_state: 'Future[GitState]' = None,
+                        force: bool = True) -> Tuple[List[BaseEstimator], Path, Result]:
+        if timings is None:
+            timings = Timings()
+        if git_state is None:
+            git_state = self._start_git_state()
+        profiler = cProfile.Profile() if getattr(experiment, 'profile', False) else None
+        if profiler is not None:
+            profiler.enable()
+        try:
+            if isinstance(experiment, StreamingExperiment):
+                from pypastry.experiment.streaming import evaluate_streaming
+                self._check_clean(git_state, force, timings)
+                with timings.phase('stream'):
+                    run_info, estimators, dataset_info = evaluate_streaming(experiment)
+            else:
+                with timings.phase('hash'):
+                    dataset_hash = get_experiment_hash(experiment)
+                    prefix_hashes = None
+                    if experiment.incremental:
+                        prefix_hashes = get_experiment_prefix_hashes(experiment)
+                self._check_clean(git_state, force, timings)
+                base = None
+                if prefix_hashes is not None:
+                    with timings.phase('incremental'):
+                        base = self._get_incremental_base(experiment, prefix_hashes)
+                run_info, estimators = evaluate_predictor(experiment, self.fold_cache, dataset_hash, timings, base)
+                dataset_info = get_dataset_info(experiment, dataset_hash)
+                if prefix_hashes is not None:
+                    dataset_info['prefix_hashes'] = prefix_hashes
+            with timings.phase('git'):
+                git_info = self._get_git_info(message, git_state.result())
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        if self.model_store is not None:
+            with timings.phase('models'):
+                run_info['models'] = [self.model_store.put(estimator) for estimator in estimators]
+        run_info['timings'] = timings.to_dict()
+        profile_stats = None if profiler is None else merge_profiles(profiler, timings.fold_profiles)
+        result_file_path = self.results_repo.save_results(run_info, dataset_info, git_info=git_info,
+                                                          profile_stats=profile_stats)
+
+        return estimators, result_file_path, Result(run_info)
+
+    def run_sweep(self, experiment: Experiment, candidates: List[Dict[str, Any]], message: str = "",
+                  force: bool = False, limit: int = None, show_results: bool = True, factor: int = 3,
+                  min_folds: int = 1) -> List[Path]:
+        """
+        Evaluate the experiment's predictor with each set of parameters in candidates, racing
+        them with successive halving, and save a result for each candidate that survives.
+        """
+        from pypastry.experiment.sweep import successive_halving
+
+        print("Got dataset with {} rows".format(len(experiment.dataset)))
+        git_state = self._start_git_state()
+        dataset_hash = get_experiment_hash(experiment)
+        self._check_clean(git_state, force)
+
+        print("Running sweep over {} candidates".format(len(candidates)))
+        dataset_info = get_dataset_info(experiment, dataset_hash)
+        survivors = successive_halving(experiment, candidates, factor, min_folds, dataset_hash)
+
+        result_file_paths = []
+        for survivor in survivors:
+            candidate_experiment = copy(experiment)
+            candidate_experiment.predictor = clone(experiment.predictor).set_params(**survivor.parameters)
+            # Candidates' folds are interleaved, so each survivor's run spans its own folds
+            start, end = (datetime.utcfromtimestamp(timestamp) for timestamp in survivor.timings.get_fold_span())
+            run_info = get_run_info(candidate_experiment, survivor.scores, survivor.estimators, start, end)
+            run_info['timings'] = survivor.timings.to_dict()
+            run_info['sweep'] = {
+                'parameters': survivor.parameters,
+                'rank': survivor.rank,
+                'candidates': len(candidates),
+            }
+            if self.model_store is not None:
+                run_info['models'] = [self.model_store.put(estimator) for estimator in survivor.estimators]
+            parameters = ", ".join("{}={}".format(name, value) for name, value in survivor.parameters.items())
+            summary = "{} ({})".format(message, parameters) if message else parameters
+            git_info = self._get_git_info(summary, git_state.result())
+            result_file_paths.append(self.results_repo.save_results(run_info, dataset_info, git_info=git_info))
+            if show_results:
+                self.results_display.print_scores(Result(run_info))
+            self.results_display.update_display(Result(run_info), self.results_repo)
+
+        if show_results:
+            self.results_display.print_cache_file(limit)
+        return result_file_paths
+
+    def _get_incremental_base(self, experiment: Experiment,
+                              prefix_hashes: Dict[str, Any]) -> Optional[IncrementalBase]:
+        """
+        Find the latest run of the same experiment on the first rows of the dataset, with
+        the estimators it fitted, or None if there isn't one.
+        """
+        if self.model_store is None:
+            return None
+        key = get_incremental_key(experiment)
+        n_splits = experiment.cross_validator.get_n_splits()
+        results = self.results_repo.get_results(model=type(experiment.predictor).__name__)
+        by_size = sorted(results, key=lambda result: (result.data['dataset'].get('size', 0), result.data['run_start']),
+                         reverse=True)
+        for result in by_size:
+            data = result.data
+            if data.get('incremental', {}).get('key') != key or len(data.get('models', [])) != n_splits:
+                continue
+            if is_prefix(data['dataset'], experiment.dataset, prefix_hashes, experiment.hash_algorithm):
+                print("Updating the models of {} on {} rows".format(data['result_json_name'], data['dataset']['size']))
+                # Estimators are updated in place, so they can't be memory-mapped
+                estimators = self.model_store.load_models(result, mmap_mode=None)
+                return IncrementalBase(data['result_json_name'], data['dataset']['size'], estimators)
+        return None
+
+    def _start_git_state(self) -> 'Future[GitState]':
+        """
+        Start reading the state of the git repo in a background thread. GitPython runs git
+        in a subprocess, so this overlaps with work done in the meantime.
+        """
+        executor = ThreadPoolExecutor(max_workers=1)
+        git_state = executor.submit(get_git_state, self.git_repo, self.untracked_files)
+        executor.shutdown(wait=False)
+        return git_state
+
+    @staticmethod
+    def _check_clean(git_state: 'Future[GitState]', force: bool, timings: Timings = None) -> None:
+        if force:
+            return
+        if timings is None:
+            timings = Timings()
+        with timings.phase('git'):
+            dirty = git_state.result().dirty
+        if dirty:
+            raise DirtyRepoError(DIRTY_REPO_MESSAGE)
+
+    def _get_git_info(self, message: str, git_state: GitState = None) -> Dict[str, str]:
+        if git_state is None:
+            git_state = get_git_state(self.git_repo, self.untracked_files)
+        return {
+            "git_hash_msg": ("dirty_" if git_state.dirty else "") + git_state.hexsha[:8],
             "git_summary_msg": message,
         }
-        result_file_path = self.results_repo.save_results(run_info, dataset_info, git_info=git_info)
-
-        return estimators, result_file_path
 
 
-def evaluate_predictor(experiment: Experiment) -> Dict[str, Tuple[Any, List[BaseEstimator]]]:
+def get_git_state(git_repo: 'Repo', untracked_files: Union[bool, Sequence[str]] = False) -> GitState:
+    """
+    Get the commit checked out in the repo and whether there are changes on top of it.
+    Untracked files count as changes if untracked_files is true, or only those under
+    the given paths if it is a list of paths, so that git doesn't scan large data
+    directories for them.
+    """
+    if isinstance(untracked_files, bool):
+        dirty = git_repo.is_dirty(untracked_files=untracked_files)
+    else:
+        dirty = git_repo.is_dirty()
+        if not dirty and len(untracked_files) > 0:
+            untracked = git_repo.git.ls_files('--others', '--exclude-standard', '--', *untracked_files)
+            dirty = len(untracked) > 0
+    return GitState(git_repo.head.object.hexsha, dirty)
+
+
+def evaluate_predictor(experiment: Experiment, fold_cache: FoldCache = None, dataset_hash: str = None,
+                       timings: Timings = None,
+                       base: IncrementalBase = None) -> Dict[str, Tuple[Any, List[BaseEstimator]]]:
+    if timings is None:
+        timings = Timings(experiment.trace_memory)
     start = datetime.utcnow()
-    scores, estimators = _get_scores_and_estimators(experiment)
+    scores, estimators = _get_scores_and_estimators(experiment, fold_cache, dataset_hash, timings, base)
     end = datetime.utcnow()
 
+    run_info = get_run_info(experiment, scores, estimators, start, end)
+    run_info['timings'] = timings.to_dict()
+    if experiment.incremental:
+        run_info['incremental'] = {'key': get_incremental_key(experiment)}
+        if base is not None:
+            run_info['incremental'].update({'base': base.name, 'base_size': base.size,
+                                            'method': get_update_method(base.estimators[0])})
+    return run_info, estimators
+
+
+def get_run_info(experiment: Experiment, scores: List[Tuple[Any, Dict[str, float]]], estimators: List[BaseEstimator],
+                 start: datetime, end: datetime) -> Dict[str, Any]:
     additional = experiment.additional_info
     additional_info = [additional(estimator) if additional is not None else None
                        for estimator in estimators]
@@ -95,7 +287,9 @@ def evaluate_predictor(experiment: Experiment) -> Dict[str, Tuple[Any, List[Base
     sem_score = scores_array.sem().to_dict()
     results = {'test_score': mean_score, 'test_score_sem': sem_score}
 
-    model_info = get_model_info(experiment.predictor)
+    model_info = get_model_info(experiment.predictor, estimators)
+    if getattr(experiment, 'param_grid', None) is not None:
+        model_info['param_grid'] = experiment.param_grid
 
     run_info = {
         'run_start': str(start),
@@ -106,19 +300,165 @@ def evaluate_predictor(experiment: Experiment) -> Dict[str, Tuple[Any, List[Base
         'model_info': model_info,
         'additional_info': additional_info,
     }
-
-    return run_info, estimators
+    if experiment.group_column is not None:
+        run_info['group_column'] = experiment.group_column
+    return run_info
+
+
+def get_experiment_hash(experiment: Experiment) -> str:
+    def compute_hash():
+        return get_dataset_hash(experiment.dataset, experiment.test_set, experiment.hash_algorithm,
+                                experiment.n_jobs, experiment.legacy_hash)
+
+    if experiment.dataset_paths is None:
+        return compute_hash()
+    algorithm = LEGACY_HASH_ALGORITHM if experiment.legacy_hash else experiment.hash_algorithm
+    # The files may be read into different frames, for example if pie.py drops columns or rows
+    settings = json.dumps([algorithm, get_frame_metadata(experiment.dataset, experiment.test_set)])
+    return get_memoized_hash(experiment.dataset_paths, HASH_MEMO_PATH, settings, compute_hash)
+
+
+def get_experiment_prefix_hashes(experiment: Experiment) -> Dict[str, Any]:
+    """
+    The prefix hashes of an incremental experiment's dataset, memoized like the dataset hash,
+    so that unchanged files are only hashed once, rather than once for each kind of hash.
+    """
+    if experiment.dataset_paths is None:
+        return get_prefix_hashes(experiment.dataset, experiment.hash_algorithm)
+    settings = json.dumps(['prefix', experiment.hash_algorithm, PREFIX_CHUNK_ROWS,
+                           get_frame_metadata(experiment.dataset)])
+    prefix_hashes = get_memoized_hash(
+        experiment.dataset_paths, HASH_MEMO_PATH, settings,
+        lambda: json.dumps(get_prefix_hashes(experiment.dataset, experiment.hash_algorithm)))
+    return json.loads(prefix_hashes)
+
+
+def get_dataset_info(experiment: Experiment, dataset_hash: str) -> Dict[str, Any]:
+    return {
+        'hash': dataset_hash,
+        'hash_algorithm': LEGACY_HASH_ALGORITHM if experiment.legacy_hash else experiment.hash_algorithm,
+        'columns': experiment.dataset.columns.tolist(),
+        'size': len(experiment.dataset),
+    }
 
 
-def get_model_info(model: BaseEstimator):
+def get_model_info(model: BaseEstimator, estimators: List[BaseEstimator] = ()):
     all_info = model.get_params()
     info = {key: value for key, value in all_info.items()
             if len(json.dumps(value, default=str)) < MAX_PARAMETER_VALUE_LENGTH}
     info['type'] = type(model).__name__
+    best_params = get_best_params(estimators)
+    if best_params is not None:
+        info['best_params'] = best_params
     return info
 
 
-def _get_scores_and_estimators(experiment: Experiment) -> Tuple[List[float], List[Any]]:
+def get_incremental_key(experiment: Experiment) -> str:
+    """
+    Identify the experiment settings that must be the same for a run to update the
+    estimators of an earlier run on the first rows of its dataset.
+    """
+    key_info = [_get_fold_cache_key(experiment, None), repr(experiment.cross_validator),
+                experiment.hash_algorithm]
+    return hashlib.sha1(json.dumps(key_info).encode('utf8')).hexdigest()
+
+
+def _get_fold_cache_key(experiment: Experiment, dataset_hash: str, base: IncrementalBase = None) -> str:
+    model_params = experiment.predictor.get_params(deep=True)
+    scorers = [(scorer._score_func.__name__, scorer._sign, scorer._kwargs) for scorer in experiment.scorer]
+    key_info = {
+        'dataset_hash': dataset_hash,
+        'model_type': type(experiment.predictor).__name__,
+        'model_params': model_params,
+        'scorers': scorers,
+        'label_column': experiment.label_column,
+        'group_column': experiment.group_column,
+        'average_scores_on_instances': experiment.average_scores_on_instances,
+        'numpy_features': experiment.numpy_features,
+    }
+    if experiment.param_grid is not None:
+        key_info['param_grid'] = experiment.param_grid
+        key_info['inner_cross_validator'] = repr(experiment.inner_cross_validator)
+    if base is not None and get_update_method(base.estimators[0]) != 'refit':
+        # Folds updated from the estimators of an earlier run differ from folds fitted from scratch
+        key_info['incremental_base'] = [base.name, get_update_method(base.estimators[0])]
+    return json.dumps(key_info, sort_keys=True, default=str)
+
+
+def _get_scores_and_estimators(experiment: Experiment, fold_cache: FoldCache = None, dataset_hash: str = None,
+                               timings: Timings = None,
+                               base: IncrementalBase = None) -> Tuple[List[float], List[Any]]:
+    if timings is None:
+        timings = Timings(experiment.trace_memory)
+    with timings.phase('split'):
+        X, y, groups, train_test = get_folds(experiment)
+
+    scores_and_estimators = [None] * len(train_test)  # type: List[Any]
+    fold_keys = [None] * len(train_test)  # type: List[str]
+    if fold_cache is not None and not has_fixed_inner_splits(experiment):
+        print("Not caching folds, as the inner cross validator shuffles without a fixed random_state")
+        fold_cache = None
+    if fold_cache is not None:
+        if dataset_hash is None:
+            dataset_hash = get_experiment_hash(experiment)
+        experiment_key = _get_fold_cache_key(experiment, dataset_hash, base)
+        for i, (train, test) in enumerate(train_test):
+            fold_keys[i] = fold_cache.get_key(experiment_key, train, test)
+            scores_and_estimators[i] = fold_cache.get(fold_keys[i])
+            if scores_and_estimators[i] is not None:
+                timings.add_fold(i, {'cached': True})
+    uncached_folds = [i for i, value in enumerate(scores_and_estimators) if value is None]
+    if len(uncached_folds) < len(train_test):
+        print("Reusing {} cached folds".format(len(train_test) - len(uncached_folds)))
+
+    # We clone the estimator to make sure that all the folds are
+    # independent, and that it is pickle-able. Given a base, its estimators are updated instead.
+    predictor = get_fold_predictor(experiment)
+    fits = [get_incremental_fit(predictor, base, i, train_test[i][0], train_test[i][1]) for i in uncached_folds]
+    with timings.phase('folds'):
+        fitted = fit_folds(experiment, X, y, groups, fits, dataset_hash)
+    prune_transformer_cache(experiment, predictor)
+    for i, (scores, estimator, fold_timings) in zip(uncached_folds, fitted):
+        if base is not None:
+            estimator = reset_warm_start(predictor, estimator)
+        scores_and_estimators[i] = (scores, estimator)
+        timings.add_fold(i, fold_timings)
+        if fold_cache is not None:
+            fold_cache.put(fold_keys[i], (scores, estimator))
+
+    scores_lists, estimators = zip(*scores_and_estimators)
+    scores = [score for score_list in scores_lists for score in score_list]
+    return scores, estimators
+
+
+def get_folds(experiment: Experiment):
+    """
+    Return the features, labels and groups of the experiment, and the train and
+    test indices of every fold of its cross validator.
+    """
+    if experiment.numpy_features:
+        X, y, groups, cross_validator = _get_feature_matrix(experiment)
+    else:
+        X, y, groups, cross_validator = _get_feature_frame(experiment)
+
+    cv = check_cv(cross_validator, y, classifier=is_classifier(experiment.predictor))
+    return X, y, groups, list(cv.split(X, y, groups))
+
+
+def fit_folds(experiment: Experiment, X, y, groups, fits: List[Tuple[Any, ...]],
+              dataset_hash: str = None) -> List[Tuple[List[Any], BaseEstimator]]:
+    """
+    Fit each estimator on its train indices and score it on its test indices, running
+    the fits with the experiment's executor, or with joblib if it doesn't have one.
+    A fit may have a fourth element, true to update the estimator with partial_fit.
+    Returns the scores, fitted estimator and timings of each fit.
+    """
+    fits = [tuple(fit) if len(fit) == 4 else tuple(fit) + (False,) for fit in fits]
+    executor = getattr(experiment, 'executor', None) or JoblibExecutor()
+    return executor.run_folds(experiment, X, y, groups, fits, dataset_hash)
+
+
+def _get_feature_frame(experiment: Experiment):
     if experiment.test_set is not None:
         assert experiment.cross_validator is None, "Cannot use a cross validator with train test split"
         dataset = pd.concat([experiment.dataset, experiment.test_set])
@@ -138,75 +478,97 @@ def _get_scores_and_estimators(experiment: Experiment) -> Tuple[List[float], Lis
     else:
         groups = X[experiment.group_column]
         X = X.drop(columns=[experiment.group_column])
+    return X, y, groups, cross_validator
 
-    cv = check_cv(cross_validator, y, classifier=is_classifier(experiment.predictor))
-    train_test = cv.split(X, y, groups)
-
-    # We clone the estimator to make sure that all the folds are
-    # independent, and that it is pickle-able.
-    parallel = Parallel(n_jobs=None, verbose=False,
-                        pre_dispatch='2*n_jobs')
-    scores_and_estimators = parallel(
-        delayed(_fit_and_predict)(
-            clone(experiment.predictor), X, y, train, test, groups, experiment.scorer)
-        for train, test in train_test)
-    scores_lists, estimators = zip(*scores_and_estimators)
-    scores = [score for score_list in scores_lists for score in score_list]
-    return scores, estimators
 
+def _get_feature_matrix(experiment: Experiment):
+    """
+    Copy the features of the dataset and test set straight into a single row-major NumPy
+    matrix, without concatenating or dropping columns from DataFrames first. Folds made of
+    consecutive rows, such as the train and test parts of a test set split, are then views.
+    """
+    frames = [experiment.dataset]
+    cross_validator = experiment.cross_validator
+    if experiment.test_set is not None:
+        assert experiment.cross_validator is None, "Cannot use a cross validator with train test split"
+        frames.append(experiment.test_set)
+        split = np.array([-1] * len(experiment.dataset) + [1] * len(experiment.test_set))
+        cross_validator = PredefinedSplit(split)
 
-def _fit_and_predict(estimator: BaseEstimator, X, y, train, test, groups, scorer):
-    if groups is not None:
-        scores = _fit_and_predict_groups(X, estimator, groups, scorer, test, train, y)
+    excluded_columns = {experiment.label_column, experiment.group_column}
+    feature_columns = [column for column in experiment.dataset.columns if column not in excluded_columns]
+    dtype = np.result_type(*[experiment.dataset[column].dtype for column in feature_columns])
+    X = np.empty((sum(len(frame) for frame in frames), len(feature_columns)), dtype=dtype)
+    start = 0
+    for frame in frames:
+        for i, column in enumerate(feature_columns):
+            X[start:start + len(frame), i] = frame[column].to_numpy()
+        start += len(frame)
+
+    y = np.concatenate([frame[experiment.label_column].to_numpy() for frame in frames])
+    if experiment.group_column is not None:
+        groups = np.concatenate([frame[experiment.group_column].to_numpy() for frame in frames])
+    elif experiment.average_scores_on_instances:
+        groups = np.arange(len(X))
     else:
-        scores = _fit_and_predict_simple(X, estimator, scorer, test, train, y)
-    return scores, estimator
-
-
-def _fit_and_predict_simple(X, estimator, scorers, test, train, y):
-    X_train = X.iloc[train]
-    y_train = y.iloc[train]
-    estimator.fit(X_train, y_train)
-    X_test = X.iloc[test]
-    y_test = y.iloc[test]
-    score = _score(scorers, estimator, X_test, y_test)
-    return [(None, score)]
-
-
-def _fit_and_predict_groups(X, estimator, groups, scorers, test, train, y):
-    X_train = X.iloc[train]
-    y_train = y.iloc[train]
-    estimator.fit(X_train, y_train)
-    X_test = X.iloc[test]
-    y_test = y.iloc[test]
-    groups_test = groups.iloc[test]
-    test_df = pd.DataFrame(X_test)
-    test_df['y'] = y_test
-    test_df['groups'] = groups_test
-    test_groups = test_df.groupby('groups')
-    scores = []
-    for key, group in test_groups:
-        X_group = group[X.columns]
-        score = _score(scorers, estimator, X_group, group['y'])
-        scores.append((key, score))
-    return scores
-
-
-def _score(scorers: List[_BaseScorer], estimator, X_test, y_test):
-    scores = {}
-    for scorer in scorers:
-        score = scorer(estimator, X_test, y_test)
-        score_name = scorer._score_func.__name__
-        sign = scorer._sign
-        score_ignoring_sign = score*sign
-        scores[score_name] = score_ignoring_sign
-    return scores
-
-
-def run_experiment(experiment, message="", force=False, show_results=True) -> Tuple[List[BaseEstimator], Path]:
+        groups = None
+    return X, y, groups, cross_validator
+
+
+def _take(data, indices: np.ndarray):
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        return data.iloc[indices]
+    # Take a view rather than a copy when the indices are a range
+    if len(indices) > 0 and indices[-1] - indices[0] + 1 == len(indices) and np.all(np.diff(indices) == 1):
+        return data[indices[0]:indices[-1] + 1]
+    return data[indices]
+
+
+def _fit_and_predict(estimator: BaseEstimator, X, y, train, test, groups, scorers, trace_memory: bool = False,
+                     profile_owner: Tuple[int, int] = None, partial: bool = False):
+    with profile_fold(profile_owner) as fold_profile:
+        with measure(trace_memory) as fit_measurement:
+            if not partial:
+                estimator.fit(_take(X, train), _take(y, train))
+            elif len(train) > 0:
+                estimator.partial_fit(_take(X, train), _take(y, train))
+        X_test = _take(X, test)
+        y_test = _take(y, test)
+        responses = ResponseCache(X_test)
+        with measure(trace_memory) as test_measurement:
+            if groups is not None:
+                # Predictions are made once for the whole test set, and then scored for each group
+                scores = score_groups(scorers, estimator, X_test, y_test, _take(groups, test), responses)
+            else:
+                scores = [(None, score_predictions(scorers, estimator, X_test, y_test, responses))]
+
+    # Predictions are made lazily while scoring, so the time spent predicting is split out afterwards
+    predict_measurement = {'start': test_measurement['start'], 'seconds': responses.seconds}
+    score_measurement = {'start': test_measurement['start'] + responses.seconds,
+                         'seconds': max(test_measurement['seconds'] - responses.seconds, 0.0)}
+    if trace_memory:
+        predict_measurement['peak_memory'] = test_measurement['peak_memory']
+    fold_timings = {'fit': fit_measurement, 'predict': predict_measurement, 'score': score_measurement}
+    if 'stats' in fold_profile:
+        fold_timings['profile'] = fold_profile['stats']
+    return scores, estimator, fold_timings
+
+
+def run_experiment(experiment, message="", force=False, show_results=True,
+                   use_fold_cache=False, fold_cache_size=None, save_models=False,
+                   untracked_files=False) -> Tuple[List[BaseEstimator], Path]:
+    # Incremental runs update the estimators saved by earlier runs
+    save_models = save_models or getattr(experiment, 'incremental', False)
+    # GitPython is slow to import and only needed here
+    from git import Repo
     git_repo = Repo(REPO_PATH, search_parent_directories=True)  # type: pypastry.experiment.Experiment
-    results_repo = ResultsRepo(RESULTS_PATH)  # type: pypastry.experiment.results.ResultsRepo
-    runner = ExperimentRunner(git_repo, results_repo, display)  # type:
+    results_repo = ResultsRepo(RESULTS_PATH, RESULTS_INDEX_PATH)  # type: pypastry.experiment.results.ResultsRepo
+    fold_cache = None
+    if use_fold_cache:
+        fold_cache = FoldCache(FOLD_CACHE_PATH, fold_cache_size or DEFAULT_MAX_SIZE)
+    model_store = ModelStore(MODEL_STORE_PATH) if save_models else None
+    runner = ExperimentRunner(git_repo, results_repo, display, fold_cache, model_store,
+                              untracked_files)  # type:
     # pypastry.experiment.evaluation.ExperimentRunner
     return runner.run_experiment(
         experiment=experiment,
@@ -0,0 +1,416 @@
+"""
+Run the folds of an experiment. The default JoblibExecutor runs them in this process or in
+joblib workers on this machine. WorkerPoolExecutor sends them to worker processes over
+sockets, which may run on other machines, and is a starting point for running folds with
+a cluster scheduler: implement FoldExecutor.run_folds to use another one. MemoryBoundedExecutor
+runs each fold in its own process, as many at once as fit in a memory budget.
+"""
+import multiprocessing
+import os
+import socket
+from abc import ABC, abstractmethod
+import shutil
+import sys
+import traceback
+from collections import OrderedDict, deque
+from multiprocessing.connection import Client, Connection, Listener, wait
+from multiprocessing.process import BaseProcess
+from tempfile import mkdtemp
+from typing import Any, Deque, Dict, List, Optional, Tuple, TYPE_CHECKING, Union, cast
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from joblib.disk import memstr_to_bytes
+
+from pypastry.experiment.cache import parse_size
+from pypastry.experiment.profiling import get_profile_owner
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where peak memory isn't measured
+    resource = None  # type: ignore
+
+if TYPE_CHECKING:
+    from sklearn.base import BaseEstimator
+    from pypastry.experiment import Experiment
+
+# The scores, fitted estimator and timings of a fold
+FoldOutput = Tuple[List[Any], 'BaseEstimator', Dict[str, Any]]
+
+# Datasets kept by each worker, least recently used first out
+WORKER_DATASETS = 2
+AUTHKEY_ENVIRONMENT_VARIABLE = 'PASTRY_WORKER_AUTHKEY'
+# How often to check that started workers are still alive while waiting for them to connect
+ACCEPT_POLL_SECONDS = 1.0
+
+
+class FoldExecutor(ABC):
+    """
+    Fits estimators on the train indices of folds and scores them on the test indices.
+    """
+    @abstractmethod
+    def run_folds(self, experiment: 'Experiment', X, y, groups,
+                  fits: List[Tuple['BaseEstimator', np.ndarray, np.ndarray, bool]],
+                  dataset_hash: str = None) -> List[FoldOutput]:
+        """
+        Return the scores, fitted estimator and timings of each fit, in the same order as fits.
+        Each fit is an estimator, train and test indices, and whether to update the estimator
+        with partial_fit instead of fitting it. X, y and groups are the same for every fit, and
+        dataset_hash identifies them if given.
+        """
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> 'FoldExecutor':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class JoblibExecutor(FoldExecutor):
+    """
+    Run folds with joblib, using the experiment's n_jobs, backend and max_nbytes.
+    """
+    def run_folds(self, experiment: 'Experiment', X, y, groups,
+                  fits: List[Tuple['BaseEstimator', np.ndarray, np.ndarray, bool]],
+                  dataset_hash: str = None) -> List[FoldOutput]:
+        # The evaluation module imports this one
+        from pypastry.experiment.evaluation import _fit_and_predict
+
+        temp_folder = mkdtemp(prefix='pastry-')
+        try:
+            if len(fits) > 1:
+                X, y, groups = _share_with_workers((X, y, groups), experiment, temp_folder)
+
+            parallel = Parallel(n_jobs=experiment.n_jobs, backend=experiment.backend, verbose=False,
+                                pre_dispatch='2*n_jobs', max_nbytes=experiment.max_nbytes)
+            profile_owner = get_profile_owner() if experiment.profile else None
+            return parallel(delayed(_fit_and_predict)(estimator, X, y, train, test, groups, experiment.scorer,
+                                                      experiment.trace_memory, profile_owner, partial)
+                            for estimator, train, test, partial in fits)
+        finally:
+            # Fitted estimators may still reference the memory-mapped data, which
+            # prevents removing it on some platforms
+            shutil.rmtree(temp_folder, ignore_errors=True)
+
+
+class WorkerPoolExecutor(FoldExecutor):
+    """
+    Send folds to a pool of worker processes, one fold at a time to each worker, over
+    authenticated sockets. n_workers workers are started on this machine when the first
+    folds are run, and the pool also waits for remote_workers workers to connect to
+    address, started elsewhere with:
+
+        PASTRY_WORKER_AUTHKEY=<authkey as hex> python -m pypastry.experiment.executors HOST:PORT
+
+    Datasets are sent to a worker the first time it gets a fold of them, keyed on the
+    dataset hash, and kept by the worker for later folds, so each worker receives each
+    dataset once however many folds or runs it is used for.
+    """
+    def __init__(self, n_workers: int = None, address: Tuple[str, int] = ('localhost', 0),
+                 remote_workers: int = 0, authkey: bytes = None):
+        if remote_workers > 0 and authkey is None:
+            raise ValueError("Give an authkey to share with remote workers")
+        self.n_workers = (os.cpu_count() or 1) if n_workers is None else n_workers
+        self.remote_workers = remote_workers
+        if self.n_workers + remote_workers < 1:
+            raise ValueError("There must be at least one worker")
+        self.address = address
+        self.authkey = os.urandom(32) if authkey is None else authkey
+        self._listener = None  # type: Optional[Listener]
+        self._processes = []  # type: List[BaseProcess]
+        self._connections = []  # type: List[Connection]
+
+    def start(self) -> None:
+        if self._listener is not None:
+            return
+        listener = self._listener = Listener(self.address, authkey=self.authkey)
+        context = multiprocessing.get_context('spawn')
+        for _ in range(self.n_workers):
+            process = context.Process(target=serve, args=(listener.address, self.authkey), daemon=True)
+            process.start()
+            self._processes.append(process)
+        try:
+            for _ in range(self.n_workers + self.remote_workers):
+                self._wait_for_worker(listener)
+                self._connections.append(listener.accept())
+        except BaseException:
+            self.close()
+            raise
+
+    def _wait_for_worker(self, listener: Listener) -> None:
+        # Listener.accept has no timeout, so wait for the listening socket to be ready, checking
+        # that the workers started here are still alive, so that one that dies before connecting
+        # doesn't leave the pool waiting forever
+        while not wait([_get_listening_socket(listener)], timeout=ACCEPT_POLL_SECONDS):
+            for process in self._processes:
+                if process.exitcode is not None:
+                    raise RuntimeError("A worker stopped with exit code {} before connecting".format(
+                        process.exitcode))
+
+    def run_folds(self, experiment: 'Experiment', X, y, groups,
+                  fits: List[Tuple['BaseEstimator', np.ndarray, np.ndarray, bool]],
+                  dataset_hash: str = None) -> List[FoldOutput]:
+        self.start()
+        dataset_key = _get_dataset_key(experiment, dataset_hash)
+        profile_owner = get_profile_owner() if experiment.profile else None
+        outputs = [None] * len(fits)  # type: List[Any]
+        pending = list(reversed(list(enumerate(fits))))
+        idle = list(self._connections)
+        busy = {}  # type: Dict[Connection, int]
+        try:
+            while len(pending) > 0 or len(busy) > 0:
+                while len(pending) > 0 and len(idle) > 0:
+                    connection = idle.pop()
+                    fold, (estimator, train, test, partial) = pending.pop()
+                    connection.send(('fold', dataset_key, estimator, train, test, partial, experiment.scorer,
+                                     experiment.trace_memory, profile_owner))
+                    busy[connection] = fold
+                for connection in _wait_for_connections(list(busy)):
+                    try:
+                        message = connection.recv()
+                    except EOFError:
+                        raise RuntimeError("A worker stopped while running fold {}".format(busy[connection]))
+                    if message[0] == 'need':
+                        connection.send(('dataset', dataset_key, (X, y, groups)))
+                        continue
+                    fold = busy.pop(connection)
+                    idle.append(connection)
+                    if message[0] == 'error':
+                        _, error, worker_traceback = message
+                        raise error from RuntimeError("Fold {} failed in a worker:\n{}".format(
+                            fold, worker_traceback))
+                    outputs[fold] = message[1]
+        except BaseException:
+            # Workers that are still busy would send results for folds nobody is waiting for
+            self.close()
+            raise
+        return outputs
+
+    def close(self) -> None:
+        for connection in self._connections:
+            connection.close()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if self._listener is not None:
+            self._listener.close()
+        self._listener = None
+        self._processes = []
+        self._connections = []
+
+
+def _get_listening_socket(listener: Listener) -> socket.socket:
+    """
+    The socket a Listener accepts connections on. multiprocessing doesn't expose it, but it is
+    needed to wait for a connection with a timeout, so this is the one place that reaches into
+    the private attributes of a Listener on a host and port.
+    """
+    return listener._listener._socket  # type: ignore
+
+
+def _wait_for_connections(connections: List[Connection]) -> List[Connection]:
+    # wait returns the ready objects among those it is given, here all connections
+    return cast(List[Connection], wait(connections))
+
+
+class MemoryBoundedExecutor(FoldExecutor):
+    """
+    Run each fold in a new process, so that a fold that runs out of memory doesn't take
+    the others with it, and the peak resident memory of each fold can be measured. The
+    first fold runs on its own; after that, as many folds run at once as fit in
+    memory_limit given the largest peak seen so far, up to max_workers.
+
+    A fold whose process is killed, for example by the kernel when memory runs out, or
+    that raises MemoryError is retried up to retries times, each time halving the number
+    of folds that may run at once. If fold_memory_limit is given, the address space of
+    each fold's process is limited to it, so that it gets a MemoryError rather than
+    being killed. Peak memory is measured on POSIX systems only.
+    """
+    def __init__(self, memory_limit: Union[int, str], max_workers: int = None, retries: int = 2,
+                 fold_memory_limit: Union[int, str, None] = None):
+        self.memory_limit = parse_size(memory_limit) if isinstance(memory_limit, str) else memory_limit
+        self.max_workers = (os.cpu_count() or 1) if max_workers is None or max_workers < 1 else max_workers
+        self.retries = retries
+        self.fold_memory_limit = parse_size(fold_memory_limit) if isinstance(fold_memory_limit, str) \
+            else fold_memory_limit  # type: Optional[int]
+
+    def get_capacity(self, peak_memory: Optional[int]) -> int:
+        """
+        How many folds to run at once when each may use up to peak_memory bytes.
+        """
+        if peak_memory is None:
+            return 1
+        return max(1, min(self.max_workers, self.memory_limit // max(peak_memory, 1)))
+
+    def run_folds(self, experiment: 'Experiment', X, y, groups,
+                  fits: List[Tuple['BaseEstimator', np.ndarray, np.ndarray, bool]],
+                  dataset_hash: str = None) -> List[FoldOutput]:
+        context = multiprocessing.get_context('spawn')
+        profile_owner = get_profile_owner() if experiment.profile else None
+        temp_folder = mkdtemp(prefix='pastry-')
+        # Every fold process memory-maps the same copy of the data
+        data_path = os.path.join(temp_folder, 'data.pkl')
+        joblib.dump((X, y, groups), data_path)
+
+        outputs = [None] * len(fits)  # type: List[Any]
+        failures = [0] * len(fits)
+        pending = deque(range(len(fits)))  # type: Deque[int]
+        running = {}  # type: Dict[Connection, Tuple[int, BaseProcess]]
+        peak_memory = None  # type: Optional[int]
+        ceiling = self.max_workers
+        try:
+            while len(pending) > 0 or len(running) > 0:
+                capacity = min(ceiling, self.get_capacity(peak_memory))
+                while len(pending) > 0 and len(running) < capacity:
+                    fold = pending.popleft()
+                    receiver, sender = context.Pipe(duplex=False)
+                    process = context.Process(target=_run_fold, daemon=True, args=(
+                        sender, data_path, fits[fold], experiment.scorer, experiment.trace_memory, profile_owner,
+                        self.fold_memory_limit))  # type: BaseProcess
+                    process.start()
+                    # Only the child holds the sending end now, so its death is seen as end of file
+                    sender.close()
+                    running[receiver] = (fold, process)
+
+                for receiver in _wait_for_connections(list(running)):
+                    fold, process = running.pop(receiver)
+                    try:
+                        message = receiver.recv()
+                    except EOFError:
+                        message = None
+                    receiver.close()
+                    process.join()
+                    if message is not None and message[0] == 'result':
+                        _, output, fold_peak_memory = message
+                        if fold_peak_memory is not None:
+                            output[2]['peak_rss'] = fold_peak_memory
+                            peak_memory = max(peak_memory or 0, fold_peak_memory)
+                        outputs[fold] = output
+                        continue
+                    if message is not None and not isinstance(message[1], MemoryError):
+                        _, error, fold_traceback = message
+                        raise error from RuntimeError("Fold {} failed:\n{}".format(fold, fold_traceback))
+
+                    failures[fold] += 1
+                    reason = "ran out of memory" if message is not None else \
+                        "was stopped with exit code {}".format(process.exitcode)
+                    if failures[fold] > self.retries:
+                        raise RuntimeError("Fold {} {} {} times".format(fold, reason, failures[fold]))
+                    ceiling = max(1, min(ceiling, len(running) + 1) // 2)
+                    print("Fold {} {}, retrying with at most {} folds at once".format(fold, reason, ceiling))
+                    pending.appendleft(fold)
+        finally:
+            for receiver, (_, process) in running.items():
+                process.terminate()
+                receiver.close()
+            shutil.rmtree(temp_folder, ignore_errors=True)
+        return outputs
+
+
+def _run_fold(connection: Connection, data_path: str, fit: Tuple['BaseEstimator', np.ndarray, np.ndarray, bool],
+              scorers, trace_memory: bool, profile_owner: Optional[Tuple[int, int]],
+              fold_memory_limit: Optional[int]) -> None:
+    if fold_memory_limit is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (fold_memory_limit, fold_memory_limit))
+    from pypastry.experiment.evaluation import _fit_and_predict
+
+    estimator, train, test, partial = fit
+    try:
+        X, y, groups = joblib.load(data_path, mmap_mode='r')
+        output = _fit_and_predict(estimator, X, y, train, test, groups, scorers, trace_memory, profile_owner,
+                                  partial)
+    except Exception as error:
+        connection.send(('error', error, traceback.format_exc()))
+    else:
+        connection.send(('result', output, get_peak_rss()))
+    finally:
+        connection.close()
+
+
+def get_peak_rss() -> Optional[int]:
+    """
+    The peak resident memory of this process in bytes, or None if it can't be measured.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def serve(address: Tuple[str, int], authkey: bytes) -> None:
+    """
+    Run folds sent by a WorkerPoolExecutor listening at address until it closes the connection.
+    """
+    from pypastry.experiment.evaluation import _fit_and_predict
+
+    datasets = OrderedDict()  # type: OrderedDict[str, Tuple[Any, Any, Any]]
+    connection = Client(address, authkey=authkey)
+    try:
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                return
+            _, dataset_key, estimator, train, test, partial, scorers, trace_memory, profile_owner = message
+            if dataset_key not in datasets:
+                connection.send(('need', dataset_key))
+                _, dataset_key, datasets[dataset_key] = connection.recv()
+                while len(datasets) > WORKER_DATASETS:
+                    datasets.popitem(last=False)
+            datasets.move_to_end(dataset_key)
+            X, y, groups = datasets[dataset_key]
+            try:
+                output = _fit_and_predict(estimator, X, y, train, test, groups, scorers, trace_memory,
+                                          profile_owner, partial)
+            except Exception as error:
+                connection.send(('error', error, traceback.format_exc()))
+            else:
+                connection.send(('result', output))
+    finally:
+        connection.close()
+
+
+def _get_dataset_key(experiment: 'Experiment', dataset_hash: Optional[str]) -> str:
+    """
+    Identify the features, labels and groups made from the experiment's dataset, which
+    depend on how the experiment splits up its columns as well as on the data.
+    """
+    if dataset_hash is None:
+        from pypastry.experiment.evaluation import get_experiment_hash
+        dataset_hash = get_experiment_hash(experiment)
+    layout = (experiment.label_column, experiment.group_column, experiment.average_scores_on_instances,
+              experiment.numpy_features)
+    return '{}-{}'.format(dataset_hash, joblib.hash(layout))
+
+
+def _share_with_workers(data, experiment: 'Experiment', temp_folder: str):
+    """
+    Dump the data once and load it back memory-mapped, so that worker processes
+    receive a reference to the file instead of a pickled copy of the data for every fold.
+    """
+    if experiment.n_jobs in (None, 1) or experiment.backend == 'threading' or experiment.max_nbytes is None:
+        return data
+
+    max_nbytes = experiment.max_nbytes
+    if isinstance(max_nbytes, str):
+        max_nbytes = memstr_to_bytes(max_nbytes)
+    X = data[0]
+    nbytes = X.nbytes if isinstance(X, np.ndarray) else X.memory_usage(index=True).sum()
+    if nbytes < max_nbytes:
+        return data
+
+    data_path = os.path.join(temp_folder, 'data.pkl')
+    joblib.dump(data, data_path)
+    return joblib.load(data_path, mmap_mode='r')
+
+
+if __name__ == '__main__':
+    host, port = sys.argv[1].rsplit(':', 1)
+    serve((host, int(port)), bytes.fromhex(os.environ[AUTHKEY_ENVIRONMENT_VARIABLE]))
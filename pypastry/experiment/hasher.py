@@ -1,13 +1,249 @@
 import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from tempfile import NamedTemporaryFile
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
+import numpy as np
 import pandas as pd
-from pandas import DataFrame
+from pandas import DataFrame, Index
 
 BLOCKSIZE = 65536
+OBJECT_ROWS_PER_BLOCK = 1 << 20
+HASH_ALGORITHMS = ['blake2b', 'sha1', 'xxhash']
+DEFAULT_HASH_ALGORITHM = 'sha1'
+LEGACY_HASH_ALGORITHM = 'parquet-sha1'
+NUMPY_KINDS = 'biufcmM'
+MAX_MEMO_ENTRIES = 100
 
 
-def get_dataset_hash(dataset: DataFrame, test_set: DataFrame = None) -> str:
+def get_dataset_hash(dataset: DataFrame, test_set: DataFrame = None, algorithm: str = DEFAULT_HASH_ALGORITHM,
+                     n_jobs: int = None, legacy: bool = False) -> str:
+    """
+    Hash the contents of the dataset (and test set) column by column, straight from
+    the underlying arrays. Columns are hashed in n_jobs threads if given.
+
+    Pass legacy=True to get the digest of the Parquet serialization used by earlier
+    versions of PyPastry.
+    """
+    if legacy:
+        return get_parquet_hash(dataset, test_set)
+
+    hasher = new_hasher(algorithm)
+    for frame in (dataset, test_set):
+        if frame is not None:
+            hasher.update(get_frame_digest(frame, algorithm, n_jobs))
+    return hasher.hexdigest()
+
+
+def get_frame_digest(frame: DataFrame, algorithm: str = DEFAULT_HASH_ALGORITHM, n_jobs: int = None) -> bytes:
+    columns = [frame.iloc[:, i] for i in range(frame.shape[1])]
+    n_threads = _get_thread_count(n_jobs, len(columns))
+    if n_threads > 1:
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            column_digests = list(executor.map(lambda column: _get_column_digest(column, algorithm), columns))
+    else:
+        column_digests = [_get_column_digest(column, algorithm) for column in columns]
+
+    hasher = new_hasher(algorithm)
+    hasher.update(repr(frame.shape).encode('utf8'))
+    hasher.update(_get_index_digest(frame.index, algorithm))
+    for digest in column_digests:
+        hasher.update(digest)
+    return hasher.digest()
+
+
+class BatchHasher:
+    """
+    Hash a frame given a batch of rows at a time. The digest is the same as get_frame_digest
+    of all the rows concatenated with a new RangeIndex, however the rows are split into batches.
+    Every batch must have the same columns and dtypes, including the categories of categorical
+    columns, as the first.
+    """
+    def __init__(self, algorithm: str = DEFAULT_HASH_ALGORITHM):
+        self.algorithm = algorithm
+        self.columns = None  # type: Optional[List[Any]]
+        self.dtypes = None  # type: Optional[List[Any]]
+        self.column_hashers = []  # type: List[Any]
+        self.rows = 0
+
+    def update(self, batch: DataFrame) -> None:
+        if self.columns is None:
+            self.columns = batch.columns.tolist()
+            self.dtypes = batch.dtypes.tolist()
+            for i in range(batch.shape[1]):
+                column = batch.iloc[:, i]
+                hasher = new_hasher(self.algorithm)
+                hasher.update(repr(column.name).encode('utf8'))
+                hasher.update(str(column.dtype).encode('utf8'))
+                if isinstance(column.array, pd.Categorical):
+                    # Hashed like _update_with_values, with the codes of each batch following
+                    _update_with_values(hasher, column.array.categories.array)
+                self.column_hashers.append(hasher)
+        elif batch.columns.tolist() != self.columns:
+            raise ValueError("Every batch must have the same columns")
+        else:
+            for column, dtype, first_dtype in zip(self.columns, batch.dtypes, self.dtypes):
+                if dtype != first_dtype:
+                    raise ValueError("Column {!r} has dtype {} in a batch, but {} in the first batch; every batch "
+                                     "must have the same dtypes, and categories".format(column, dtype, first_dtype))
+
+        for i, hasher in enumerate(self.column_hashers):
+            values = batch.iloc[:, i].array
+            if isinstance(values, pd.Categorical):
+                values = values.codes
+            _update_with_values(hasher, values)
+        self.rows += len(batch)
+
+    def digest(self) -> bytes:
+        hasher = new_hasher(self.algorithm)
+        hasher.update(repr((self.rows, len(self.column_hashers))).encode('utf8'))
+        hasher.update(_get_index_digest(pd.RangeIndex(self.rows), self.algorithm))
+        for column_hasher in self.column_hashers:
+            hasher.update(column_hasher.digest())
+        return hasher.digest()
+
+
+def new_hasher(algorithm: str):
+    if algorithm == 'blake2b':
+        return hashlib.blake2b(digest_size=20)
+    if algorithm == 'sha1':
+        return hashlib.sha1()
+    if algorithm == 'xxhash':
+        try:
+            import xxhash
+        except ImportError:
+            raise ImportError("The xxhash hash algorithm needs the xxhash package: pip install xxhash")
+        return xxhash.xxh3_128()
+    raise ValueError("Hash algorithm must be one of {}".format(", ".join(HASH_ALGORITHMS)))
+
+
+def _get_column_digest(column: pd.Series, algorithm: str) -> bytes:
+    hasher = new_hasher(algorithm)
+    hasher.update(repr(column.name).encode('utf8'))
+    hasher.update(str(column.dtype).encode('utf8'))
+    _update_with_values(hasher, column.array)
+    return hasher.digest()
+
+
+def _get_index_digest(index: Index, algorithm: str) -> bytes:
+    hasher = new_hasher(algorithm)
+    if isinstance(index, pd.RangeIndex):
+        hasher.update(repr((index.start, index.stop, index.step)).encode('utf8'))
+    else:
+        hasher.update(str(index.dtype).encode('utf8'))
+        _update_with_values(hasher, index.array)
+    return hasher.digest()
+
+
+def _update_with_values(hasher: Any, values: Any) -> None:
+    if isinstance(values, pd.Categorical):
+        _update_with_values(hasher, values.categories.array)
+        _update_with_values(hasher, values.codes)
+        return
+
+    array = values if isinstance(values, np.ndarray) else getattr(values, '_ndarray', None)
+    if array is not None and array.dtype.kind in NUMPY_KINDS:
+        hasher.update(_as_little_endian(np.ascontiguousarray(array)).view(np.uint8))
+        return
+
+    # Objects, strings and extension arrays are hashed row-wise by pandas
+    # a block at a time, so memory use stays bounded
+    series = pd.Series(values, copy=False)
+    for start in range(0, len(series), OBJECT_ROWS_PER_BLOCK):
+        block = series.iloc[start:start + OBJECT_ROWS_PER_BLOCK]
+        row_hashes = pd.util.hash_pandas_object(block, index=False).to_numpy()
+        hasher.update(_as_little_endian(row_hashes).view(np.uint8))
+
+
+def _as_little_endian(array: np.ndarray) -> np.ndarray:
+    byteorder = array.dtype.byteorder
+    if byteorder == '>' or (byteorder == '=' and sys.byteorder == 'big'):
+        return array.astype(array.dtype.newbyteorder('<'))
+    return array
+
+
+def _get_thread_count(n_jobs: int, n_columns: int) -> int:
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        n_jobs = (os.cpu_count() or 1) + 1 + n_jobs
+    return max(1, min(n_jobs, n_columns))
+
+
+def get_memoized_hash(paths: Iterable[str], memo_path: str, settings: str, compute_hash: Callable[[], str]) -> str:
+    """
+    Return the hash stored for the files at paths if none of them has changed since it was
+    computed, otherwise call compute_hash and store the result.
+
+    Files are identified by path, size, modification time and inode, so this relies on the
+    dataset being loaded unmodified from the given paths.
+    """
+    dataset_hash = lookup_memoized_hash(paths, memo_path, settings)
+    if dataset_hash is None:
+        dataset_hash = compute_hash()
+        store_memoized_hash(paths, memo_path, settings, dataset_hash)
+    return dataset_hash
+
+
+def lookup_memoized_hash(paths: Iterable[str], memo_path: str, settings: str) -> Optional[str]:
+    return _read_memo(memo_path).get(_get_memo_key(paths, settings))
+
+
+def store_memoized_hash(paths: Iterable[str], memo_path: str, settings: str, dataset_hash: str) -> None:
+    memo = _read_memo(memo_path)
+    memo[_get_memo_key(paths, settings)] = dataset_hash
+    for old_key in list(memo)[:-MAX_MEMO_ENTRIES]:
+        del memo[old_key]
+
+    memo_dir = os.path.dirname(memo_path) or '.'
+    os.makedirs(memo_dir, exist_ok=True)
+    with NamedTemporaryFile(mode='w', prefix='hashes-', suffix='.tmp', dir=memo_dir, delete=False) as memo_file:
+        json.dump(memo, memo_file)
+    os.replace(memo_file.name, memo_path)
+
+
+def get_frame_metadata(dataset: DataFrame, test_set: DataFrame = None) -> List[Any]:
+    """
+    Describe the shape, column names and dtypes of the dataset and test set, which are cheap to
+    get, so that a memoized hash isn't reused when the frames built from the same files change.
+    """
+    return [None if frame is None else [list(frame.shape), [str(column) for column in frame.columns],
+                                        [str(dtype) for dtype in frame.dtypes]]
+            for frame in (dataset, test_set)]
+
+
+def _get_memo_key(paths: Iterable[str], settings: str) -> str:
+    return json.dumps([settings, get_file_identities(paths)])
+
+
+def _read_memo(memo_path: str) -> Dict[str, str]:
+    try:
+        with open(memo_path) as memo_file:
+            return json.load(memo_file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def get_file_identities(paths: Iterable[str]) -> List[List[Any]]:
+    identities = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            file_paths = sorted(os.path.join(directory, name)
+                                for directory, _, names in os.walk(path) for name in names)
+        else:
+            file_paths = [path]
+        for file_path in file_paths:
+            stat = os.stat(file_path)
+            identities.append([file_path, stat.st_size, stat.st_mtime_ns, stat.st_ino])
+    return identities
+
+
+def get_parquet_hash(dataset: DataFrame, test_set: DataFrame = None) -> str:
     buffer = BytesIO()
     dataset.to_parquet(buffer)
     if test_set is not None:
@@ -0,0 +1,147 @@
+"""
+Re-evaluate an experiment whose dataset has grown by appending rows, updating the estimators
+fitted on the earlier rows instead of fitting from scratch.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from sklearn.base import BaseEstimator, clone
+from sklearn.ensemble import BaseEnsemble
+from sklearn.model_selection import BaseCrossValidator
+
+from pypastry.experiment.hasher import get_frame_digest, new_hasher
+
+PREFIX_CHUNK_ROWS = 1 << 16
+
+# Estimators fitted on the first size rows of the dataset, one per fold
+IncrementalBase = NamedTuple('IncrementalBase', [('name', str), ('size', int), ('estimators', List[BaseEstimator])])
+
+
+class AppendStableKFold(BaseCrossValidator):
+    """
+    K-fold cross validator that puts each row in a fold chosen by hashing its position,
+    or its group if groups are given, so that rows stay in the same fold when more rows
+    are appended to the dataset.
+    """
+    def __init__(self, n_splits: int = 5, random_state: int = 0):
+        if n_splits < 2:
+            raise ValueError("There must be at least two splits")
+        self.n_splits = n_splits
+        self.random_state = random_state
+
+    def get_n_splits(self, X=None, y=None, groups=None) -> int:
+        return self.n_splits
+
+    def _iter_test_indices(self, X=None, y=None, groups=None):
+        if groups is None:
+            keys = np.arange(len(X), dtype=np.uint64)
+        else:
+            keys = pd.util.hash_array(np.asarray(groups))
+        folds = _mix(keys + np.uint64(self.random_state)) % np.uint64(self.n_splits)
+        for fold in range(self.n_splits):
+            yield np.flatnonzero(folds == fold)
+
+
+def _mix(keys: np.ndarray) -> np.ndarray:
+    # The splitmix64 finalizer, so that consecutive rows are spread evenly over folds
+    with np.errstate(over='ignore'):
+        keys = (keys ^ (keys >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        keys = (keys ^ (keys >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+        return keys ^ (keys >> np.uint64(31))
+
+
+def get_prefix_hashes(dataset: DataFrame, algorithm: str, chunk_rows: int = PREFIX_CHUNK_ROWS) -> Dict[str, Any]:
+    """
+    Hash the dataset chunk_rows rows at a time, chaining each chunk's hash to the one before,
+    so that the hashes of a dataset's first rows are a prefix of the hashes of the dataset
+    after more rows are appended. The last chunk may be shorter.
+    """
+    hashes = []
+    previous = b''
+    for start in range(0, len(dataset), chunk_rows):
+        previous = _chain(previous, dataset.iloc[start:start + chunk_rows], algorithm)
+        hashes.append(previous.hex())
+    return {'chunk_rows': chunk_rows, 'hashes': hashes}
+
+
+def _chain(previous: bytes, chunk: DataFrame, algorithm: str) -> bytes:
+    hasher = new_hasher(algorithm)
+    hasher.update(previous)
+    hasher.update(get_frame_digest(chunk, algorithm))
+    return hasher.digest()
+
+
+def is_prefix(dataset_info: Dict[str, Any], dataset: DataFrame, prefix_hashes: Dict[str, Any],
+              algorithm: str) -> bool:
+    """
+    Whether the dataset described by dataset_info, as saved with a result, is the first rows
+    of dataset, whose prefix hashes are prefix_hashes.
+    """
+    base_hashes = dataset_info.get('prefix_hashes')
+    if base_hashes is None or base_hashes['chunk_rows'] != prefix_hashes['chunk_rows']:
+        return False
+    if dataset_info.get('hash_algorithm') != algorithm or dataset_info['size'] > len(dataset):
+        return False
+
+    chunk_rows = prefix_hashes['chunk_rows']
+    full_chunks, remainder = divmod(dataset_info['size'], chunk_rows)
+    if base_hashes['hashes'][:full_chunks] != prefix_hashes['hashes'][:full_chunks]:
+        return False
+    if remainder == 0:
+        return True
+    # The base ends part way through a chunk of the dataset, so hash that part of the chunk
+    previous = bytes.fromhex(prefix_hashes['hashes'][full_chunks - 1]) if full_chunks > 0 else b''
+    start = full_chunks * chunk_rows
+    chunk = dataset.iloc[start:start + remainder]
+    return _chain(previous, chunk, algorithm).hex() == base_hashes['hashes'][full_chunks]
+
+
+def get_update_method(estimator: BaseEstimator) -> str:
+    if hasattr(estimator, 'partial_fit'):
+        return 'partial_fit'
+    if _continues_fitting(estimator):
+        return 'warm_start'
+    return 'refit'
+
+
+def _continues_fitting(estimator: BaseEstimator) -> bool:
+    # Ensembles only add members with warm_start when n_estimators or max_iter is increased, so
+    # refitting one at the same size would leave it as it was. Other estimators with warm_start,
+    # such as linear models and neural networks, start their solver from the previous solution.
+    if 'warm_start' not in estimator.get_params(deep=False):
+        return False
+    if isinstance(estimator, BaseEnsemble) or 'n_estimators' in estimator.get_params(deep=False):
+        return False
+    return not type(estimator).__module__.startswith('sklearn.ensemble')
+
+
+def get_incremental_fit(predictor: BaseEstimator, base: Optional[IncrementalBase], fold: int, train: np.ndarray,
+                        test: np.ndarray) -> Tuple[BaseEstimator, np.ndarray, np.ndarray, bool]:
+    """
+    The estimator to fit for a fold, the train indices to fit it on, the test indices, and
+    whether to fit with partial_fit. Estimators that support partial_fit are updated with the
+    rows appended since the base, those whose solver can start from the base estimator's
+    solution are refitted with warm_start, and others, including ensembles, are fitted from
+    scratch.
+    """
+    if base is None:
+        return clone(predictor), train, test, False
+    estimator = base.estimators[fold]
+    method = get_update_method(estimator)
+    if method == 'partial_fit':
+        return estimator, train[train >= base.size], test, True
+    if method == 'warm_start':
+        return estimator.set_params(warm_start=True), train, test, False
+    return clone(predictor), train, test, False
+
+
+def reset_warm_start(predictor: BaseEstimator, estimator: BaseEstimator) -> BaseEstimator:
+    """
+    Set the warm_start parameter of an estimator updated with warm_start back to the
+    predictor's, so that it is saved with the parameters it was configured with.
+    """
+    if 'warm_start' in estimator.get_params(deep=False) and type(estimator) is type(predictor):
+        estimator.set_params(warm_start=predictor.get_params(deep=False)['warm_start'])
+    return estimator
@@ -0,0 +1,55 @@
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sklearn.base import BaseEstimator
+    from pypastry.experiment.results import Result
+
+MODEL_SUFFIX = '.joblib'
+
+
+class ModelStore:
+    """
+    Stores fitted estimators with joblib under a path derived from the hash of their contents,
+    so an estimator identical to one already stored, for example from an earlier run of the
+    same experiment, is not saved again.
+
+    Estimators are saved uncompressed by default so that their arrays can be memory-mapped
+    when loaded. Give compress (0 to 9) to save space instead.
+    """
+    def __init__(self, store_path: str, compress: int = 0):
+        self.store_path = store_path
+        self.compress = compress
+
+    def put(self, estimator: 'BaseEstimator') -> str:
+        import joblib
+        key = joblib.hash(estimator)
+        path = self._get_path(key)
+        if path.exists():
+            return key
+
+        os.makedirs(str(path.parent), exist_ok=True)
+        with NamedTemporaryFile(prefix='model-', suffix='.tmp', dir=str(path.parent), delete=False) as temp_file:
+            temp_path = temp_file.name
+        joblib.dump(estimator, temp_path, compress=self.compress)
+        os.replace(temp_path, str(path))
+        return key
+
+    def get(self, key: str, mmap_mode: str = 'r') -> 'BaseEstimator':
+        import joblib
+        # Arrays in compressed files can't be memory-mapped
+        return joblib.load(str(self._get_path(key)), mmap_mode=None if self.compress else mmap_mode)
+
+    def load_models(self, result: 'Result', mmap_mode: str = 'r') -> List['BaseEstimator']:
+        """
+        Load the fitted estimator of every fold of a result saved with this store.
+        """
+        keys = result.data.get('models')
+        if keys is None:
+            raise ValueError("The models of run {} were not saved".format(result.data.get('result_json_name')))
+        return [self.get(key, mmap_mode) for key in keys]
+
+    def _get_path(self, key: str) -> Path:
+        return Path(self.store_path) / key[:2] / (key[2:] + MODEL_SUFFIX)
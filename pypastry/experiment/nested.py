@@ -0,0 +1,76 @@
+from numbers import Integral
+from typing import Any, Dict, List, Optional
+
+from sklearn.base import BaseEstimator, clone
+from sklearn.model_selection import GridSearchCV
+from sklearn.model_selection._search import BaseSearchCV
+from sklearn.pipeline import Pipeline
+
+from pypastry.experiment import Experiment
+from pypastry.experiment.cache import DEFAULT_MAX_SIZE, TransformerCache
+
+
+def get_fold_predictor(experiment: Experiment) -> BaseEstimator:
+    """
+    The estimator to fit on each outer fold. If the experiment has a parameter grid, this is
+    a grid search over the predictor's parameters, scored with the first scorer on the inner
+    cross validator. When there is an inner search, every Pipeline in it caches its fitted
+    transformers in the experiment's transformer cache, so they are shared between candidates,
+    inner folds, outer folds and runs that fit the same transformer on the same data.
+    """
+    predictor = experiment.predictor
+    if experiment.param_grid is not None:
+        predictor = GridSearchCV(predictor, experiment.param_grid, scoring=experiment.scorer[0],
+                                 cv=experiment.inner_cross_validator)
+    if experiment.transformer_cache is None or not isinstance(predictor, BaseSearchCV):
+        return predictor
+
+    predictor = clone(predictor)
+    memory = _get_transformer_cache(experiment).memory()
+    for estimator in [predictor] + list(predictor.get_params(deep=True).values()):
+        if isinstance(estimator, Pipeline) and estimator.memory is None:
+            estimator.memory = memory
+    return predictor
+
+
+def prune_transformer_cache(experiment: Experiment, predictor: BaseEstimator) -> None:
+    """
+    Evict the least recently used transformers once the cache is larger than the experiment's
+    transformer_cache_size, if the fold predictor used the cache.
+    """
+    if experiment.transformer_cache is not None and isinstance(predictor, BaseSearchCV):
+        transformer_cache = _get_transformer_cache(experiment)
+        transformer_cache.prune(transformer_cache.max_size)
+
+
+def _get_transformer_cache(experiment: Experiment) -> TransformerCache:
+    max_size = experiment.transformer_cache_size
+    return TransformerCache(experiment.transformer_cache, DEFAULT_MAX_SIZE if max_size is None else max_size)
+
+
+def has_fixed_inner_splits(experiment: Experiment) -> bool:
+    """
+    Whether the inner cross validator, or that of a search given as the predictor, splits each
+    outer fold the same way on every run. Those that shuffle without an integer random_state
+    split differently every time, and their repr can't tell them apart, so folds fitted with
+    them mustn't be reused from the fold cache.
+    """
+    if experiment.param_grid is not None:
+        inner_cross_validator = experiment.inner_cross_validator
+    elif isinstance(experiment.predictor, BaseSearchCV):
+        inner_cross_validator = experiment.predictor.cv
+    else:
+        return True
+    if not hasattr(inner_cross_validator, 'random_state') or not getattr(inner_cross_validator, 'shuffle', True):
+        return True
+    return isinstance(inner_cross_validator.random_state, Integral)
+
+
+def get_best_params(estimators: List[BaseEstimator]) -> Optional[List[Dict[str, Any]]]:
+    """
+    The parameters chosen by the inner search of each outer fold, or None if there wasn't one.
+    """
+    if not any(hasattr(estimator, 'best_params_') for estimator in estimators):
+        return None
+    return [getattr(estimator, 'best_params_', None) for estimator in estimators]
+
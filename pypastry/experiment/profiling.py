@@ -0,0 +1,60 @@
+import cProfile
+import os
+import threading
+from contextlib import contextmanager
+from pstats import Stats
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+def get_profile_owner() -> Tuple[int, int]:
+    """
+    Identify the process and thread running the main profiler of a run, so that folds
+    running there are not profiled twice.
+    """
+    return os.getpid(), threading.get_ident()
+
+
+@contextmanager
+def profile_fold(owner: Optional[Tuple[int, int]]) -> Iterator[Dict[str, Any]]:
+    """
+    Profile the body if owner is given and it is running in a worker process or thread.
+    The raw profile stats are put in the result under 'stats' when the body exits.
+    """
+    result = {}  # type: Dict[str, Any]
+    if owner is None or owner == get_profile_owner():
+        yield result
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active in this process, and it sees this thread too
+        yield result
+        return
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        profiler.create_stats()
+        result['stats'] = profiler.stats
+
+
+def merge_profiles(profiler: cProfile.Profile, fold_stats: List[Dict[Any, Any]]) -> Stats:
+    stats = Stats(profiler)
+    for raw_stats in fold_stats:
+        if raw_stats:
+            stats.add(_RawStats(raw_stats))
+    return stats
+
+
+class _RawStats:
+    """
+    Stands in for a profiler whose stats have already been collected, so that stats
+    sent back from workers can be added to a pstats.Stats.
+    """
+    def __init__(self, stats: Dict[Any, Any]):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
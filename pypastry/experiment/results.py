@@ -1,19 +1,64 @@
 import json
 import os
 import glob
+import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
 from tempfile import NamedTemporaryFile
-from typing import Dict, Any, NamedTuple
+from typing import Dict, Any, NamedTuple, Iterator, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pstats import Stats
 
 
 Result = NamedTuple('Result', [('data', Dict[str, Any])])
 
+INDEX_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS results (
+        name TEXT PRIMARY KEY,
+        size INTEGER,
+        mtime_ns INTEGER,
+        run_start TEXT,
+        model_type TEXT,
+        git_hash TEXT,
+        dataset_hash TEXT,
+        data TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS results_run_start ON results (run_start)",
+    "CREATE INDEX IF NOT EXISTS results_model_type ON results (model_type)",
+    "CREATE INDEX IF NOT EXISTS results_git_hash ON results (git_hash)",
+    "CREATE INDEX IF NOT EXISTS results_dataset_hash ON results (dataset_hash)",
+    "CREATE TABLE IF NOT EXISTS index_state (key TEXT PRIMARY KEY, value INTEGER)",
+]
+INDEX_TIMEOUT_SECONDS = 60
+PROFILE_SUFFIX = '.prof'
+DETAIL_SUFFIX = '.detail'
+TEMP_SUFFIX = '.tmp'
+# Detail columns longer than this are saved as .npy files next to the result instead of in the JSON
+DETAIL_INLINE_ROWS = 1000
+DETAIL_FILE_KINDS = 'biufcUS'
+
 
 class ResultsRepo:
-    def __init__(self, results_path: str):
+    """
+    Stores results as JSON files in results_path. If index_path is given, a SQLite index of the
+    results is kept there so they can be queried without parsing every file. The index is brought
+    up to date with the files in results_path whenever it is queried.
+
+    Long columns of results_detail are kept out of the JSON, in a directory of .npy files next
+    to it, and are only loaded by get_results_detail.
+    """
+    def __init__(self, results_path: str, index_path: str = None):
         self.results_path = results_path
+        self.index_path = index_path
 
-    def save_results(self, run_info: Dict[str, Any], dataset_info: Dict[str, Any], git_info: Dict[str, str]) -> Path:
+    def save_results(self, run_info: Dict[str, Any], dataset_info: Dict[str, Any], git_info: Dict[str, str],
+                     profile_stats: 'Stats' = None) -> Path:
+        """
+        Save the result as a new JSON file. If profile_stats is given, the profile is saved
+        next to it, with the file name recorded under 'profile' in the result. Long detail
+        columns are saved next to it, with their file names under 'results_detail_files'.
+        """
         try:
             os.mkdir(self.results_path)
         except FileExistsError:
@@ -21,17 +66,205 @@ class ResultsRepo:
         run_info['dataset'] = dataset_info
         run_info['git_hash'] = git_info["git_hash_msg"]
         run_info['git_summary'] = git_info["git_summary_msg"]
-        with NamedTemporaryFile(mode='w', prefix='result-', suffix='.json',
+        # The result is written under a temporary name and renamed once complete, so that
+        # other processes listing the results never see a partly written file
+        with NamedTemporaryFile(mode='w', prefix='result-', suffix='.json' + TEMP_SUFFIX,
                                 dir=self.results_path, delete=False) as output_file:
-            result_file_path = Path(output_file.name)
+            result_file_path = Path(output_file.name[:-len(TEMP_SUFFIX)])
             run_info["result_json_name"] = result_file_path.name
-            json.dump(run_info, output_file, indent=4, default=str)
-            output_file.flush()
+            if profile_stats is not None:
+                profile_name = result_file_path.stem + PROFILE_SUFFIX
+                profile_stats.dump_stats(os.path.join(self.results_path, profile_name))
+                run_info["profile"] = profile_name
+            result_json = dict(run_info)
+            if 'results_detail' in run_info:
+                inline_detail, detail_files = self._save_detail(result_file_path.stem, run_info['results_detail'])
+                result_json['results_detail'] = inline_detail
+                if detail_files:
+                    result_json['results_detail_files'] = detail_files
+            json.dump(result_json, output_file, indent=4, default=str)
+        os.replace(output_file.name, str(result_file_path))
+
+        if self.index_path is not None:
+            with self._open_index() as connection:
+                self._index_file(connection, result_file_path.name)
+        return result_file_path
+
+    def get_results(self, limit: int = None, model: str = None, git_hash: str = None,
+                    dataset_hash: str = None) -> Iterator[Result]:
+        """
+        Yield results in order of run start. If limit is given, only the latest limit results
+        matching the filters are returned. Hashes match on their prefix.
+        """
+        if self.index_path is None:
+            yield from self._get_results_from_files(limit, model, git_hash, dataset_hash)
+            return
+
+        conditions = []
+        parameters = []  # type: List[Any]
+        if model is not None:
+            conditions.append("model_type = ?")
+            parameters.append(model)
+        if git_hash is not None:
+            conditions.append("(git_hash LIKE ? OR git_hash LIKE ?)")
+            parameters += [git_hash + '%', 'dirty_' + git_hash + '%']
+        if dataset_hash is not None:
+            conditions.append("dataset_hash LIKE ?")
+            parameters.append(dataset_hash + '%')
+        query = "SELECT data FROM results"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY run_start DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
 
-            return result_file_path
+        with self._open_index() as connection:
+            self._update_index(connection)
+            rows = connection.execute(query, parameters).fetchall()
+        for row in reversed(rows):
+            yield Result(json.loads(row[0]))
 
-    def get_results(self):
+    def get_results_detail(self, result: Result, mmap: bool = True) -> Dict[str, Any]:
+        """
+        Return every column of the result's detail as a NumPy array. Columns saved in
+        .npy files are memory-mapped unless mmap is false.
+        """
+        import numpy as np
+        detail = {column: np.asarray(values) for column, values in result.data.get('results_detail', {}).items()}
+        for column, file_name in result.data.get('results_detail_files', {}).items():
+            detail_path = os.path.join(self.results_path, *file_name.split('/'))
+            detail[column] = np.load(detail_path, mmap_mode='r' if mmap else None)
+        return detail
+
+    def _save_detail(self, stem: str, results_detail: Dict[str, List[Any]]):
+        import numpy as np
+        inline_detail = {}  # type: Dict[str, List[Any]]
+        detail_files = {}  # type: Dict[str, str]
+        for i, (column, values) in enumerate(results_detail.items()):
+            array = np.asarray(values) if len(values) > DETAIL_INLINE_ROWS else None
+            if array is None or array.dtype.kind not in DETAIL_FILE_KINDS:
+                inline_detail[column] = values
+                continue
+            detail_dir = os.path.join(self.results_path, stem + DETAIL_SUFFIX)
+            os.makedirs(detail_dir, exist_ok=True)
+            np.save(os.path.join(detail_dir, '{}.npy'.format(i)), array)
+            detail_files[column] = '{}{}/{}.npy'.format(stem, DETAIL_SUFFIX, i)
+        return inline_detail, detail_files
+
+    def get_result(self, name: str) -> Result:
+        """
+        Return the result whose JSON file name starts with name.
+        """
+        if name.endswith('.json'):
+            name = name[:-len('.json')]
+        paths = glob.glob(os.path.join(glob.escape(self.results_path), glob.escape(name) + "*.json"))
+        if len(paths) != 1:
+            raise KeyError("{} results match {}".format(len(paths), name))
+        with open(paths[0]) as results_file:
+            return Result(json.load(results_file))
+
+    def get_profile_path(self, result: Result) -> Optional[str]:
+        profile_name = result.data.get('profile')
+        if profile_name is None:
+            return None
+        return os.path.join(self.results_path, profile_name)
+
+    def _get_results_from_files(self, limit: Optional[int], model: Optional[str], git_hash: Optional[str],
+                                dataset_hash: Optional[str]) -> Iterator[Result]:
+        results = []
         for path in glob.glob(os.path.join(self.results_path, "*.json")):
-            with open(str(path), "r") as results_file:
-                result_json = json.load(results_file)
-            yield Result(result_json)
+            try:
+                with open(str(path), "r") as results_file:
+                    result_json = json.load(results_file)
+            except FileNotFoundError:
+                # Deleted since the directory was listed
+                continue
+            if _matches(result_json, model, git_hash, dataset_hash):
+                results.append(Result(result_json))
+        results = sorted(results, key=lambda result: result.data.get('run_start', ''))
+        if limit is not None:
+            results = results[-limit:]
+        yield from results
+
+    @contextmanager
+    def _open_index(self) -> Iterator[sqlite3.Connection]:
+        index_dir = os.path.dirname(self.index_path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        connection = sqlite3.connect(self.index_path, timeout=INDEX_TIMEOUT_SECONDS)
+        try:
+            for statement in INDEX_SCHEMA:
+                connection.execute(statement)
+            yield connection
+            connection.commit()
+        finally:
+            connection.close()
+
+    def _update_index(self, connection: sqlite3.Connection) -> None:
+        # Adding or removing a file changes the modification time of the directory,
+        # so there is no need to look at the files if it is unchanged
+        try:
+            directory_mtime_ns = os.stat(self.results_path).st_mtime_ns
+        except FileNotFoundError:
+            directory_mtime_ns = None
+        indexed_mtime_ns = connection.execute(
+            "SELECT value FROM index_state WHERE key = 'directory_mtime_ns'").fetchone()
+        if indexed_mtime_ns is not None and indexed_mtime_ns[0] == directory_mtime_ns:
+            return
+
+        indexed = {name: (size, mtime_ns) for name, size, mtime_ns
+                   in connection.execute("SELECT name, size, mtime_ns FROM results")}
+        try:
+            entries = [entry for entry in os.scandir(self.results_path)
+                       if entry.name.endswith('.json') and entry.is_file()]
+        except FileNotFoundError:
+            entries = []
+
+        complete = True
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                # Deleted since the directory was listed, so it is dropped from the index below
+                continue
+            if indexed.pop(entry.name, None) != (stat.st_size, stat.st_mtime_ns):
+                complete = self._index_file(connection, entry.name) and complete
+        if indexed:
+            connection.executemany("DELETE FROM results WHERE name = ?", [(name,) for name in indexed])
+        if complete:
+            connection.execute("INSERT OR REPLACE INTO index_state VALUES ('directory_mtime_ns', ?)",
+                               (directory_mtime_ns,))
+
+    def _index_file(self, connection: sqlite3.Connection, name: str) -> bool:
+        path = os.path.join(self.results_path, name)
+        try:
+            stat = os.stat(path)
+            with open(path) as results_file:
+                data = json.load(results_file)
+        except FileNotFoundError:
+            # Deleted while the results were being indexed
+            connection.execute("DELETE FROM results WHERE name = ?", (name,))
+            return True
+        except ValueError:
+            # The file is still being written by another run, it will be indexed next time
+            return False
+        dataset = data.get('dataset', {})
+        connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, stat.st_size, stat.st_mtime_ns, data.get('run_start'), data.get('model_info', {}).get('type'),
+             data.get('git_hash'), dataset.get('hash'), json.dumps(data)))
+        return True
+
+
+def _matches(data: Dict[str, Any], model: Optional[str], git_hash: Optional[str],
+             dataset_hash: Optional[str]) -> bool:
+    if model is not None and data.get('model_info', {}).get('type') != model:
+        return False
+    if git_hash is not None:
+        data_git_hash = data.get('git_hash', '')
+        if not (data_git_hash.startswith(git_hash) or data_git_hash.startswith('dirty_' + git_hash)):
+            return False
+    if dataset_hash is not None and not data.get('dataset', {}).get('hash', '').startswith(dataset_hash):
+        return False
+    return True
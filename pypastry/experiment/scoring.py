@@ -0,0 +1,125 @@
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, mean_absolute_error, mean_squared_error
+from sklearn.metrics._scorer import _BaseScorer, _cached_call
+
+
+# Metrics that are the mean of a per-instance value, so the score for every group
+# can be computed at once with a segmented sum
+SEGMENTED_METRICS = {
+    accuracy_score: lambda y_true, y_pred: y_true == y_pred,
+    mean_absolute_error: lambda y_true, y_pred: np.abs(y_true - y_pred),
+    mean_squared_error: lambda y_true, y_pred: (y_true - y_pred) ** 2,
+}
+
+
+class ResponseCache:
+    """
+    Method caller for scorers that computes each kind of prediction (predict, predict_proba,
+    decision_function) for the whole of X only once. Scorers are passed an array of row
+    positions in place of X, and get the predictions for those rows.
+
+    The total time spent predicting is kept in seconds.
+    """
+    def __init__(self, X: Any):
+        self.X = X
+        self.responses = {}  # type: Dict[Tuple[str, str], Any]
+        self.seconds = 0.0
+
+    def __call__(self, estimator, response_method: str, positions: np.ndarray = None, *args, **kwargs):
+        key = (response_method, repr(sorted(kwargs.items())))
+        if key not in self.responses:
+            start = time.perf_counter()
+            self.responses[key] = _cached_call(None, estimator, response_method, self.X, *args, **kwargs)
+            self.seconds += time.perf_counter() - start
+        response = self.responses[key]
+        if positions is None:
+            return response
+        if isinstance(response, list):
+            return [output[positions] for output in response]
+        return response[positions]
+
+
+def score_predictions(scorers: List[_BaseScorer], estimator, X_test, y_test,
+                      responses: ResponseCache = None) -> Dict[str, float]:
+    """
+    Score the estimator on the test set with every scorer, sharing predictions between scorers
+    like Scikit-learn's _MultimetricScorer, so each response method is only called once.
+    """
+    if responses is None:
+        responses = ResponseCache(X_test)
+    scores = {}
+    for scorer in scorers:
+        score = scorer._score(responses, estimator, None, y_test)
+        score_name = scorer._score_func.__name__
+        sign = scorer._sign
+        score_ignoring_sign = score*sign
+        scores[score_name] = score_ignoring_sign
+    return scores
+
+
+def score_groups(scorers: List[_BaseScorer], estimator, X_test, y_test, groups_test,
+                 responses: ResponseCache = None) -> List[Tuple[Any, Dict[str, float]]]:
+    group_codes, group_keys = pd.factorize(groups_test, sort=True)
+    in_group = group_codes >= 0
+    y_true = np.asarray(y_test)
+    if responses is None:
+        responses = ResponseCache(X_test)
+
+    scores = [{} for _ in group_keys]  # type: List[Dict[str, float]]
+    group_positions = None
+    for scorer in scorers:
+        score_name = scorer._score_func.__name__
+        group_scores = _get_segmented_scores(scorer, estimator, responses, y_true, group_codes, in_group,
+                                             len(group_keys))
+        if group_scores is None:
+            if group_positions is None:
+                group_positions = _get_group_positions(group_codes, len(group_keys))
+            group_scores = [scorer._score(responses, estimator, positions, y_true[positions]) * scorer._sign
+                            for positions in group_positions]
+        for group_score, score_values in zip(group_scores, scores):
+            score_values[score_name] = group_score
+    return list(zip(group_keys.tolist(), scores))
+
+
+def _get_segmented_scores(scorer: _BaseScorer, estimator, responses: ResponseCache, y_true: np.ndarray,
+                          group_codes: np.ndarray, in_group: np.ndarray, n_groups: int):
+    instance_score = get_instance_score(scorer)
+    if instance_score is None or y_true.ndim != 1:
+        return None
+
+    y_pred = np.asarray(responses(estimator, 'predict'))
+    if y_pred.ndim != 1:
+        return None
+    instance_scores = instance_score(y_true[in_group], y_pred[in_group]).astype(float)
+    codes = group_codes[in_group]
+    totals = np.bincount(codes, weights=instance_scores, minlength=n_groups)
+    counts = np.bincount(codes, minlength=n_groups)
+    return (totals / counts).tolist()
+
+
+def get_instance_score(scorer: _BaseScorer) -> Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]]:
+    """
+    If the scorer's metric is the mean over instances of some value computed from the true
+    and predicted labels, return the function computing that value.
+    """
+    instance_score = SEGMENTED_METRICS.get(scorer._score_func)
+    if instance_score is None or scorer._kwargs or not _uses_predict(scorer):
+        return None
+    return instance_score
+
+
+def _uses_predict(scorer: _BaseScorer) -> bool:
+    response_method = getattr(scorer, '_response_method', None)
+    if response_method is not None:
+        return response_method == 'predict'
+    return type(scorer).__name__ == '_PredictScorer'
+
+
+def _get_group_positions(group_codes: np.ndarray, n_groups: int) -> List[np.ndarray]:
+    order = np.argsort(group_codes, kind='stable')
+    boundaries = np.searchsorted(group_codes[order], np.arange(n_groups + 1))
+    return [order[start:end] for start, end in zip(boundaries[:-1], boundaries[1:])]
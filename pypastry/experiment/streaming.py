@@ -0,0 +1,209 @@
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from pandas import DataFrame
+from sklearn.base import BaseEstimator, clone, is_classifier
+from sklearn.metrics import balanced_accuracy_score, cohen_kappa_score, f1_score, fbeta_score, jaccard_score, \
+    matthews_corrcoef, precision_score, recall_score
+from sklearn.metrics._scorer import _BaseScorer
+
+from pypastry.experiment import StreamingExperiment
+from pypastry.experiment.evaluation import get_run_info
+from pypastry.experiment.hasher import BatchHasher, new_hasher, lookup_memoized_hash, store_memoized_hash
+from pypastry.experiment.scoring import ResponseCache, get_instance_score, _uses_predict
+from pypastry.paths import HASH_MEMO_PATH
+
+# Metrics of predicted labels that only depend on how often each true label is predicted as
+# each label, so they can be computed from the counts with sample weights
+CONFUSION_METRICS = {balanced_accuracy_score, cohen_kappa_score, f1_score, fbeta_score, jaccard_score,
+                     matthews_corrcoef, precision_score, recall_score}
+
+
+def evaluate_streaming(experiment: StreamingExperiment) -> Tuple[Dict[str, Any], List[BaseEstimator], Dict[str, Any]]:
+    """
+    Train the predictor on the dataset and score it on the test set, reading both a batch
+    at a time. The dataset is hashed as it is read, unless both sources are paths whose
+    hash is memoized. The hash doesn't depend on how the rows are split into batches, and
+    is the same as for an Experiment on the rows of each source concatenated.
+    """
+    estimator = clone(experiment.predictor)
+    classifier = is_classifier(estimator)
+    if classifier and experiment.classes is None:
+        raise ValueError("You must give the classes for a streaming experiment with a classifier")
+
+    paths = [source for source in (experiment.dataset, experiment.test_set) if isinstance(source, str)]
+    dataset_hash = None
+    if len(paths) == 2:
+        dataset_hash = lookup_memoized_hash(paths, HASH_MEMO_PATH, experiment.hash_algorithm)
+    hashers = None
+    if dataset_hash is None:
+        hashers = BatchHasher(experiment.hash_algorithm), BatchHasher(experiment.hash_algorithm)
+
+    start = datetime.utcnow()
+    columns = None
+    size = 0
+    for batch in iter_batches(experiment.dataset, experiment.batch_size):
+        if hashers is not None:
+            hashers[0].update(batch)
+        if columns is None:
+            columns = batch.columns.tolist()
+        size += len(batch)
+        X, y = _split_batch(batch, experiment.label_column)
+        if classifier:
+            estimator.partial_fit(X, y, classes=experiment.classes)
+        else:
+            estimator.partial_fit(X, y)
+    if size == 0:
+        raise ValueError("The dataset is empty")
+
+    streaming_scores = StreamingScores(experiment.scorer, estimator)
+    for batch in iter_batches(experiment.test_set, experiment.batch_size):
+        if hashers is not None:
+            hashers[1].update(batch)
+        X, y = _split_batch(batch, experiment.label_column)
+        streaming_scores.add_batch(X, y)
+    scores = streaming_scores.get_scores()
+    end = datetime.utcnow()
+
+    if hashers is not None:
+        # Combined like get_dataset_hash, leaving out a test set without any rows
+        hasher = new_hasher(experiment.hash_algorithm)
+        for batch_hasher in hashers:
+            if batch_hasher.columns is not None:
+                hasher.update(batch_hasher.digest())
+        dataset_hash = hasher.hexdigest()
+        if len(paths) == 2:
+            store_memoized_hash(paths, HASH_MEMO_PATH, experiment.hash_algorithm, dataset_hash)
+
+    run_info = get_run_info(experiment, [(None, scores)], [estimator], start, end)
+    dataset_info = {
+        'hash': dataset_hash,
+        'hash_algorithm': experiment.hash_algorithm,
+        'columns': columns,
+        'size': size,
+    }
+    return run_info, [estimator], dataset_info
+
+
+def iter_batches(source: Any, batch_size: int) -> Iterator[DataFrame]:
+    if callable(source):
+        yield from source()
+        return
+
+    import pyarrow.dataset
+    for record_batch in pyarrow.dataset.dataset(source, format='parquet').to_batches(batch_size=batch_size):
+        if record_batch.num_rows > 0:
+            yield record_batch.to_pandas()
+
+
+def _split_batch(batch: DataFrame, label_column: str):
+    return batch.drop(columns=[label_column]), batch[label_column].to_numpy()
+
+
+class StreamingScores:
+    """
+    Accumulates scores over batches of the test set. Metrics that are a mean over instances
+    keep a running total, and those computed from a confusion matrix, such as precision, recall
+    and F1, keep the count of each pair of true and predicted labels. For other metrics, only
+    the true labels and the predictions each scorer asks for are kept, and the metric is
+    computed once at the end.
+    """
+    def __init__(self, scorers: List[_BaseScorer], estimator: BaseEstimator):
+        self.scorers = scorers
+        self.estimator = estimator
+        self.totals = [None] * len(scorers)  # type: List[Optional[float]]
+        self.count = 0
+        self.confusion = {}  # type: Dict[Tuple[Any, Any], int]
+        self.y_true = []  # type: List[np.ndarray]
+        self.responses = {}  # type: Dict[Tuple[str, str], List[Any]]
+
+    def add_batch(self, X: DataFrame, y: np.ndarray) -> None:
+        responses = ResponseCache(X)
+        recorded_keys = set()
+        counted = False
+        for i, scorer in enumerate(self.scorers):
+            instance_score = get_instance_score(scorer) if y.ndim == 1 else None
+            if instance_score is not None:
+                y_pred = np.asarray(responses(self.estimator, 'predict'))
+                self.totals[i] = (self.totals[i] or 0.0) + float(np.sum(instance_score(y, y_pred)))
+                continue
+            if _is_confusion_metric(scorer, y):
+                if not counted:
+                    self._count_pairs(y, np.asarray(responses(self.estimator, 'predict')))
+                    counted = True
+                continue
+
+            try:
+                scorer._score(_ResponseRecorder(responses), self.estimator, None, y)
+            except _ResponseRecorded as recorded:
+                if recorded.key not in recorded_keys:
+                    self.responses.setdefault(recorded.key, []).append(recorded.response)
+                    recorded_keys.add(recorded.key)
+        self.count += len(y)
+        if recorded_keys:
+            self.y_true.append(y)
+
+    def _count_pairs(self, y_true: np.ndarray, y_pred: np.ndarray) -> None:
+        import pandas as pd
+        pairs = pd.DataFrame({'true': y_true, 'pred': y_pred}).value_counts(sort=False)
+        for pair, count in pairs.items():
+            self.confusion[pair] = self.confusion.get(pair, 0) + int(count)
+
+    def get_scores(self) -> Dict[str, float]:
+        responses = {key: _concatenate(parts) for key, parts in self.responses.items()}
+        y_true = np.concatenate(self.y_true) if self.y_true else None
+
+        def replay(estimator, response_method, positions=None, *args, **kwargs):
+            return responses[_get_response_key(response_method, kwargs)]
+
+        confusion_true = np.array([pair[0] for pair in self.confusion])
+        confusion_pred = np.array([pair[1] for pair in self.confusion])
+        confusion_counts = np.array(list(self.confusion.values()))
+
+        scores = {}
+        for scorer, total in zip(self.scorers, self.totals):
+            score_name = scorer._score_func.__name__
+            if total is not None:
+                scores[score_name] = total / self.count
+            elif scorer._score_func in CONFUSION_METRICS and len(self.confusion) > 0:
+                scores[score_name] = scorer._score_func(confusion_true, confusion_pred,
+                                                        sample_weight=confusion_counts, **scorer._kwargs)
+            else:
+                scores[score_name] = scorer._score(replay, self.estimator, None, y_true) * scorer._sign
+        return scores
+
+
+def _is_confusion_metric(scorer: _BaseScorer, y: np.ndarray) -> bool:
+    return (scorer._score_func in CONFUSION_METRICS and y.ndim == 1 and 'sample_weight' not in scorer._kwargs
+            and _uses_predict(scorer))
+
+
+class _ResponseRecorded(Exception):
+    def __init__(self, key: Tuple[str, str], response: Any):
+        super().__init__(key)
+        self.key = key
+        self.response = response
+
+
+class _ResponseRecorder:
+    """
+    Method caller that gets the predictions a scorer asks for, then stops the scorer
+    before it computes its metric on a single batch.
+    """
+    def __init__(self, responses: ResponseCache):
+        self.responses = responses
+
+    def __call__(self, estimator, response_method: str, positions=None, *args, **kwargs):
+        response = self.responses(estimator, response_method, None, *args, **kwargs)
+        raise _ResponseRecorded(_get_response_key(response_method, kwargs), response)
+
+
+def _get_response_key(response_method: str, kwargs: Dict[str, Any]) -> Tuple[str, str]:
+    return response_method, repr(sorted(kwargs.items()))
+
+
+def _concatenate(parts: List[Any]) -> Any:
+    if isinstance(parts[0], list):
+        return [np.concatenate(outputs) for outputs in zip(*parts)]
+    return np.concatenate(parts)
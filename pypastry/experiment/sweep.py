@@ -0,0 +1,109 @@
+from itertools import product
+from math import ceil
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple, Union
+
+import numpy as np
+from sklearn.base import BaseEstimator, clone
+from sklearn.model_selection import ParameterGrid, ParameterSampler
+
+from pypastry import display
+from pypastry.experiment import Experiment
+from pypastry.experiment.evaluation import ExperimentRunner, fit_folds, get_folds
+from pypastry.experiment.models import ModelStore
+from pypastry.experiment.results import ResultsRepo
+from pypastry.experiment.timing import Timings
+from pypastry.paths import REPO_PATH, RESULTS_PATH, RESULTS_INDEX_PATH, MODEL_STORE_PATH
+
+DEFAULT_FACTOR = 3
+
+
+SweepResult = NamedTuple('SweepResult', [('parameters', Dict[str, Any]), ('rank', int),
+                                         ('scores', List[Tuple[Any, Dict[str, float]]]),
+                                         ('estimators', List[BaseEstimator]), ('timings', Timings)])
+
+
+def get_candidates(parameters: Any, n_iter: int = None, random_state: int = None) -> List[Dict[str, Any]]:
+    """
+    Every combination in a parameter grid, or n_iter samples from it if n_iter is given,
+    in which case the grid may contain distributions as in RandomizedSearchCV.
+    """
+    if n_iter is None:
+        return list(ParameterGrid(parameters))
+    return list(ParameterSampler(parameters, n_iter, random_state=random_state))
+
+
+def successive_halving(experiment: Experiment, candidates: List[Dict[str, Any]], factor: int = DEFAULT_FACTOR,
+                       min_folds: int = 1, dataset_hash: str = None) -> List[SweepResult]:
+    """
+    Race the candidate parameters of the experiment's predictor over the folds of its cross
+    validator. Every candidate is first evaluated on min_folds folds. After each round, only
+    the best 1/factor of the candidates, ranked on their mean score so far with the first
+    scorer, are evaluated on factor times as many folds. This stops once the survivors have
+    been evaluated on every fold, and they are returned best first, with the timings of
+    their folds.
+    """
+    if len(candidates) == 0:
+        raise ValueError("There must be at least one candidate to sweep over")
+    if factor < 2:
+        raise ValueError("The halving factor must be at least 2")
+
+    X, y, groups, train_test = get_folds(experiment)
+    n_folds = len(train_test)
+    primary_scorer = experiment.scorer[0]
+
+    scores = [[] for _ in candidates]  # type: List[List[Tuple[Any, Dict[str, float]]]]
+    estimators = [[] for _ in candidates]  # type: List[List[BaseEstimator]]
+    timings = [Timings(experiment.trace_memory) for _ in candidates]
+    alive = list(range(len(candidates)))
+    folds_done = 0
+    folds_target = min(max(min_folds, 1), n_folds)
+    while True:
+        print("Evaluating {} candidates on {} of {} folds".format(len(alive), folds_target, n_folds))
+        new_folds = range(folds_done, folds_target)
+        runs = list(product(alive, new_folds))
+        fits = [(clone(experiment.predictor).set_params(**candidates[candidate]),
+                 train_test[fold][0], train_test[fold][1]) for candidate, fold in runs]
+        fitted = fit_folds(experiment, X, y, groups, fits, dataset_hash)
+        for (candidate, fold), (fold_scores, estimator, fold_timings) in zip(runs, fitted):
+            scores[candidate] += fold_scores
+            estimators[candidate].append(estimator)
+            timings[candidate].add_fold(fold, fold_timings)
+
+        folds_done = folds_target
+        alive = sorted(alive, key=lambda candidate: _get_ranking_score(scores[candidate], primary_scorer),
+                       reverse=True)
+        if folds_done == n_folds:
+            break
+
+        n_survivors = int(ceil(len(alive) / factor))
+        for candidate in alive[n_survivors:]:
+            # Free the fitted estimators of candidates that have been stopped
+            estimators[candidate] = []
+        alive = alive[:n_survivors]
+        folds_target = n_folds if len(alive) == 1 else min(folds_target * factor, n_folds)
+
+    return [SweepResult(candidates[candidate], rank + 1, scores[candidate], estimators[candidate], timings[candidate])
+            for rank, candidate in enumerate(alive)]
+
+
+def _get_ranking_score(scores: List[Tuple[Any, Dict[str, float]]], scorer) -> float:
+    # Scores are stored ignoring the sign of the scorer, so losses are positive
+    score_name = scorer._score_func.__name__
+    return np.mean([score_values[score_name] for _, score_values in scores]) * scorer._sign
+
+
+def run_sweep(experiment: Experiment, parameters: Any, message: str = "", force: bool = False,
+              show_results: bool = True, n_iter: int = None, random_state: int = None,
+              factor: int = DEFAULT_FACTOR, min_folds: int = 1, save_models: bool = False,
+              untracked_files: Union[bool, Sequence[str]] = False) -> List[Path]:
+    # GitPython is slow to import and only needed here
+    from git import Repo
+    git_repo = Repo(REPO_PATH, search_parent_directories=True)
+    results_repo = ResultsRepo(RESULTS_PATH, RESULTS_INDEX_PATH)
+    model_store = ModelStore(MODEL_STORE_PATH) if save_models else None
+    runner = ExperimentRunner(git_repo, results_repo, display, model_store=model_store,
+                              untracked_files=untracked_files)
+    candidates = get_candidates(parameters, n_iter, random_state)
+    return runner.run_sweep(experiment, candidates, message, force, show_results=show_results,
+                            factor=factor, min_folds=min_folds)
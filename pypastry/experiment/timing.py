@@ -0,0 +1,155 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+Span = NamedTuple('Span', [('name', str), ('start', float), ('seconds', float), ('fold', Optional[int]),
+                           ('peak_memory', Optional[int])])
+
+_listeners = []  # type: List[Callable[[Span], None]]
+# Measurements tracing memory that haven't finished yet, outermost first
+_active_measurements = []  # type: List[Dict[str, Any]]
+
+
+def add_listener(listener: Callable[[Span], None]) -> None:
+    """
+    Call listener with every span recorded from now on, for example to export
+    spans to a tracing system. Spans of folds run in worker processes are passed
+    to listeners in the main process once the fold has finished.
+    """
+    _listeners.append(listener)
+
+
+def remove_listener(listener: Callable[[Span], None]) -> None:
+    _listeners.remove(listener)
+
+
+class Timings:
+    """
+    Records how long each phase of a run takes, and how long each fold spends fitting,
+    predicting and scoring. If trace_memory is true, the peak memory allocated by Python
+    during each span is recorded using tracemalloc, which slows down the run.
+    """
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.phases = []  # type: List[Span]
+        self.folds = []  # type: List[Dict[str, Any]]
+        self.fold_profiles = []  # type: List[Dict[Any, Any]]
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        with measure(self.trace_memory) as measurement:
+            yield
+        self.add_phase(Span(name, measurement['start'], measurement['seconds'], None,
+                            measurement.get('peak_memory')))
+
+    def add_phase(self, span: Span) -> None:
+        self.phases.append(span)
+        _notify(span)
+
+    def add_fold(self, fold: int, fold_timings: Dict[str, Any]) -> None:
+        """
+        Record the timings measured for a fold, and keep the profile of the fold if
+        it was profiled in a worker.
+        """
+        fold_timings = dict(fold_timings, fold=fold)
+        if 'profile' in fold_timings:
+            self.fold_profiles.append(fold_timings.pop('profile'))
+        self.folds.append(fold_timings)
+        for name in ('fit', 'predict', 'score'):
+            if name in fold_timings:
+                _notify(Span(name, fold_timings[name]['start'], fold_timings[name]['seconds'], fold,
+                             fold_timings[name].get('peak_memory')))
+
+    def get_fold_span(self) -> Optional[Tuple[float, float]]:
+        """
+        The time the first fold started and the last one finished, or None if no fold was timed.
+        """
+        spans = [(fold[name]['start'], fold[name]['start'] + fold[name]['seconds'])
+                 for fold in self.folds for name in ('fit', 'predict', 'score') if name in fold]
+        if len(spans) == 0:
+            return None
+        return min(start for start, _ in spans), max(end for _, end in spans)
+
+    def to_dict(self) -> Dict[str, Any]:
+        phases = {}  # type: Dict[str, Dict[str, Any]]
+        for span in self.phases:
+            phase = phases.setdefault(span.name, {'seconds': 0.0})
+            phase['seconds'] += span.seconds
+            if span.peak_memory is not None:
+                phase['peak_memory'] = max(phase.get('peak_memory', 0), span.peak_memory)
+        timings = {
+            'phases': phases,
+            'folds': [_get_fold_summary(fold) for fold in sorted(self.folds, key=lambda fold: fold['fold'])],
+        }
+        for name in ('fit', 'predict', 'score'):
+            timings[name + '_seconds'] = sum(fold[name]['seconds'] for fold in self.folds if name in fold)
+        peak_rss = [fold['peak_rss'] for fold in self.folds if 'peak_rss' in fold]
+        if len(peak_rss) > 0:
+            timings['peak_rss'] = max(peak_rss)
+        if self.trace_memory:
+            peaks = [span.peak_memory for span in self.phases if span.peak_memory is not None]
+            peaks += [fold[name]['peak_memory'] for fold in self.folds for name in ('fit', 'predict', 'score')
+                      if 'peak_memory' in fold.get(name, {})]
+            timings['peak_memory'] = max(peaks, default=None)
+        return timings
+
+
+@contextmanager
+def measure(trace_memory: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Measure the wall clock time taken by the body, and the peak memory allocated during it
+    if trace_memory is true. The measurement is filled in when the body exits.
+
+    Measurements can be nested, such as folds within the folds phase. tracemalloc has a single
+    peak, so before a measurement resets it, the peak so far is kept by the measurements it is
+    nested in.
+    """
+    measurement = {}  # type: Dict[str, Any]
+    started_tracing = False
+    if trace_memory:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif hasattr(tracemalloc, 'reset_peak'):
+            _keep_peak()
+            tracemalloc.reset_peak()
+        measurement['peak_memory'] = 0
+        _active_measurements.append(measurement)
+    start = time.time()
+    start_counter = time.perf_counter()
+    try:
+        yield measurement
+    finally:
+        measurement['start'] = start
+        measurement['seconds'] = time.perf_counter() - start_counter
+        if trace_memory:
+            _active_measurements.remove(measurement)
+            measurement['peak_memory'] = max(measurement['peak_memory'], tracemalloc.get_traced_memory()[1])
+            if started_tracing:
+                tracemalloc.stop()
+
+
+def _keep_peak() -> None:
+    peak = tracemalloc.get_traced_memory()[1]
+    for measurement in _active_measurements:
+        measurement['peak_memory'] = max(measurement['peak_memory'], peak)
+
+
+def _get_fold_summary(fold: Dict[str, Any]) -> Dict[str, Any]:
+    summary = {'fold': fold['fold']}
+    if fold.get('cached'):
+        summary['cached'] = True
+    if 'peak_rss' in fold:
+        summary['peak_rss'] = fold['peak_rss']
+    for name in ('fit', 'predict', 'score'):
+        if name in fold:
+            summary[name + '_seconds'] = fold[name]['seconds']
+            if 'peak_memory' in fold[name]:
+                summary[name + '_peak_memory'] = fold[name]['peak_memory']
+    return summary
+
+
+def _notify(span: Span) -> None:
+    for listener in list(_listeners):
+        listener(span)
@@ -0,0 +1,49 @@
+"""
+Exclusive locks on files, so that many pastry processes can safely update the same
+files in .pypastry. Locks are advisory: they only exclude other code using file_lock.
+"""
+import os
+from contextlib import contextmanager
+from typing import IO, Iterator
+
+if os.name == 'nt':
+    import msvcrt
+
+    def _lock(lock_file: IO) -> None:
+        lock_file.seek(0)
+        while True:
+            try:
+                # Retries for about ten seconds before raising
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def _unlock(lock_file: IO) -> None:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock(lock_file: IO) -> None:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+    def _unlock(lock_file: IO) -> None:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def file_lock(lock_path: str) -> Iterator[None]:
+    """
+    Hold an exclusive lock on lock_path, waiting for any other process holding it.
+    The lock is not reentrant, so don't take it again while holding it.
+    """
+    lock_dir = os.path.dirname(lock_path)
+    if lock_dir:
+        os.makedirs(lock_dir, exist_ok=True)
+    with open(lock_path, 'a+b') as lock_file:
+        _lock(lock_file)
+        try:
+            yield
+        finally:
+            _unlock(lock_file)
@@ -1,6 +1,11 @@
 DISPLAY_DIR = '.pypastry'
-DISPLAY_PATH = DISPLAY_DIR + '/display.txt'
+DISPLAY_PATH = DISPLAY_DIR + '/display.jsonl'
+DISPLAY_LOCK_PATH = DISPLAY_DIR + '/display.lock'
+DISPLAY_REBUILT_PATH = DISPLAY_DIR + '/display.rebuilt'
+FOLD_CACHE_PATH = DISPLAY_DIR + '/folds'
+MODEL_STORE_PATH = DISPLAY_DIR + '/models'
+TRANSFORMER_CACHE_PATH = DISPLAY_DIR + '/transformers'
+HASH_MEMO_PATH = DISPLAY_DIR + '/dataset_hashes.json'
 RESULTS_PATH = 'results'
+RESULTS_INDEX_PATH = DISPLAY_DIR + '/results.sqlite'
 REPO_PATH = '.'
-
-
@@ -18,6 +18,7 @@ setup(
     url='https://github.com/datapastry/pypastry',
     scripts=['pastry'],
     install_requires=['tomlkit', 'pandas', 'scikit-learn', 'pyarrow', 'gitpython', 'pytest'],
+    extras_require={'benchmark': ['pytest-benchmark']},
     #To find the packages 
     packages=find_packages(),
     #To read in data file modules 
@@ -26,8 +27,12 @@ setup(
     entry_points={
         'console_scripts': [
             'init = pypastry.commands.init:run',
+            'cache = pypastry.commands.cache:run',
+            'compare = pypastry.commands.compare:run',
             'print = pypastry.commands.print_:run',
-            'run = pypastry.commands.run:run'
+            'profile = pypastry.commands.profile:run',
+            'run = pypastry.commands.run:run',
+            'sweep = pypastry.commands.sweep:run'
             ]},
     package_data={
 
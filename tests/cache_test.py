@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+from pandas import DataFrame
+from sklearn.metrics import accuracy_score, make_scorer
+from sklearn.model_selection import KFold
+from sklearn.tree import DecisionTreeClassifier
+
+from pypastry.experiment import Experiment
+from pypastry.experiment import evaluation
+from pypastry.experiment.cache import FoldCache, parse_size
+from pypastry.experiment.evaluation import evaluate_predictor
+
+
+@pytest.fixture
+def fold_cache(tmp_path):
+    return FoldCache(str(tmp_path / 'folds'))
+
+
+@pytest.fixture
+def experiment():
+    dataset = DataFrame({
+        'a': [1, 1, 0, 0, 1, 0],
+        'b': [1, 1, 0, 0, 1, 0],
+    })
+    return Experiment(dataset, 'b', DecisionTreeClassifier(), KFold(n_splits=2), make_scorer(accuracy_score))
+
+
+def test_key_depends_on_indices(fold_cache):
+    key = fold_cache.get_key('experiment', np.array([0, 1]), np.array([2]))
+
+    assert key == fold_cache.get_key('experiment', np.array([0, 1]), np.array([2]))
+    assert key != fold_cache.get_key('experiment', np.array([0]), np.array([1, 2]))
+    assert key != fold_cache.get_key('other', np.array([0, 1]), np.array([2]))
+
+
+def test_put_and_get(fold_cache):
+    assert fold_cache.get('missing') is None
+
+    fold_cache.put('key', ([(None, {'accuracy_score': 1.0})], 'estimator'))
+
+    assert ([(None, {'accuracy_score': 1.0})], 'estimator') == fold_cache.get('key')
+
+
+@pytest.mark.parametrize("contents", [b'', b'not a pickle', b'cmissing_pastry_module\nFold\n.',
+                                      b'cos\nmissing_pastry_function\n.'])
+def test_unreadable_entry_is_a_miss(fold_cache, contents):
+    fold_cache.put('key', 'estimator')
+    path = os.path.join(fold_cache.cache_path, 'key.joblib')
+    with open(path, 'wb') as entry_file:
+        entry_file.write(contents)
+
+    assert fold_cache.get('key') is None
+    assert not os.path.exists(path)
+
+
+def test_prune_evicts_least_recently_used(fold_cache):
+    for i, key in enumerate(['first', 'second', 'third']):
+        fold_cache.put(key, np.zeros(1000))
+        path = os.path.join(fold_cache.cache_path, key + '.joblib')
+        os.utime(path, (i, i))
+    fold_cache.get('first')
+
+    entry_size = fold_cache.entries()[0].size
+    removed = fold_cache.prune(2 * entry_size)
+
+    assert ['second'] == [entry.key for entry in removed]
+    assert {'first', 'third'} == {entry.key for entry in fold_cache.entries()}
+
+
+def test_evaluation_reuses_cached_folds(experiment, fold_cache, monkeypatch):
+    run_info, _ = evaluate_predictor(experiment, fold_cache, 'dataset-hash')
+    assert 2 == len(fold_cache.entries())
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Fold should have been cached")
+    monkeypatch.setattr(evaluation, '_fit_and_predict', fail)
+
+    cached_run_info, estimators = evaluate_predictor(experiment, fold_cache, 'dataset-hash')
+
+    assert run_info['results'] == cached_run_info['results']
+    assert 2 == len(estimators)
+
+
+@pytest.mark.parametrize("size, expected", [("100", 100), ("2K", 2048), ("1.5M", 1572864), ("1GB", 1024 ** 3)])
+def test_parse_size(size, expected):
+    assert expected == parse_size(size)
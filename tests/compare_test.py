@@ -0,0 +1,145 @@
+import sys
+
+import numpy as np
+import pytest
+
+from pypastry.commands import compare as compare_command
+from pypastry.experiment import compare
+from pypastry.experiment.compare import bootstrap_interval, compare_results, permutation_test
+from pypastry.experiment.results import ResultsRepo
+from pypastry.paths import RESULTS_PATH, RESULTS_INDEX_PATH
+
+
+@pytest.fixture
+def results_repo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return ResultsRepo(RESULTS_PATH, RESULTS_INDEX_PATH)
+
+
+def _save(results_repo, scores, dataset_hash='dddd0000', summary='run', groups=None):
+    run_info = {'run_start': '2020-01-01 00:00:00', 'model_info': {'type': 'DummyClassifier'},
+                'results_detail': {'accuracy_score': list(scores)}}
+    if groups is not None:
+        run_info['results_detail']['g'] = list(groups)
+        run_info['group_column'] = 'g'
+    path = results_repo.save_results(run_info, {'hash': dataset_hash},
+                                     {'git_hash_msg': 'abcd1234', 'git_summary_msg': summary})
+    return results_repo.get_result(path.name)
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_identical_scores_do_not_differ(compress, monkeypatch):
+    if not compress:
+        monkeypatch.setattr(compare, 'COMPRESS_FRACTION', 10 ** 9)
+    differences = np.zeros(1000)
+    random = np.random.default_rng(0)
+
+    assert (0.0, 0.0) == bootstrap_interval(differences, 1000, random=random)
+    assert 1.0 == permutation_test(differences, 1000, random)
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_better_scores_differ(compress, monkeypatch):
+    if not compress:
+        monkeypatch.setattr(compare, 'COMPRESS_FRACTION', 10 ** 9)
+    random = np.random.default_rng(0)
+    a = (random.random(5000) < 0.7).astype(float)
+    b = (random.random(5000) < 0.8).astype(float)
+
+    low, high = bootstrap_interval(b - a, 2000, random=random)
+    p_value = permutation_test(b - a, 2000, random)
+
+    assert 0 < low < (b - a).mean() < high
+    assert high - low == pytest.approx(2 * 1.96 * (b - a).std() / np.sqrt(5000), rel=0.15)
+    assert p_value == 1 / 2001
+
+
+def test_continuous_scores_are_binned():
+    random = np.random.default_rng(0)
+    differences = random.standard_t(3, 100000) + 0.05
+
+    assert len(compare._compress(differences)[0]) == compare.MAX_BINS
+    low, high = bootstrap_interval(differences, 2000, random=random)
+    p_value = permutation_test(differences, 2000, random)
+
+    assert 0 < low < differences.mean() < high
+    assert high - low == pytest.approx(2 * 1.96 * differences.std() / np.sqrt(100000), rel=0.1)
+    assert p_value < 0.01
+
+
+def test_binning_keeps_outliers():
+    random = np.random.default_rng(0)
+    differences = random.normal(0, 0.01, 100000)
+    differences[:5] = 1000
+
+    low, high = bootstrap_interval(differences, 2000, random=random)
+    p_value = permutation_test(differences, 2000, random)
+
+    # Only flipping all five outliers the same way gives a mean as large
+    assert low < 0.02 < differences.mean() < high
+    assert p_value == pytest.approx(1 / 32, abs=0.01)
+
+
+def test_compare_results_pairs_detail(results_repo):
+    random = np.random.default_rng(1)
+    a = (random.random(3000) < 0.5).astype(float)
+    b = a.copy()
+    b[:300] = 1.0
+    result_a = _save(results_repo, a)
+    result_b = _save(results_repo, b)
+
+    comparison, = compare_results(results_repo, result_a, result_b, n_resamples=1000, random_state=0)
+
+    assert 'accuracy_score' == comparison.score
+    assert 3000 == comparison.pairs
+    assert comparison.difference == pytest.approx(b.mean() - a.mean())
+    assert comparison.ci_low > 0
+    assert comparison.p_value < 0.01
+
+
+def test_compare_results_on_different_datasets(results_repo):
+    result_a = _save(results_repo, [0.5, 0.75])
+    result_b = _save(results_repo, [0.5, 0.75], dataset_hash='eeee0000')
+
+    with pytest.raises(ValueError):
+        compare_results(results_repo, result_a, result_b)
+
+
+def test_compare_results_with_different_folds(results_repo):
+    result_a = _save(results_repo, [0.5, 0.75])
+    result_b = _save(results_repo, [0.5, 0.75, 1.0])
+
+    with pytest.raises(ValueError):
+        compare_results(results_repo, result_a, result_b)
+
+
+def test_compare_results_skips_group_column(results_repo):
+    result_a = _save(results_repo, [0.5, 0.75, 1.0], groups=[3, 1, 2])
+    result_b = _save(results_repo, [0.75, 0.75, 1.0], groups=[3, 1, 2])
+
+    comparisons = compare_results(results_repo, result_a, result_b, n_resamples=100, random_state=0)
+
+    assert ['accuracy_score'] == [comparison.score for comparison in comparisons]
+
+
+def test_compare_results_with_different_groups(results_repo):
+    result_a = _save(results_repo, [0.5, 0.75, 1.0], groups=[3, 1, 2])
+    result_b = _save(results_repo, [0.75, 0.75, 1.0], groups=[1, 2, 3])
+
+    with pytest.raises(ValueError):
+        compare_results(results_repo, result_a, result_b)
+
+
+def test_compare_command(results_repo, monkeypatch, capsys):
+    result_a = _save(results_repo, [0.5, 0.6, 0.7, 0.8], summary='baseline')
+    result_b = _save(results_repo, [0.6, 0.7, 0.8, 0.9], summary='deeper')
+    monkeypatch.setattr(sys, 'argv', ['pastry', 'compare', result_a.data['result_json_name'],
+                                      result_b.data['result_json_name'], '-n', '100', '--random-state', '0'])
+
+    compare_command.run()
+
+    output = capsys.readouterr().out
+    assert '(baseline)' in output
+    assert '(deeper)' in output
+    assert 'accuracy_score' in output
+    assert '+0.1000' in output
@@ -1,7 +1,15 @@
+import json
+import multiprocessing
+import sys
+from unittest.mock import Mock
+
 import pytest
 
-from pypastry.display import _get_results_dataframe
-from pypastry.experiment.results import Result
+from pypastry import display
+from pypastry.commands import print_ as print_command
+from pypastry.display import _get_results_dataframe, update_display, print_cache_file, cache_display, print_scores
+from pypastry.experiment.results import Result, ResultsRepo
+from pypastry.paths import DISPLAY_PATH, RESULTS_PATH
 
 
 @pytest.fixture
@@ -72,3 +80,129 @@ def test_get_display(get_result_dict):
         ),
     }
     assert expected == row
+
+
+def test_get_display_with_timings(get_result_dict):
+    get_result_dict['timings'] = {'phases': {'hash': 0.1}, 'folds': [], 'fit_seconds': 2.5, 'predict_seconds': 0.25,
+                                  'score_seconds': 0.01}
+    row = _get_results_dataframe([Result(get_result_dict)]).iloc[0].to_dict()
+
+    assert '2.50' == row['Fit (s)']
+    assert '0.25' == row['Predict (s)']
+
+
+def test_print_scores(get_result_dict, capsys):
+    print_scores(Result(get_result_dict))
+
+    assert capsys.readouterr().out == ("Scores: mean_relative_error 0.500 ± 0.010, mean_absolute_error 100.000 ± 1.000, "
+                                       "mean_squared_error 1000.000 ± 10.000\n")
+
+
+def test_update_display_appends_result(get_result_dict, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    later_result_dict = dict(get_result_dict, run_start="2020-02-01 10:00:00.000000", result_json_name="later")
+    results_repo = Mock()
+    results_repo.get_results.return_value = [Result(later_result_dict)]
+
+    update_display(Result(later_result_dict), results_repo)
+    update_display(Result(get_result_dict), results_repo)
+    print_cache_file()
+
+    assert 1 == len(results_repo.get_results.call_args_list)
+    lines = capsys.readouterr().out.splitlines()
+    assert 3 == len(lines)
+    assert "jsonhash" in lines[1]
+    assert "later" in lines[2]
+
+
+@pytest.mark.parametrize("options, expected", [
+    ({}, ['run-0', 'run-1', 'run-2', 'run-3', 'run-4']),
+    ({'limit': 2}, ['run-3', 'run-4']),
+    ({'since': '2020-01-04'}, ['run-3', 'run-4']),
+    ({'model': 'Other'}, ['run-1', 'run-3']),
+    ({'model': 'Other', 'limit': 1}, ['run-3']),
+    ({'sort': 'Dataset size', 'reverse': True}, ['run-4', 'run-3', 'run-2', 'run-1', 'run-0']),
+])
+def test_print_cache_file_options(get_result_dict, tmp_path, monkeypatch, capsys, options, expected):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(display, 'READ_BLOCK_SIZE', 100)
+    results = []
+    for i in range(5):
+        result_dict = dict(get_result_dict, run_start="2020-01-0{} 10:00:00".format(i + 1),
+                           result_json_name="run-{}".format(i),
+                           dataset=dict(get_result_dict['dataset'], size=i),
+                           model_info={'type': 'Other' if i % 2 else 'KNearestNeighbor'})
+        results.append(Result(result_dict))
+    cache_display(results)
+
+    print_cache_file(**options)
+
+    lines = capsys.readouterr().out.splitlines()[1:]
+    assert expected == [name for line in lines for name in line.split() if name.startswith('run-')]
+
+
+def test_print_since_reads_past_long_runs(get_result_dict, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(display, 'SINCE_WINDOW', 3)
+    # Rows are in the order runs finished, so a run that started long ago can follow newer ones
+    run_starts = ['2020-01-01', '2020-01-05', '2020-01-06', '2020-01-02', '2020-01-03', '2020-01-04']
+    results = [Result(dict(get_result_dict, run_start=run_start + " 10:00:00", result_json_name="run-" + run_start))
+               for run_start in run_starts]
+    cache_display(results[:1])
+    for result in results[1:]:
+        update_display(result, Mock())
+
+    print_cache_file(since='2020-01-03')
+    lines = capsys.readouterr().out.splitlines()[1:]
+    assert ['run-2020-01-03', 'run-2020-01-04', 'run-2020-01-05', 'run-2020-01-06'] == \
+        [name for line in lines for name in line.split() if name.startswith('run-')]
+
+    print_cache_file(since='2020-01-06')
+    lines = capsys.readouterr().out.splitlines()[1:]
+    # Reading stops after three older runs in a row, before reaching the newest run
+    assert [] == [name for line in lines for name in line.split() if name.startswith('run-')]
+
+
+def test_print_unknown_sort_column(get_result_dict, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    cache_display([Result(get_result_dict)])
+    monkeypatch.setattr(sys, 'argv', ['pastry', 'print', '--sort', 'Flavour'])
+
+    with pytest.raises(SystemExit):
+        print_command.run()
+
+    assert "Unknown column to sort by: Flavour" in capsys.readouterr().err
+
+
+def _run_and_display(result_dict):
+    results_repo = ResultsRepo(RESULTS_PATH)
+    run_info = dict(result_dict)
+    results_repo.save_results(run_info, run_info.pop('dataset'),
+                              {'git_hash_msg': run_info.pop('git_hash'), 'git_summary_msg': run_info.pop('git_summary')})
+    update_display(Result(run_info), results_repo)
+
+
+def test_concurrent_runs_each_displayed_once(get_result_dict, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result_dicts = [dict(get_result_dict, run_start="2020-01-31 09:{:02d}:00".format(i)) for i in range(16)]
+
+    with multiprocessing.get_context('spawn').Pool(8) as pool:
+        pool.map(_run_and_display, result_dicts)
+
+    with open(DISPLAY_PATH) as display_file:
+        rows = [json.loads(line) for line in display_file]
+    assert 16 == len(rows)
+    assert 16 == len({row['Result JSON name'] for row in rows})
+
+
+def test_print_ignores_row_being_written(get_result_dict, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    cache_display([Result(get_result_dict)])
+    with open(DISPLAY_PATH, 'a') as display_file:
+        display_file.write('{"Run start": "2020-02')
+
+    print_cache_file()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert 2 == len(lines)
+    assert "jsonhash" in lines[1]
@@ -1,5 +1,7 @@
+import threading
 from unittest.mock import Mock, MagicMock
 
+import numpy as np
 import pytest
 from pandas import DataFrame
 from sklearn.dummy import DummyClassifier
@@ -8,7 +10,8 @@ from sklearn.model_selection import StratifiedShuffleSplit, GroupShuffleSplit
 from sklearn.tree import DecisionTreeClassifier
 
 from pypastry.experiment import Experiment
-from pypastry.experiment.evaluation import ExperimentRunner, evaluate_predictor, DirtyRepoError
+from pypastry.experiment.evaluation import ExperimentRunner, evaluate_predictor, DirtyRepoError, _take, \
+    get_experiment_hash, get_git_state
 
 
 @pytest.fixture
@@ -81,9 +84,10 @@ def test_simple_evaluation(dirty, force, simple_dataset):
     # TODO: check the hash. Need to find a way to make this consistent between python versions etc.
     # assert '28ea628a50a47c726a9b0ec437c88fc4742d81fd' == dataset_info['hash']
 
-    assert 1 == len(results_display_mock.cache_display.call_args_list)
-    print(results_display_mock.cache_display.call_args[0])
-    assert len(results_display_mock.cache_display.call_args[0]) > 0
+    assert 1 == len(results_display_mock.update_display.call_args_list)
+    result, results_repo = results_display_mock.update_display.call_args[0]
+    assert run_info == result.data
+    assert results_repo_mock == results_repo
     assert 1 == len(results_display_mock.print_cache_file.call_args_list)
 
 
@@ -119,6 +123,7 @@ def test_grouped_evaluation(dirty, force, grouped_dataset):
 
     assert run_info['results']["test_score"]["accuracy_score"] == 0.5
     assert run_info['results']["test_score_sem"]["accuracy_score"] == 0.0
+    assert run_info['group_column'] == 'g'
 
 
 def test_multiple_scorers(simple_dataset):
@@ -139,3 +144,131 @@ def test_multiple_scorers(simple_dataset):
     }
 
     assert expected_results == results
+
+
+@pytest.mark.parametrize("backend", ['loky', 'threading', 'multiprocessing'])
+def test_parallel_evaluation(backend, grouped_dataset):
+    cross_validation = GroupShuffleSplit(n_splits=4, test_size=0.5, random_state=0)
+    scorer = make_scorer(accuracy_score)
+
+    serial = Experiment(grouped_dataset, 'b', DecisionTreeClassifier(), cross_validation, scorer, group_column='g')
+    parallel = Experiment(grouped_dataset, 'b', DecisionTreeClassifier(), cross_validation, scorer, group_column='g',
+                          n_jobs=2, backend=backend, max_nbytes=0)
+
+    serial_run_info, _ = evaluate_predictor(serial)
+    parallel_run_info, estimators = evaluate_predictor(parallel)
+
+    assert serial_run_info['results_detail'] == parallel_run_info['results_detail']
+    assert 4 == len(estimators)
+
+
+def test_invalid_backend(simple_dataset):
+    with pytest.raises(ValueError):
+        Experiment(simple_dataset, 'b', DecisionTreeClassifier(), StratifiedShuffleSplit(), backend='spark')
+
+
+@pytest.mark.parametrize("options", [
+    {'cross_validator': GroupShuffleSplit(n_splits=3, test_size=0.5, random_state=0), 'group_column': 'g'},
+    {'cross_validator': StratifiedShuffleSplit(n_splits=3, test_size=0.5, random_state=0),
+     'average_scores_on_instances': True},
+    {'test_set': 'second half'},
+])
+def test_numpy_features_match_dataframe(options, grouped_dataset):
+    options = dict(options)
+    dataset = grouped_dataset
+    if options.get('test_set') is not None:
+        dataset, options['test_set'] = grouped_dataset.iloc[:50], grouped_dataset.iloc[50:]
+    scorer = make_scorer(accuracy_score)
+
+    frame_experiment = Experiment(dataset, 'b', DecisionTreeClassifier(random_state=0), scorer=scorer, **options)
+    numpy_experiment = Experiment(dataset, 'b', DecisionTreeClassifier(random_state=0), scorer=scorer,
+                                  numpy_features=True, **options)
+
+    frame_run_info, _ = evaluate_predictor(frame_experiment)
+    numpy_run_info, _ = evaluate_predictor(numpy_experiment)
+
+    assert frame_run_info['results_detail'] == numpy_run_info['results_detail']
+
+
+def test_memoized_hash_changes_with_frame(grouped_dataset, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_path = tmp_path / 'data.csv'
+    grouped_dataset.to_csv(data_path, index=False)
+
+    def get_hash(dataset):
+        return get_experiment_hash(Experiment(dataset, 'b', DecisionTreeClassifier(), StratifiedShuffleSplit(),
+                                              dataset_paths=str(data_path)))
+
+    dataset_hash = get_hash(grouped_dataset)
+
+    assert dataset_hash == get_hash(grouped_dataset)
+    assert dataset_hash != get_hash(grouped_dataset.drop(columns=['g']))
+    assert dataset_hash != get_hash(grouped_dataset.iloc[:50])
+    assert dataset_hash != get_hash(grouped_dataset.astype({'a': float}))
+
+
+def test_take_range_is_view():
+    X = np.arange(20).reshape(10, 2)
+
+    assert np.shares_memory(X, _take(X, np.arange(2, 6)))
+    assert [[4, 5], [0, 1]] == _take(X, np.array([2, 0])).tolist()
+
+
+@pytest.mark.parametrize("force", [False, True])
+def test_git_state_read_once_in_background(force, simple_dataset, get_predictor, get_cross_validator, get_scorer):
+    experiment = Experiment(simple_dataset, 'b', get_predictor, get_cross_validator, get_scorer)
+    threads = []
+    git_mock = Mock()
+    git_mock.is_dirty.side_effect = lambda **kwargs: threads.append(threading.get_ident()) or False
+    git_mock.head.object.hexsha = 'abcdef1234567890'
+    results_repo_mock = Mock()
+    results_display_mock = Mock()
+    runner = ExperimentRunner(git_mock, results_repo_mock, results_display_mock)
+
+    runner.run_experiment(experiment, "msg", force)
+
+    assert len(threads) == 1
+    assert threads[0] != threading.get_ident()
+    assert results_repo_mock.save_results.call_args[1]['git_info']['git_hash_msg'] == 'abcdef12'
+    run_info = results_repo_mock.save_results.call_args[0][0]
+    assert 'git' in run_info['timings']['phases']
+
+    # Scores are shown as soon as the result is saved, before the display cache is updated
+    called = [name for name, _, _ in results_display_mock.method_calls]
+    assert called == ['print_scores', 'update_display', 'print_cache_file']
+
+
+def _commit_all(repo):
+    repo.git.add(A=True)
+    repo.git.commit(m='Initial')
+
+
+@pytest.mark.parametrize("untracked_files, dirty", [(False, False), (True, True), (['src'], False),
+                                                    (['data'], True)])
+def test_git_state_untracked_files(untracked_files, dirty, tmp_path):
+    git = pytest.importorskip('git')
+    repo = git.Repo.init(str(tmp_path))
+    repo.git.config('user.email', 'pastry@example.com')
+    repo.git.config('user.name', 'Pastry')
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'pie.py').write_text('')
+    _commit_all(repo)
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'data' / 'train.csv').write_text('a,b\n')
+
+    state = get_git_state(repo, untracked_files)
+
+    assert state.dirty == dirty
+    assert state.hexsha == repo.head.object.hexsha
+
+
+def test_git_state_tracked_changes_are_dirty(tmp_path):
+    git = pytest.importorskip('git')
+    repo = git.Repo.init(str(tmp_path))
+    repo.git.config('user.email', 'pastry@example.com')
+    repo.git.config('user.name', 'Pastry')
+    (tmp_path / 'pie.py').write_text('')
+    _commit_all(repo)
+    (tmp_path / 'pie.py').write_text('changed')
+
+    assert get_git_state(repo, ['data']).dirty
@@ -0,0 +1,215 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+from pandas import DataFrame
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.metrics import accuracy_score, make_scorer
+from sklearn.model_selection import GroupKFold, KFold
+from sklearn.tree import DecisionTreeClassifier
+
+from pypastry.experiment import Experiment
+from pypastry.experiment.evaluation import evaluate_predictor
+from pypastry.experiment import executors
+from pypastry.experiment.executors import FoldExecutor, WorkerPoolExecutor, MemoryBoundedExecutor, \
+    AUTHKEY_ENVIRONMENT_VARIABLE
+
+
+class FailingClassifier(BaseEstimator, ClassifierMixin):
+    def fit(self, X, y):
+        raise ArithmeticError("Can't fit")
+
+
+class KilledOnceClassifier(DecisionTreeClassifier):
+    """
+    Killed the first time it is fitted, as if by the kernel running out of memory.
+    """
+    def __init__(self, flag_path=None, random_state=0):
+        super().__init__(random_state=random_state)
+        self.flag_path = flag_path
+
+    def fit(self, X, y, sample_weight=None, check_input=True):
+        if not os.path.exists(self.flag_path):
+            open(self.flag_path, 'w').close()
+            os.kill(os.getpid(), signal.SIGKILL)
+        return super().fit(X, y)
+
+
+class _CountingConnection:
+    """
+    Wraps a connection to a worker to count the datasets sent over it.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.datasets_sent = 0
+
+    def send(self, message):
+        if message[0] == 'dataset':
+            self.datasets_sent += 1
+        self.connection.send(message)
+
+    def recv(self):
+        return self.connection.recv()
+
+    def fileno(self):
+        return self.connection.fileno()
+
+    def close(self):
+        self.connection.close()
+
+
+@pytest.fixture
+def grouped_dataset():
+    random = np.random.RandomState(0)
+    a = random.normal(size=200)
+    return DataFrame({'a': a, 'b': (a > 0).astype(int), 'g': np.arange(200) // 4})
+
+
+@pytest.fixture
+def executor():
+    with WorkerPoolExecutor(2) as executor:
+        yield executor
+
+
+def _get_experiment(dataset, **kwargs):
+    return Experiment(dataset, 'b', DecisionTreeClassifier(random_state=0), GroupKFold(n_splits=4),
+                      make_scorer(accuracy_score), group_column='g', **kwargs)
+
+
+def test_worker_pool_matches_joblib(grouped_dataset, executor):
+    run_info, estimators = evaluate_predictor(_get_experiment(grouped_dataset))
+    pool_run_info, pool_estimators = evaluate_predictor(_get_experiment(grouped_dataset, executor=executor))
+
+    assert run_info['results'] == pool_run_info['results']
+    assert run_info['results_detail'] == pool_run_info['results_detail']
+    assert 4 == len(pool_estimators)
+    assert all(estimator.tree_ is not None for estimator in pool_estimators)
+    assert 4 == len(pool_run_info['timings']['folds'])
+
+
+def test_each_worker_gets_dataset_once(grouped_dataset, executor):
+    executor.start()
+    executor._connections = [_CountingConnection(connection) for connection in executor._connections]
+
+    for _ in range(2):
+        evaluate_predictor(_get_experiment(grouped_dataset, executor=executor), dataset_hash='dataset-hash')
+
+    assert sum(connection.datasets_sent for connection in executor._connections) <= 2
+
+    changed = grouped_dataset.assign(a=-grouped_dataset['a'])
+    evaluate_predictor(_get_experiment(changed, executor=executor), dataset_hash='changed-hash')
+
+    assert sum(connection.datasets_sent for connection in executor._connections) > 2
+
+
+def test_worker_errors_are_raised(grouped_dataset):
+    executor = WorkerPoolExecutor(1)
+    experiment = Experiment(grouped_dataset, 'b', FailingClassifier(), KFold(n_splits=2), executor=executor)
+
+    with pytest.raises(ArithmeticError):
+        evaluate_predictor(experiment)
+
+    # The pool is closed, so that it can start afresh
+    assert executor._listener is None
+    assert [] == executor._processes
+
+
+def test_worker_stopped_before_connecting(monkeypatch):
+    # Spawned workers run sys.exit instead of serving, so they never connect
+    monkeypatch.setattr(executors, 'serve', sys.exit)
+    monkeypatch.setattr(executors, 'ACCEPT_POLL_SECONDS', 0.1)
+    executor = WorkerPoolExecutor(1)
+
+    with pytest.raises(RuntimeError):
+        executor.start()
+
+    assert executor._listener is None
+
+
+def test_fold_executor_needs_run_folds():
+    class NoRunFolds(FoldExecutor):
+        pass
+
+    with pytest.raises(TypeError):
+        NoRunFolds()
+
+
+def test_remote_worker(grouped_dataset):
+    authkey = os.urandom(16)
+    executor = WorkerPoolExecutor(0, remote_workers=1, authkey=authkey)
+    starting = threading.Thread(target=executor.start)
+    starting.start()
+    while executor._listener is None:
+        time.sleep(0.01)
+    host, port = executor._listener.address
+    environment = dict(os.environ, **{AUTHKEY_ENVIRONMENT_VARIABLE: authkey.hex()})
+    worker = subprocess.Popen([sys.executable, '-m', 'pypastry.experiment.executors', '{}:{}'.format(host, port)],
+                              env=environment)
+    try:
+        starting.join()
+        run_info, _ = evaluate_predictor(_get_experiment(grouped_dataset, executor=executor))
+        assert 4 == len(run_info['timings']['folds'])
+    finally:
+        executor.close()
+        assert 0 == worker.wait(timeout=30)
+
+
+posix_only = pytest.mark.skipif(sys.platform == 'win32', reason="Peak memory is measured on POSIX only")
+
+
+@posix_only
+def test_memory_bounded_records_peak_memory(grouped_dataset):
+    run_info, _ = evaluate_predictor(_get_experiment(grouped_dataset))
+    executor = MemoryBoundedExecutor('64G', max_workers=2)
+    bounded_run_info, _ = evaluate_predictor(_get_experiment(grouped_dataset, executor=executor))
+
+    assert run_info['results_detail'] == bounded_run_info['results_detail']
+    folds = bounded_run_info['timings']['folds']
+    assert all(fold['peak_rss'] > 1024 ** 2 for fold in folds)
+    assert bounded_run_info['timings']['peak_rss'] == max(fold['peak_rss'] for fold in folds)
+
+
+def test_memory_bounded_capacity():
+    executor = MemoryBoundedExecutor('1G', max_workers=4)
+
+    assert 1 == executor.get_capacity(None)
+    assert 1 == executor.get_capacity(2 * 1024 ** 3)
+    assert 3 == executor.get_capacity(300 * 1024 ** 2)
+    assert 4 == executor.get_capacity(1024)
+
+
+@posix_only
+def test_memory_bounded_retries_killed_fold(grouped_dataset, tmp_path, capsys):
+    experiment = Experiment(grouped_dataset, 'b', KilledOnceClassifier(str(tmp_path / 'killed')),
+                            GroupKFold(n_splits=2), group_column='g', executor=MemoryBoundedExecutor('64G'))
+
+    run_info, estimators = evaluate_predictor(experiment)
+
+    assert "retrying with at most 1 folds at once" in capsys.readouterr().out
+    assert 2 == len(estimators)
+    assert 2 == len(run_info['timings']['folds'])
+
+
+@posix_only
+def test_memory_bounded_gives_up(grouped_dataset, tmp_path):
+    executor = MemoryBoundedExecutor('64G', retries=1)
+    experiment = Experiment(grouped_dataset, 'b', DecisionTreeClassifier(), GroupKFold(n_splits=2),
+                            group_column='g', executor=executor)
+    # Far too little address space for a Python process to fit a tree
+    executor.fold_memory_limit = 1
+
+    with pytest.raises(RuntimeError):
+        evaluate_predictor(experiment)
+
+
+def test_memory_bounded_raises_fold_errors(grouped_dataset):
+    experiment = Experiment(grouped_dataset, 'b', FailingClassifier(), KFold(n_splits=2),
+                            executor=MemoryBoundedExecutor('64G'))
+
+    with pytest.raises(ArithmeticError):
+        evaluate_predictor(experiment)
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import DataFrame
+
+from pypastry.experiment.hasher import BatchHasher, get_dataset_hash, get_frame_digest, get_parquet_hash, \
+    get_memoized_hash
+
+
+@pytest.fixture
+def dataset():
+    return DataFrame({
+        'number': [1, 2, 3],
+        'real': [0.5, np.nan, 1.5],
+        'text': ['x', 'y', None],
+        'time': pd.to_datetime(['2020-01-01', '2020-01-02', '2020-01-03']),
+        'category': pd.Categorical(['u', 'v', 'u']),
+        'nullable': pd.array([1, None, 3], dtype='Int64'),
+    })
+
+
+@pytest.mark.parametrize("algorithm", ['sha1', 'blake2b'])
+def test_hash_is_stable(dataset, algorithm):
+    assert get_dataset_hash(dataset, algorithm=algorithm) == get_dataset_hash(dataset.copy(), algorithm=algorithm)
+
+
+@pytest.mark.parametrize("column, value", [('number', 4), ('real', 0.0), ('text', 'z'), ('category', 'v')])
+def test_hash_changes_with_values(dataset, column, value):
+    changed = dataset.copy()
+    changed.loc[0, column] = value
+
+    assert get_dataset_hash(dataset) != get_dataset_hash(changed)
+
+
+def test_hash_depends_on_column_names_and_test_set(dataset):
+    renamed = dataset.rename(columns={'number': 'other'})
+
+    assert get_dataset_hash(dataset) != get_dataset_hash(renamed)
+    assert get_dataset_hash(dataset) != get_dataset_hash(dataset, dataset)
+
+
+def test_parallel_hash_matches_serial(dataset):
+    assert get_dataset_hash(dataset) == get_dataset_hash(dataset, n_jobs=4)
+
+
+def test_batch_hash_matches_frame_digest(dataset):
+    hasher = BatchHasher()
+    hasher.update(dataset.iloc[:2])
+    hasher.update(dataset.iloc[2:])
+
+    assert get_frame_digest(dataset) == hasher.digest()
+
+
+@pytest.mark.parametrize("column, dtype", [('number', float), ('category', pd.CategoricalDtype(['u', 'v', 'w']))])
+def test_batch_dtypes_must_match(dataset, column, dtype):
+    hasher = BatchHasher()
+    hasher.update(dataset.iloc[:2])
+
+    with pytest.raises(ValueError):
+        hasher.update(dataset.iloc[2:].astype({column: dtype}))
+
+
+def test_legacy_hash(dataset):
+    assert get_parquet_hash(dataset) == get_dataset_hash(dataset, legacy=True)
+
+
+def test_unknown_algorithm(dataset):
+    with pytest.raises(ValueError):
+        get_dataset_hash(dataset, algorithm='md4')
+
+
+def test_memoized_hash(tmp_path):
+    data_path = tmp_path / 'data.csv'
+    data_path.write_text('a,b\n1,2\n')
+    memo_path = str(tmp_path / 'memo' / 'hashes.json')
+    calls = []
+
+    def compute_hash():
+        calls.append(1)
+        return 'hash{}'.format(len(calls))
+
+    assert 'hash1' == get_memoized_hash([str(data_path)], memo_path, 'sha1', compute_hash)
+    assert 'hash1' == get_memoized_hash([str(data_path)], memo_path, 'sha1', compute_hash)
+    assert 'hash2' == get_memoized_hash([str(data_path)], memo_path, 'blake2b', compute_hash)
+
+    data_path.write_text('a,b\n1,3\n4,5\n')
+
+    assert 'hash3' == get_memoized_hash([str(data_path)], memo_path, 'sha1', compute_hash)
+    assert 'hash3' == get_memoized_hash([str(data_path)], memo_path, 'sha1', compute_hash)
+    assert 3 == len(calls)
@@ -0,0 +1,182 @@
+from unittest.mock import Mock, MagicMock
+
+import numpy as np
+import pytest
+from pandas import DataFrame
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import accuracy_score, make_scorer
+from sklearn.model_selection import KFold
+from sklearn.tree import DecisionTreeClassifier
+
+from pypastry.experiment import Experiment, evaluation
+from pypastry.experiment.cache import FoldCache
+from pypastry.experiment.evaluation import ExperimentRunner, evaluate_predictor
+from pypastry.experiment.incremental import AppendStableKFold, get_prefix_hashes, get_update_method, is_prefix
+from pypastry.experiment.models import ModelStore
+from pypastry.experiment.results import ResultsRepo
+
+
+@pytest.fixture
+def dataset():
+    random = np.random.RandomState(0)
+    a = random.normal(size=400)
+    return DataFrame({'a': a, 'b': (a > 0).astype(int)})
+
+
+@pytest.fixture
+def runner(tmp_path):
+    git_mock = Mock()
+    git_mock.is_dirty.return_value = False
+    git_mock.head.object.hexsha = MagicMock()
+    results_repo = ResultsRepo(str(tmp_path / 'results'))
+    return ExperimentRunner(git_mock, results_repo, Mock(), model_store=ModelStore(str(tmp_path / 'models')))
+
+
+def _get_dataset_info(dataset, algorithm='sha1', chunk_rows=10):
+    return {'size': len(dataset), 'hash_algorithm': algorithm,
+            'prefix_hashes': get_prefix_hashes(dataset, algorithm, chunk_rows)}
+
+
+def test_folds_are_stable_when_rows_are_appended():
+    cross_validator = AppendStableKFold(n_splits=4)
+
+    before = list(cross_validator.split(np.zeros((1000, 1))))
+    after = list(cross_validator.split(np.zeros((1500, 1))))
+
+    for (_, test_before), (_, test_after) in zip(before, after):
+        assert test_before.tolist() == test_after[test_after < 1000].tolist()
+        assert 200 < len(test_before) < 300
+
+
+def test_groups_stay_in_one_fold():
+    groups = np.arange(1000) // 5
+
+    for _, test in AppendStableKFold(n_splits=3).split(np.zeros((1000, 1)), groups=groups):
+        assert set(groups[test]).isdisjoint(set(groups) - set(groups[test]))
+        assert np.all(np.bincount(groups[test])[np.unique(groups[test])] == 5)
+
+
+@pytest.mark.parametrize("base_size", [20, 25, 5])
+def test_appended_dataset_starts_with_base(base_size, dataset):
+    prefix_hashes = get_prefix_hashes(dataset, 'sha1', 10)
+
+    assert is_prefix(_get_dataset_info(dataset.iloc[:base_size]), dataset, prefix_hashes, 'sha1')
+
+
+def test_changed_dataset_does_not_start_with_base(dataset):
+    base = dataset.iloc[:25].copy()
+    base.iloc[22, 0] = 100.0
+
+    assert not is_prefix(_get_dataset_info(base), dataset, get_prefix_hashes(dataset, 'sha1', 10), 'sha1')
+    assert not is_prefix(_get_dataset_info(dataset.iloc[:25], chunk_rows=5), dataset,
+                         get_prefix_hashes(dataset, 'sha1', 10), 'sha1')
+
+
+@pytest.mark.parametrize("predictor, method", [(SGDClassifier(random_state=0), 'partial_fit'),
+                                               (LogisticRegression(), 'warm_start'),
+                                               (DecisionTreeClassifier(random_state=0), 'refit')])
+def test_run_updates_models_of_run_on_first_rows(predictor, method, dataset, runner):
+    def get_experiment(rows):
+        return Experiment(rows, 'b', predictor, AppendStableKFold(n_splits=3), make_scorer(accuracy_score),
+                          incremental=True)
+
+    _, first_path = runner.run_experiment(get_experiment(dataset.iloc[:300]))
+    _, second_path = runner.run_experiment(get_experiment(dataset))
+
+    first = runner.results_repo.get_result(first_path.name).data
+    second = runner.results_repo.get_result(second_path.name).data
+    assert 'base' not in first['incremental']
+    assert first['incremental']['key'] == second['incremental']['key']
+    assert first['result_json_name'] == second['incremental']['base']
+    assert 300 == second['incremental']['base_size']
+    assert method == second['incremental']['method']
+    assert 3 == len(second['models'])
+    assert second['results']['test_score']['accuracy_score'] > 0.8
+
+
+@pytest.mark.parametrize("predictor, method", [(LogisticRegression(), 'warm_start'),
+                                               (RandomForestClassifier(n_estimators=10), 'refit'),
+                                               (GradientBoostingClassifier(n_estimators=10), 'refit')])
+def test_update_method(predictor, method):
+    assert method == get_update_method(predictor)
+
+
+def _get_tree_sizes(forest):
+    return [tree.tree_.weighted_n_node_samples[0] for tree in forest.estimators_]
+
+
+@pytest.mark.parametrize("predictor, state", [(LogisticRegression(), lambda model: model.coef_.tolist()),
+                                              (RandomForestClassifier(n_estimators=5, random_state=0),
+                                               _get_tree_sizes)])
+def test_updated_models_are_fitted_on_appended_rows(predictor, state, dataset, runner):
+    def get_experiment(rows):
+        return Experiment(rows, 'b', predictor, AppendStableKFold(n_splits=3), make_scorer(accuracy_score),
+                          incremental=True)
+
+    _, first_path = runner.run_experiment(get_experiment(dataset.iloc[:100]))
+    _, second_path = runner.run_experiment(get_experiment(dataset))
+
+    first = runner.model_store.load_models(runner.results_repo.get_result(first_path.name), mmap_mode=None)
+    second = runner.model_store.load_models(runner.results_repo.get_result(second_path.name), mmap_mode=None)
+    for base_model, updated_model in zip(first, second):
+        assert state(base_model) != state(updated_model)
+        assert not updated_model.get_params()['warm_start']
+
+
+def test_updated_folds_are_not_reused_for_fresh_fits(dataset, tmp_path):
+    git_mock = Mock()
+    git_mock.is_dirty.return_value = False
+    git_mock.head.object.hexsha = MagicMock()
+    runner = ExperimentRunner(git_mock, ResultsRepo(str(tmp_path / 'results')), Mock(),
+                              fold_cache=FoldCache(str(tmp_path / 'folds')),
+                              model_store=ModelStore(str(tmp_path / 'models')))
+
+    def get_experiment(rows, incremental=True):
+        return Experiment(rows, 'b', SGDClassifier(random_state=0), AppendStableKFold(n_splits=3),
+                          make_scorer(accuracy_score), incremental=incremental)
+
+    runner.run_experiment(get_experiment(dataset.iloc[:300]))
+    runner.run_experiment(get_experiment(dataset))
+    _, path = runner.run_experiment(get_experiment(dataset, incremental=False))
+
+    fresh_run_info, _ = evaluate_predictor(get_experiment(dataset, incremental=False))
+    cached_run_info = runner.results_repo.get_result(path.name).data
+    assert fresh_run_info['results_detail'] == cached_run_info['results_detail']
+
+
+def test_prefix_hashes_are_memoized(dataset, runner, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_path = tmp_path / 'data.csv'
+    dataset.to_csv(data_path, index=False)
+    hashed = []
+    monkeypatch.setattr(evaluation, 'get_prefix_hashes',
+                        lambda *args: hashed.append(args) or get_prefix_hashes(*args))
+
+    def run():
+        experiment = Experiment(dataset, 'b', SGDClassifier(random_state=0), AppendStableKFold(n_splits=3),
+                                make_scorer(accuracy_score), incremental=True, dataset_paths=str(data_path))
+        _, path = runner.run_experiment(experiment)
+        return runner.results_repo.get_result(path.name).data['dataset']['prefix_hashes']
+
+    first_hashes = run()
+
+    assert run() == first_hashes
+    assert len(hashed) == 1
+
+
+def test_changed_rows_are_not_updated(dataset, runner):
+    def get_experiment(rows):
+        return Experiment(rows, 'b', SGDClassifier(random_state=0), AppendStableKFold(n_splits=3),
+                          make_scorer(accuracy_score), incremental=True)
+
+    runner.run_experiment(get_experiment(dataset.iloc[:300]))
+    changed = dataset.assign(a=dataset['a'] + 1)
+    _, path = runner.run_experiment(get_experiment(changed))
+
+    assert 'base' not in runner.results_repo.get_result(path.name).data['incremental']
+
+
+def test_incremental_needs_append_stable_folds(dataset):
+    with pytest.raises(ValueError):
+        Experiment(dataset, 'b', SGDClassifier(), KFold(n_splits=3), incremental=True)
@@ -0,0 +1,73 @@
+import os
+from unittest.mock import Mock, MagicMock
+
+import numpy as np
+import pytest
+from pandas import DataFrame
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, make_scorer
+from sklearn.model_selection import KFold
+
+from pypastry.experiment import Experiment
+from pypastry.experiment.evaluation import ExperimentRunner
+from pypastry.experiment.models import ModelStore
+from pypastry.experiment.results import ResultsRepo, Result
+
+
+@pytest.fixture
+def model_store(tmp_path):
+    return ModelStore(str(tmp_path / 'models'))
+
+
+@pytest.fixture
+def dataset():
+    random = np.random.RandomState(0)
+    a = random.normal(size=100)
+    return DataFrame({'a': a, 'b': (a > 0).astype(int)})
+
+
+def _count_models(model_store):
+    return sum(len(names) for _, _, names in os.walk(model_store.store_path))
+
+
+def test_identical_estimators_stored_once(model_store, dataset):
+    first = LogisticRegression().fit(dataset[['a']], dataset['b'])
+    second = LogisticRegression().fit(dataset[['a']], dataset['b'])
+
+    assert model_store.put(first) == model_store.put(second)
+    assert 1 == _count_models(model_store)
+
+
+@pytest.mark.parametrize("compress", [0, 3])
+def test_stored_estimator_predicts(model_store, dataset, compress):
+    model_store.compress = compress
+    estimator = LogisticRegression().fit(dataset[['a']], dataset['b'])
+
+    loaded = model_store.get(model_store.put(estimator))
+
+    assert (estimator.predict(dataset[['a']]) == loaded.predict(dataset[['a']])).all()
+
+
+def test_run_links_fold_models(model_store, dataset, tmp_path):
+    experiment = Experiment(dataset, 'b', LogisticRegression(), KFold(n_splits=3), make_scorer(accuracy_score))
+    git_mock = Mock()
+    git_mock.is_dirty.return_value = False
+    git_mock.head.object.hexsha = MagicMock()
+    results_repo = ResultsRepo(str(tmp_path / 'results'))
+    runner = ExperimentRunner(git_mock, results_repo, Mock(), model_store=model_store)
+
+    estimators, result_file_path = runner.run_experiment(experiment)
+    runner.run_experiment(experiment)
+
+    result = results_repo.get_result(result_file_path.name)
+    assert 3 == len(result.data['models'])
+    # The second run fits the same models, so nothing more is stored
+    assert 3 == _count_models(model_store)
+    loaded = model_store.load_models(result)
+    for estimator, loaded_estimator in zip(estimators, loaded):
+        assert (estimator.coef_ == loaded_estimator.coef_).all()
+
+
+def test_load_models_of_run_without_models(model_store):
+    with pytest.raises(ValueError):
+        model_store.load_models(Result({'result_json_name': 'result-abc.json'}))
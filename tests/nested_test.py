@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+from pandas import DataFrame
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, make_scorer
+from sklearn.model_selection import GridSearchCV, KFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from pypastry.experiment import Experiment
+from pypastry.experiment.cache import FoldCache, TransformerCache
+from pypastry.experiment.evaluation import evaluate_predictor
+
+
+class CountingScaler(StandardScaler):
+    fits = 0
+
+    def fit(self, X, y=None, sample_weight=None):
+        CountingScaler.fits += 1
+        return super().fit(X, y, sample_weight)
+
+
+@pytest.fixture
+def dataset():
+    random = np.random.RandomState(0)
+    a = random.normal(size=200)
+    return DataFrame({'a': a * 100, 'c': random.normal(size=200), 'b': (a > 0).astype(int)})
+
+
+@pytest.fixture(autouse=True)
+def reset_fits():
+    CountingScaler.fits = 0
+
+
+def _get_experiment(dataset, transformer_cache, inner_cross_validator=KFold(n_splits=2), **kwargs):
+    pipeline = make_pipeline(CountingScaler(), LogisticRegression())
+    return Experiment(dataset, 'b', pipeline, KFold(n_splits=2), make_scorer(accuracy_score),
+                      param_grid={'logisticregression__C': [0.01, 1.0]}, inner_cross_validator=inner_cross_validator,
+                      transformer_cache=transformer_cache, **kwargs)
+
+
+def test_inner_search_params_recorded_per_fold(dataset, tmp_path):
+    run_info, estimators = evaluate_predictor(_get_experiment(dataset, str(tmp_path / 'transformers')))
+
+    model_info = run_info['model_info']
+    assert 'Pipeline' == model_info['type']
+    assert {'logisticregression__C': [0.01, 1.0]} == model_info['param_grid']
+    assert 2 == len(model_info['best_params'])
+    assert all(params['logisticregression__C'] in (0.01, 1.0) for params in model_info['best_params'])
+    assert all(isinstance(estimator, GridSearchCV) for estimator in estimators)
+    assert run_info['results']['test_score']['accuracy_score'] > 0.9
+
+
+def test_transformers_shared_between_candidates_and_runs(dataset, tmp_path):
+    transformer_cache = str(tmp_path / 'transformers')
+
+    evaluate_predictor(_get_experiment(dataset, transformer_cache))
+    # Per outer fold, the scaler is fitted once for each inner fold, whatever the candidate, then refitted
+    assert 2 * (2 + 1) == CountingScaler.fits
+    assert any((tmp_path / 'transformers').iterdir())
+
+    evaluate_predictor(_get_experiment(dataset, transformer_cache))
+    assert 2 * (2 + 1) == CountingScaler.fits
+
+
+def test_without_transformer_cache(dataset):
+    evaluate_predictor(_get_experiment(dataset, None))
+
+    assert 2 * (2 * 2 + 1) == CountingScaler.fits
+
+
+def test_transformer_cache_is_pruned(dataset, tmp_path):
+    transformer_cache = str(tmp_path / 'transformers')
+
+    evaluate_predictor(_get_experiment(dataset, transformer_cache))
+    entries = TransformerCache(transformer_cache).entries()
+    assert 2 * 2 <= len(entries)
+
+    evaluate_predictor(_get_experiment(dataset, transformer_cache, transformer_cache_size=entries[-1].size))
+    assert 1 == len(TransformerCache(transformer_cache).entries())
+
+
+@pytest.mark.parametrize("random_state, cached", [(None, 0), (0, 2)])
+def test_folds_with_random_inner_splits_are_not_cached(random_state, cached, dataset, tmp_path):
+    fold_cache = FoldCache(str(tmp_path / 'folds'))
+    inner_cross_validator = KFold(n_splits=2, shuffle=True, random_state=random_state)
+
+    evaluate_predictor(_get_experiment(dataset, None, inner_cross_validator), fold_cache)
+
+    assert cached == len(fold_cache.entries())
+
+
+def test_wrapped_search_uses_transformer_cache(dataset, tmp_path):
+    search = GridSearchCV(make_pipeline(CountingScaler(), LogisticRegression()),
+                          {'logisticregression__C': [0.01, 1.0]}, cv=KFold(n_splits=2))
+    experiment = Experiment(dataset, 'b', search, KFold(n_splits=2), transformer_cache=str(tmp_path / 'transformers'))
+
+    run_info, _ = evaluate_predictor(experiment)
+
+    assert 2 * (2 + 1) == CountingScaler.fits
+    assert 2 == len(run_info['model_info']['best_params'])
+    assert search.estimator.memory is None
+
+
+def test_inner_cross_validator_needs_grid(dataset):
+    with pytest.raises(ValueError):
+        Experiment(dataset, 'b', LogisticRegression(), KFold(n_splits=2), inner_cross_validator=KFold(n_splits=2))
@@ -0,0 +1,68 @@
+import sys
+from pstats import Stats
+from unittest.mock import Mock, MagicMock
+
+import pytest
+from pandas import DataFrame
+from sklearn.metrics import accuracy_score, make_scorer
+from sklearn.model_selection import KFold
+from sklearn.tree import DecisionTreeClassifier
+
+from pypastry.commands import profile
+from pypastry.experiment import Experiment
+from pypastry.experiment.evaluation import ExperimentRunner
+from pypastry.experiment.results import ResultsRepo
+from pypastry.paths import RESULTS_PATH, RESULTS_INDEX_PATH
+
+
+@pytest.fixture
+def results_repo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return ResultsRepo(RESULTS_PATH, RESULTS_INDEX_PATH)
+
+
+def _run(results_repo, **options):
+    dataset = DataFrame({'a': [i % 2 for i in range(40)], 'b': [i % 2 for i in range(40)]})
+    experiment = Experiment(dataset, 'b', DecisionTreeClassifier(), KFold(n_splits=2), make_scorer(accuracy_score),
+                            **options)
+    git_mock = Mock()
+    git_mock.is_dirty.return_value = False
+    git_mock.head.object.hexsha = MagicMock()
+    runner = ExperimentRunner(git_mock, results_repo, Mock())
+    _, result_file_path = runner.run_experiment(experiment)
+    return results_repo.get_result(result_file_path.name)
+
+
+def _get_function_names(profile_path):
+    return {name for _, _, name in Stats(profile_path).stats}
+
+
+@pytest.mark.parametrize("options", [{}, {'n_jobs': 2, 'backend': 'loky'}, {'n_jobs': 2, 'backend': 'threading'}])
+def test_profile_saved_next_to_result(results_repo, options):
+    result = _run(results_repo, profile=True, **options)
+
+    profile_path = results_repo.get_profile_path(result)
+    assert profile_path.endswith(result.data['result_json_name'][:-len('.json')] + '.prof')
+    # Folds are included in the profile wherever they ran
+    function_names = _get_function_names(profile_path)
+    assert 'get_experiment_hash' in function_names
+    assert 'fit' in function_names
+
+
+def test_no_profile_by_default(results_repo):
+    result = _run(results_repo)
+
+    assert results_repo.get_profile_path(result) is None
+
+
+def test_profile_command_shows_latest_profile(results_repo, monkeypatch, capsys):
+    _run(results_repo)
+    result = _run(results_repo, profile=True)
+    monkeypatch.setattr(sys, 'argv', ['pastry', 'profile', '-l', '5'])
+    capsys.readouterr()
+
+    profile.run()
+
+    output = capsys.readouterr().out
+    assert output.startswith("Profile of {}".format(result.data['result_json_name']))
+    assert 'cumulative' in output
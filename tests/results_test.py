@@ -0,0 +1,105 @@
+import json
+import os
+
+import pytest
+
+from pypastry.experiment.results import ResultsRepo
+
+
+def _save(results_repo, run_start, model, git_hash, dataset_hash):
+    run_info = {'run_start': run_start, 'model_info': {'type': model}}
+    dataset_info = {'hash': dataset_hash, 'size': 10}
+    git_info = {'git_hash_msg': git_hash, 'git_summary_msg': 'summary'}
+    return results_repo.save_results(run_info, dataset_info, git_info)
+
+
+@pytest.fixture(params=[True, False], ids=['indexed', 'files'])
+def results_repo(request, tmp_path):
+    index_path = str(tmp_path / '.pypastry' / 'results.sqlite') if request.param else None
+    results_repo = ResultsRepo(str(tmp_path / 'results'), index_path)
+    _save(results_repo, '2020-01-03 00:00:00', 'DecisionTreeClassifier', 'aaaa1111', 'dddd0000')
+    _save(results_repo, '2020-01-01 00:00:00', 'DummyClassifier', 'dirty_bbbb2222', 'dddd0000')
+    _save(results_repo, '2020-01-02 00:00:00', 'DecisionTreeClassifier', 'cccc3333', 'eeee0000')
+    return results_repo
+
+
+def _run_starts(results):
+    return [result.data['run_start'][:10] for result in results]
+
+
+def test_get_all_results(results_repo):
+    results = list(results_repo.get_results())
+
+    assert ['2020-01-01', '2020-01-02', '2020-01-03'] == _run_starts(results)
+
+
+def test_get_latest_results(results_repo):
+    assert ['2020-01-02', '2020-01-03'] == _run_starts(results_repo.get_results(limit=2))
+
+
+@pytest.mark.parametrize("query, expected", [
+    ({'model': 'DecisionTreeClassifier'}, ['2020-01-02', '2020-01-03']),
+    ({'git_hash': 'bbbb'}, ['2020-01-01']),
+    ({'dataset_hash': 'dddd'}, ['2020-01-01', '2020-01-03']),
+    ({'dataset_hash': 'dddd', 'limit': 1}, ['2020-01-03']),
+])
+def test_filter_results(results_repo, query, expected):
+    assert expected == _run_starts(results_repo.get_results(**query))
+
+
+def test_file_deleted_while_indexing(tmp_path):
+    results_repo = ResultsRepo(str(tmp_path / 'results'), str(tmp_path / '.pypastry' / 'results.sqlite'))
+    path = _save(results_repo, '2020-01-01 00:00:00', 'DummyClassifier', 'aaaa1111', 'dddd0000')
+    os.remove(str(path))
+
+    with results_repo._open_index() as connection:
+        assert results_repo._index_file(connection, path.name)
+    assert [] == list(results_repo.get_results())
+
+
+def test_index_follows_files(results_repo):
+    list(results_repo.get_results())
+    first_path = os.path.join(results_repo.results_path, sorted(os.listdir(results_repo.results_path))[0])
+    os.remove(first_path)
+    with open(os.path.join(results_repo.results_path, 'copied.json'), 'w') as copied_file:
+        json.dump({'run_start': '2020-01-04 00:00:00', 'model_info': {'type': 'Copied'},
+                   'dataset': {'hash': 'ffff0000'}}, copied_file)
+
+    results = list(results_repo.get_results())
+
+    assert 3 == len(results)
+    assert ['2020-01-04'] == _run_starts(results_repo.get_results(model='Copied'))
+
+
+def test_long_detail_saved_next_to_result(tmp_path):
+    results_repo = ResultsRepo(str(tmp_path / 'results'))
+    scores = [i / 10000 for i in range(10000)]
+    groups = ['group {}'.format(i % 7) for i in range(10000)]
+    run_info = {'run_start': '2020-01-01 00:00:00', 'model_info': {'type': 'DummyClassifier'},
+                'results_detail': {'accuracy_score': scores, 'g': groups, 'short': [1.0]}}
+
+    path = results_repo.save_results(run_info, {'hash': 'dddd0000'}, {'git_hash_msg': 'a', 'git_summary_msg': 's'})
+
+    with open(str(path)) as result_file:
+        saved = json.load(result_file)
+    assert {'short': [1.0]} == saved['results_detail']
+    assert {'accuracy_score', 'g'} == set(saved['results_detail_files'])
+
+    result = results_repo.get_result(path.name)
+    detail = results_repo.get_results_detail(result)
+    assert scores == detail['accuracy_score'].tolist()
+    assert groups == detail['g'].tolist()
+    assert [1.0] == detail['short'].tolist()
+    assert detail['accuracy_score'].filename is not None
+
+
+def test_inline_detail_still_readable(tmp_path):
+    results_path = tmp_path / 'results'
+    results_path.mkdir()
+    (results_path / 'result-old.json').write_text(json.dumps({
+        'run_start': '2019-01-01 00:00:00', 'results_detail': {'f1_score': [0.5, 0.75]}}))
+    results_repo = ResultsRepo(str(results_path))
+
+    detail = results_repo.get_results_detail(results_repo.get_result('result-old'))
+
+    assert [0.5, 0.75] == detail['f1_score'].tolist()
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from pandas import DataFrame, Series
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score, make_scorer, mean_absolute_error, mean_squared_error, \
+    r2_score, log_loss, precision_score, roc_auc_score
+
+from pypastry.experiment.scoring import score_groups, score_predictions
+
+
+class CountingPredictor:
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.estimator, name)
+        if name in ('predict', 'predict_proba', 'decision_function'):
+            def counted(*args, **kwargs):
+                self.calls.append(name)
+                return method(*args, **kwargs)
+            return counted
+        return method
+
+
+@pytest.fixture
+def data():
+    random = np.random.RandomState(0)
+    X = DataFrame({'a': random.normal(size=300), 'b': random.normal(size=300)})
+    y = Series((X['a'] + random.normal(size=300) > 0).astype(int))
+    groups = Series(random.randint(0, 30, size=300))
+    return X, y, groups
+
+
+def _score_each_group(scorers, estimator, X, y, groups):
+    scores = []
+    for key in sorted(groups.unique()):
+        mask = (groups == key).values
+        scores.append((key, {scorer._score_func.__name__: scorer(estimator, X[mask], y[mask]) * scorer._sign
+                             for scorer in scorers}))
+    return scores
+
+
+def test_classification_scores_match_per_group_scoring(data):
+    X, y, groups = data
+    estimator = LogisticRegression().fit(X, y)
+    scorers = [make_scorer(accuracy_score), make_scorer(f1_score, zero_division=0),
+               make_scorer(log_loss, greater_is_better=False, needs_proba=True, labels=[0, 1])]
+
+    scores = score_groups(scorers, estimator, X, y, groups)
+
+    expected = _score_each_group(scorers, estimator, X, y, groups)
+    assert [key for key, _ in expected] == [key for key, _ in scores]
+    for (_, score_values), (_, expected_values) in zip(scores, expected):
+        assert expected_values == pytest.approx(score_values)
+
+
+def test_regression_scores_match_per_group_scoring(data):
+    X, y, groups = data
+    y = X['a'] * 2 + X['b']
+    estimator = LinearRegression().fit(X[['a']], y)
+    scorers = [make_scorer(mean_absolute_error, greater_is_better=False),
+               make_scorer(mean_squared_error, greater_is_better=False), make_scorer(r2_score)]
+
+    scores = score_groups(scorers, estimator, X[['a']], y, groups)
+
+    expected = _score_each_group(scorers, estimator, X[['a']], y, groups)
+    for (_, score_values), (_, expected_values) in zip(scores, expected):
+        assert expected_values == pytest.approx(score_values)
+
+
+def test_predicts_once_per_response_method(data):
+    X, y, groups = data
+    estimator = CountingPredictor(LogisticRegression().fit(X, y))
+    scorers = [make_scorer(accuracy_score), make_scorer(f1_score, zero_division=0),
+               make_scorer(log_loss, greater_is_better=False, needs_proba=True, labels=[0, 1])]
+    per_instance = Series(range(len(X)))
+
+    scores = score_groups(scorers, estimator, X, y, per_instance)
+
+    assert len(X) == len(scores)
+    assert ['predict', 'predict_proba'] == sorted(estimator.calls)
+
+
+def test_score_predictions_matches_scorers(data):
+    X, y, _ = data
+    estimator = CountingPredictor(LogisticRegression().fit(X, y))
+    scorers = [make_scorer(accuracy_score), make_scorer(f1_score), make_scorer(precision_score),
+               make_scorer(roc_auc_score, needs_threshold=True),
+               make_scorer(log_loss, greater_is_better=False, needs_proba=True)]
+
+    scores = score_predictions(scorers, estimator, X, y)
+
+    assert ['decision_function', 'predict', 'predict_proba'] == sorted(estimator.calls)
+    expected = {scorer._score_func.__name__: scorer(estimator.estimator, X, y) * scorer._sign for scorer in scorers}
+    assert expected == scores
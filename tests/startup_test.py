@@ -0,0 +1,43 @@
+import subprocess
+import sys
+
+import pytest
+
+from pypastry.commands import COMMANDS
+
+SLOW_MODULES = ['pandas', 'sklearn', 'numpy', 'joblib', 'git']
+
+
+def _get_import_times(module):
+    """
+    Import the module in a fresh interpreter and return the cumulative import time
+    in seconds of every module imported, as reported by python -X importtime.
+    """
+    command = [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)]
+    # Run twice so that the timed import doesn't include compiling bytecode
+    subprocess.run(command, check=True, capture_output=True)
+    output = subprocess.run(command, check=True, capture_output=True, universal_newlines=True).stderr
+
+    import_times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        import_times[name.strip()] = int(cumulative) / 1e6
+    return import_times
+
+
+@pytest.mark.parametrize("name", sorted(COMMANDS))
+def test_command_starts_within_budget(name):
+    command = COMMANDS[name]
+
+    import_times = _get_import_times(command.module)
+
+    assert import_times[command.module] <= command.startup_budget_seconds
+
+
+def test_print_does_not_import_slow_modules():
+    import_times = _get_import_times(COMMANDS['print'].module)
+
+    imported_slow_modules = [module for module in import_times if module.split('.')[0] in SLOW_MODULES]
+    assert [] == imported_slow_modules
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+from pandas import DataFrame
+from sklearn.base import clone
+from sklearn.linear_model import SGDClassifier, SGDRegressor
+from sklearn.metrics import accuracy_score, make_scorer, f1_score, roc_auc_score, mean_squared_error, r2_score, \
+    precision_score, recall_score, matthews_corrcoef
+
+from pypastry.experiment import StreamingExperiment
+from pypastry.experiment.hasher import get_dataset_hash
+from pypastry.experiment.streaming import StreamingScores, evaluate_streaming
+
+
+BATCH_SIZE = 100
+
+
+@pytest.fixture
+def frames():
+    random = np.random.RandomState(0)
+    X = random.normal(size=(1000, 2))
+    dataset = DataFrame({'a': X[:, 0], 'b': X[:, 1], 'y': (X[:, 0] + random.normal(size=1000) > 0).astype(int)})
+    return dataset.iloc[:700].reset_index(drop=True), dataset.iloc[700:].reset_index(drop=True)
+
+
+def _batches(frame, batch_size=BATCH_SIZE):
+    return lambda: (frame.iloc[start:start + batch_size] for start in range(0, len(frame), batch_size))
+
+
+def _fit_in_memory(predictor, train, **kwargs):
+    estimator = clone(predictor)
+    for start in range(0, len(train), BATCH_SIZE):
+        batch = train.iloc[start:start + BATCH_SIZE]
+        estimator.partial_fit(batch[['a', 'b']], batch['y'], **kwargs)
+    return estimator
+
+
+def test_streaming_scores_match_in_memory_scores(frames, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    train, test = frames
+    predictor = SGDClassifier(random_state=0)
+    scorers = [make_scorer(accuracy_score), make_scorer(f1_score), make_scorer(roc_auc_score, needs_threshold=True)]
+    experiment = StreamingExperiment(_batches(train), 'y', predictor, _batches(test), scorer=scorers, classes=[0, 1])
+
+    run_info, estimators, dataset_info = evaluate_streaming(experiment)
+
+    estimator = _fit_in_memory(predictor, train, classes=[0, 1])
+    expected = {scorer._score_func.__name__: scorer(estimator, test[['a', 'b']], test['y']) for scorer in scorers}
+    assert run_info['results']['test_score'] == pytest.approx(expected)
+    assert dataset_info['size'] == 700
+    assert dataset_info['columns'] == ['a', 'b', 'y']
+    assert len(estimators) == 1
+
+
+def test_streaming_regression_from_parquet(frames, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    train, test = frames
+    train = train.assign(y=train['a'] * 2 + train['b'])
+    test = test.assign(y=test['a'] * 2 + test['b'])
+    train.to_parquet('train.parquet')
+    test.to_parquet('test.parquet')
+    predictor = SGDRegressor(random_state=0)
+    scorers = [make_scorer(mean_squared_error, greater_is_better=False), make_scorer(r2_score)]
+    experiment = StreamingExperiment('train.parquet', 'y', predictor, 'test.parquet', scorer=scorers,
+                                     batch_size=BATCH_SIZE)
+
+    run_info, _, dataset_info = evaluate_streaming(experiment)
+
+    estimator = _fit_in_memory(predictor, train)
+    y_pred = estimator.predict(test[['a', 'b']])
+    test_score = run_info['results']['test_score']
+    assert test_score['mean_squared_error'] == pytest.approx(mean_squared_error(test['y'], y_pred))
+    assert test_score['r2_score'] == pytest.approx(r2_score(test['y'], y_pred))
+
+    # The second run finds the hash in the memo and gets the same one
+    _, _, second_dataset_info = evaluate_streaming(experiment)
+    assert second_dataset_info['hash'] == dataset_info['hash']
+    assert (tmp_path / '.pypastry' / 'dataset_hashes.json').exists()
+
+
+@pytest.mark.parametrize("batch_size", [100, 64, 1000])
+@pytest.mark.parametrize("categorical", [False, True])
+def test_streaming_hash_does_not_depend_on_batches(batch_size, categorical, frames, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    train, test = frames
+    if categorical:
+        train, test = train.astype({'y': 'category'}), test.astype({'y': 'category'})
+    experiment = StreamingExperiment(_batches(train, batch_size), 'y', SGDClassifier(), _batches(test, batch_size),
+                                     classes=[0, 1])
+
+    _, _, dataset_info = evaluate_streaming(experiment)
+
+    assert get_dataset_hash(train, test) == dataset_info['hash']
+
+
+def test_streaming_confusion_metrics_keep_counts(frames):
+    train, test = frames
+    estimator = _fit_in_memory(SGDClassifier(random_state=0), train, classes=[0, 1])
+    scorers = [make_scorer(f1_score), make_scorer(precision_score, average='macro'),
+               make_scorer(recall_score, pos_label=0), make_scorer(matthews_corrcoef)]
+    streaming_scores = StreamingScores(scorers, estimator)
+
+    for batch in _batches(test)():
+        streaming_scores.add_batch(batch[['a', 'b']], batch['y'].to_numpy())
+
+    assert {} == streaming_scores.responses
+    assert 4 >= len(streaming_scores.confusion)
+    expected = {scorer._score_func.__name__: scorer(estimator, test[['a', 'b']], test['y']) for scorer in scorers}
+    assert streaming_scores.get_scores() == pytest.approx(expected)
+
+
+def test_streaming_classifier_needs_classes(frames):
+    train, test = frames
+    experiment = StreamingExperiment(_batches(train), 'y', SGDClassifier(), _batches(test))
+
+    with pytest.raises(ValueError):
+        evaluate_streaming(experiment)
+
+
+def test_streaming_needs_partial_fit(frames):
+    from sklearn.ensemble import RandomForestClassifier
+    train, test = frames
+
+    with pytest.raises(ValueError):
+        StreamingExperiment(_batches(train), 'y', RandomForestClassifier(), _batches(test))
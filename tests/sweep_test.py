@@ -0,0 +1,94 @@
+from unittest.mock import Mock, MagicMock
+
+import numpy as np
+import pytest
+from pandas import DataFrame
+from scipy.stats import uniform
+from sklearn.metrics import accuracy_score, make_scorer
+from sklearn.model_selection import KFold
+from sklearn.tree import DecisionTreeClassifier
+
+from pypastry.experiment import Experiment
+from pypastry.experiment.evaluation import ExperimentRunner, DirtyRepoError
+from pypastry.experiment.sweep import successive_halving, get_candidates
+
+
+@pytest.fixture
+def xor_dataset():
+    random = np.random.RandomState(0)
+    a = random.randint(0, 2, size=200)
+    b = random.randint(0, 2, size=200)
+    return DataFrame({'a': a, 'b': b, 'y': a ^ b})
+
+
+def _get_experiment(dataset, n_splits):
+    return Experiment(dataset, 'y', DecisionTreeClassifier(random_state=0), KFold(n_splits=n_splits),
+                      make_scorer(accuracy_score))
+
+
+def test_losing_candidates_are_stopped_early(xor_dataset):
+    experiment = _get_experiment(xor_dataset, 4)
+    candidates = get_candidates({'max_depth': [1, 2, 3, None]})
+
+    results = successive_halving(experiment, candidates, factor=2)
+
+    assert len(results) == 1
+    assert results[0].parameters['max_depth'] != 1
+    assert results[0].rank == 1
+    assert len(results[0].estimators) == 4
+    assert [fold['fold'] for fold in results[0].timings.folds] == [0, 1, 2, 3]
+    assert [score_values['accuracy_score'] for _, score_values in results[0].scores] == [1.0] * 4
+
+
+def test_survivors_are_ranked(xor_dataset):
+    experiment = _get_experiment(xor_dataset, 2)
+    candidates = get_candidates({'max_depth': [1, 2, None]})
+
+    results = successive_halving(experiment, candidates, factor=2)
+
+    assert [result.rank for result in results] == [1, 2]
+    assert all(result.parameters['max_depth'] != 1 for result in results)
+    assert all(len(result.scores) == 2 for result in results)
+
+
+def test_sampled_candidates():
+    candidates = get_candidates({'min_impurity_decrease': uniform(0, 0.1)}, n_iter=5, random_state=0)
+
+    assert len(candidates) == 5
+    assert candidates == get_candidates({'min_impurity_decrease': uniform(0, 0.1)}, n_iter=5, random_state=0)
+
+
+@pytest.mark.parametrize("dirty, force", [(False, False), (True, False), (True, True)])
+def test_run_sweep_saves_survivors(dirty, force, xor_dataset):
+    experiment = _get_experiment(xor_dataset, 2)
+    git_mock = Mock()
+    git_mock.is_dirty.return_value = dirty
+    git_mock.head.object.hexsha = MagicMock()
+    results_repo_mock = Mock()
+    results_display_mock = Mock()
+    runner = ExperimentRunner(git_mock, results_repo_mock, results_display_mock)
+    candidates = get_candidates({'max_depth': [1, 2, None]})
+
+    if dirty and not force:
+        with pytest.raises(DirtyRepoError):
+            runner.run_sweep(experiment, candidates, "Sweep depth", force, factor=2)
+        results_repo_mock.save_results.assert_not_called()
+        return
+
+    runner.run_sweep(experiment, candidates, "Sweep depth", force, factor=2)
+
+    assert results_repo_mock.save_results.call_count == 2
+    assert results_display_mock.update_display.call_count == 2
+    for rank, call in enumerate(results_repo_mock.save_results.call_args_list, 1):
+        run_info = call[0][0]
+        assert run_info['sweep']['rank'] == rank
+        assert run_info['sweep']['candidates'] == 3
+        assert run_info['model_info']['max_depth'] == run_info['sweep']['parameters']['max_depth']
+        assert [fold['fold'] for fold in run_info['timings']['folds']] == [0, 1]
+        assert run_info['timings']['fit_seconds'] > 0
+        assert call[1]['git_info']['git_summary_msg'].startswith("Sweep depth (max_depth=")
+    # Each survivor's run spans its own folds
+    run_ends = {call[0][0]['run_end'] for call in results_repo_mock.save_results.call_args_list}
+    assert len(run_ends) == 2
+    results_display_mock.print_cache_file.assert_called_once()
+    git_mock.is_dirty.assert_called_once()
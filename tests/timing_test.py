@@ -0,0 +1,77 @@
+import pytest
+from pandas import DataFrame
+from sklearn.metrics import accuracy_score, make_scorer
+from sklearn.model_selection import KFold
+from sklearn.tree import DecisionTreeClassifier
+
+from pypastry.experiment import Experiment
+from pypastry.experiment.evaluation import evaluate_predictor
+from pypastry.experiment.timing import Timings, add_listener, remove_listener
+
+
+@pytest.fixture
+def experiment():
+    dataset = DataFrame({'a': [i % 2 for i in range(40)], 'b': [i % 2 for i in range(40)]})
+    return Experiment(dataset, 'b', DecisionTreeClassifier(), KFold(n_splits=4), make_scorer(accuracy_score))
+
+
+@pytest.fixture
+def spans():
+    spans = []
+    add_listener(spans.append)
+    yield spans
+    remove_listener(spans.append)
+
+
+def test_evaluation_records_fold_timings(experiment, spans):
+    run_info, _ = evaluate_predictor(experiment)
+
+    timings = run_info['timings']
+    assert {'split', 'folds'} == set(timings['phases'])
+    assert [0, 1, 2, 3] == [fold['fold'] for fold in timings['folds']]
+    for fold in timings['folds']:
+        assert fold['fit_seconds'] >= 0 and fold['predict_seconds'] >= 0 and fold['score_seconds'] >= 0
+    assert timings['fit_seconds'] == pytest.approx(sum(fold['fit_seconds'] for fold in timings['folds']))
+    assert 'peak_memory' not in timings
+
+    fold_spans = [span for span in spans if span.fold is not None]
+    assert 12 == len(fold_spans)
+    assert {'split', 'folds'} == {span.name for span in spans if span.fold is None}
+
+
+def test_evaluation_traces_memory(experiment):
+    experiment.trace_memory = True
+
+    run_info, _ = evaluate_predictor(experiment)
+
+    assert run_info['timings']['peak_memory'] > 0
+    assert all(fold['fit_peak_memory'] > 0 for fold in run_info['timings']['folds'])
+    # The folds phase contains every fold, so its peak is at least as high as theirs
+    folds_peak = run_info['timings']['phases']['folds']['peak_memory']
+    assert folds_peak >= max(fold[name + '_peak_memory'] for fold in run_info['timings']['folds']
+                             for name in ('fit', 'predict'))
+
+
+def test_nested_measurements_keep_peak():
+    timings = Timings(trace_memory=True)
+    with timings.phase('folds'):
+        for size in (10 ** 6, 10 ** 5):
+            with timings.phase('fold'):
+                data = bytearray(size)
+                del data
+
+    phases = timings.to_dict()['phases']
+    assert phases['folds']['peak_memory'] >= 10 ** 6
+    assert phases['fold']['peak_memory'] >= 10 ** 6
+
+
+def test_phases_add_up():
+    timings = Timings()
+    for _ in range(2):
+        with timings.phase('hash'):
+            pass
+
+    assert ['hash', 'hash'] == [span.name for span in timings.phases]
+    phase = timings.to_dict()['phases']['hash']
+    assert phase['seconds'] == pytest.approx(sum(span.seconds for span in timings.phases))
+    assert 'peak_memory' not in phase